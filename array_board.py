@@ -0,0 +1,179 @@
+# array_board.py
+# compact array-backed board for chess.py
+from array import array
+
+# Piece codes follow the order of `pieces` in chess.py: P=1, R=2, N=3, B=4, Q=5, K=6.
+# White pieces are positive, black pieces are negative and empty squares are 0.
+EMPTY = 0
+PAWN, ROOK, KNIGHT, BISHOP, QUEEN, KING = range(1, 7)
+PIECE_LETTERS = ' PRNBQK'
+
+# Color indexes follow `colors` in chess.py: colors[0] == '(b)', colors[1] == '(w)'.
+BLACK, WHITE = 0, 1
+COLOR_NAMES = ['(b)', '(w)']
+
+FILES = 'abcdefgh'
+RANKS = '12345678'
+
+# Square 0 is a1, square 7 is h1 and square 63 is h8.
+SQUARE_NAMES = [f + r for r in RANKS for f in FILES]
+SQUARE_INDEX = {name: i for i, name in enumerate(SQUARE_NAMES)}
+
+# Same key order as the dict returned by `initialize_board` (a1, a2, ..., h8).
+DICT_ORDER = [f + r for f in FILES for r in RANKS]
+
+# Indexed directly by piece code: negative codes wrap around to the end of the list,
+# so PIECE_NAMES[-1] == 'P(b)' and PIECE_NAMES[-6] == 'K(b)'.
+PIECE_NAMES = ['None', 'P(w)', 'R(w)', 'N(w)', 'B(w)', 'Q(w)', 'K(w)',
+               'K(b)', 'Q(b)', 'B(b)', 'N(b)', 'R(b)', 'P(b)']
+PIECE_CODES = {name: (code if code <= 6 else code - 13) for code, name in enumerate(PIECE_NAMES)}
+
+BACK_RANK = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+
+
+def _squares_between(from_index, to_index):
+    '''
+    Description: square names strictly between two squares on the same rank, file or
+    diagonal, ordered from `from_index` towards `to_index`. Returns None when the squares
+    are not connected by a line.
+    '''
+    from_file, from_rank = from_index & 7, from_index >> 3
+    to_file, to_rank = to_index & 7, to_index >> 3
+    file_dist, rank_dist = to_file - from_file, to_rank - from_rank
+    if from_index == to_index or (file_dist and rank_dist and abs(file_dist) != abs(rank_dist)):
+        return None
+    step_file = (file_dist > 0) - (file_dist < 0)
+    step_rank = (rank_dist > 0) - (rank_dist < 0)
+    between = []
+    for i in range(1, max(abs(file_dist), abs(rank_dist))):
+        between.append(SQUARE_NAMES[(from_rank + i*step_rank)*8 + from_file + i*step_file])
+    return between
+
+
+class _Between(dict):
+    # Rows are computed the first time they are asked for, which is when a blocked slider
+    # is reported, instead of all 4096 pairs on every start of chess.py
+    def __missing__(self, from_name):
+        from_index = SQUARE_INDEX[from_name]
+        row = self[from_name] = {to_name: _squares_between(from_index, j) for j, to_name in enumerate(SQUARE_NAMES)}
+        return row
+
+
+# BETWEEN[from_square][to_square] lists the squares a slider crosses, computed once per
+# square so the validators never rebuild square names with chr/ord/str(int(...)).
+BETWEEN = _Between()
+
+
+class ArrayBoard:
+    '''
+    Description: a board backed by a 64-entry `array('b')` of small-int piece codes.
+
+    Indexing with a square name reads and writes the same strings used by the dict board
+    ('P(w)', 'None', ...), so `print_board`, `move_piece` and `check_validity` work on it
+    unchanged. Integer code is available through `squares` and `code_at`.
+
+    The board also keeps a 64-bit mask per color and piece type (`pieces[color][piece]`)
+    and per color (`occupied[color]`), updated incrementally by `put`. `attacks` holds the
+    `AttackMaps` of the `Position` that owns the board, when it keeps them (see
+    `Position.track_attacks`), and None otherwise.
+    '''
+    __slots__ = ('squares', 'pieces', 'occupied', 'attacks')
+
+    def __init__(self, squares=None):
+        self.squares = array('b', squares if squares is not None else bytes(64))
+        white, black = [0]*7, [0]*7
+        for index, code in enumerate(self.squares):
+            if code > 0:
+                white[code] |= 1 << index
+            elif code:
+                black[-code] |= 1 << index
+        self.pieces = [black, white]
+        self.occupied = [sum(black), sum(white)]
+        self.attacks = None
+
+    @classmethod
+    def from_dict(cls, board):
+        '''
+        Description: builds an `ArrayBoard` from a dict board such as `initialize_board()`.
+        '''
+        return cls([PIECE_CODES[board[name]] for name in SQUARE_NAMES])
+
+    def to_dict(self):
+        '''
+        Description: returns the equivalent dict board, keyed like `initialize_board()`.
+        '''
+        return {name: PIECE_NAMES[self.squares[SQUARE_INDEX[name]]] for name in DICT_ORDER}
+
+    def code_at(self, square):
+        return self.squares[SQUARE_INDEX[square]]
+
+    def put(self, index, code):
+        '''
+        Description: places piece `code` (or EMPTY) on square `index`, replacing whatever
+        was there and keeping the masks in sync.
+        '''
+        old = self.squares[index]
+        bit = 1 << index
+        if old:
+            color = old > 0
+            self.pieces[color][abs(old)] ^= bit
+            self.occupied[color] ^= bit
+        if code:
+            color = code > 0
+            self.pieces[color][abs(code)] |= bit
+            self.occupied[color] |= bit
+        self.squares[index] = code
+
+    def copy(self):
+        return ArrayBoard(self.squares)
+
+    def __getitem__(self, square):
+        return PIECE_NAMES[self.squares[SQUARE_INDEX[square]]]
+
+    def __setitem__(self, square, piece):
+        self.put(SQUARE_INDEX[square], PIECE_CODES[piece])
+
+    def __contains__(self, square):
+        return square in SQUARE_INDEX
+
+    def __iter__(self):
+        return iter(DICT_ORDER)
+
+    def __len__(self):
+        return 64
+
+    def __eq__(self, other):
+        if isinstance(other, ArrayBoard):
+            return self.squares == other.squares
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def keys(self):
+        return SQUARE_INDEX.keys()
+
+    def values(self):
+        return [self[name] for name in DICT_ORDER]
+
+    def items(self):
+        return [(name, self[name]) for name in DICT_ORDER]
+
+
+def initialize_array_board():
+    '''
+    Description: returns an `ArrayBoard` holding the starting position.
+    '''
+    squares = [EMPTY]*64
+    for file in range(8):
+        squares[file] = BACK_RANK[file]
+        squares[8 + file] = PAWN
+        squares[48 + file] = -PAWN
+        squares[56 + file] = -BACK_RANK[file]
+    return ArrayBoard(squares)
+
+
+def as_array_board(board):
+    '''
+    Description: returns `board` itself if it is an `ArrayBoard`, else converts a dict board.
+    '''
+    return board if isinstance(board, ArrayBoard) else ArrayBoard.from_dict(board)
@@ -0,0 +1,116 @@
+# attack_maps.py
+# per-color attack counts for every square, kept up to date move by move
+from array_board import BISHOP, QUEEN, ROOK
+from bitboard import bishop_attacks, piece_attacks, rook_attacks, squares_of
+
+
+class AttackMaps:
+    '''
+    Description: `counts[color][square]` is the number of pieces of `color` attacking
+    `square` on `board`, so "is this square attacked?" and "is the king in check?" are a
+    single list lookup.
+
+    A move only changes the attacks of the pieces standing on the squares it changes and
+    of the sliders whose rays reach those squares (a slider whose attacks change always
+    reaches the first changed square on its ray, both before and after the move). `begin`
+    notes those contributions before the board is changed and `end` replaces them with
+    the new ones. Every ply keeps a journal of the (color, squares lost, squares gained)
+    changes it made, and `undo` applies them the other way round.
+    '''
+    __slots__ = ('board', 'counts', 'history', '_pending')
+
+    def __init__(self, board):
+        self.board = board
+        self.counts = [[0]*64, [0]*64]
+        self.history = []
+        self._pending = None
+        occupied = board.occupied[0] | board.occupied[1]
+        self._apply([(color, 0, attacks) for color, attacks in self._pieces_attacks(range(64), occupied)], 1)
+
+    def _sliders_reaching(self, changed, occupied):
+        pieces = self.board.pieces
+        diagonal = pieces[0][BISHOP] | pieces[0][QUEEN] | pieces[1][BISHOP] | pieces[1][QUEEN]
+        straight = pieces[0][ROOK] | pieces[0][QUEEN] | pieces[1][ROOK] | pieces[1][QUEEN]
+        mask = 0
+        for square in changed:
+            mask |= (bishop_attacks(square, occupied) & diagonal) | (rook_attacks(square, occupied) & straight)
+        for square in changed:
+            mask &= ~(1 << square)
+        return mask
+
+    def _pieces_attacks(self, among, occupied):
+        '''
+        Description: (color, attacks) of every piece standing on the squares `among`.
+        '''
+        squares = self.board.squares
+        return [(squares[square] > 0, piece_attacks(abs(squares[square]), square, squares[square] > 0, occupied))
+                for square in among if squares[square]]
+
+    def _apply(self, journal, sign):
+        '''
+        Description: adds `sign` to the counts of the squares gained and takes it from
+        those lost, for every (color, lost, gained) of `journal`.
+        '''
+        all_counts = self.counts
+        for color, lost, gained in journal:
+            counts = all_counts[color]
+            while lost:
+                bit = lost & -lost
+                counts[bit.bit_length() - 1] -= sign
+                lost ^= bit
+            while gained:
+                bit = gained & -gained
+                counts[bit.bit_length() - 1] += sign
+                gained ^= bit
+
+    def begin(self, changed):
+        '''
+        Description: call before the pieces on the `changed` squares are moved.
+        '''
+        board = self.board
+        squares = board.squares
+        occupied = board.occupied[0] | board.occupied[1]
+        # Sliders that stay where they are only need the difference between their old
+        # and new attacks, so their old attacks are kept until `end`
+        sliders = []
+        for square in squares_of(self._sliders_reaching(changed, occupied)):
+            code = squares[square]
+            sliders.append((square, code, piece_attacks(abs(code), square, code > 0, occupied)))
+        self._pending = (changed, sliders, self._pieces_attacks(changed, occupied))
+
+    def end(self):
+        '''
+        Description: call once the move is on the board, to count the new attacks.
+        '''
+        changed, sliders, removed = self._pending
+        board = self.board
+        occupied = board.occupied[0] | board.occupied[1]
+        journal = []
+        for square, code, old in sliders:
+            new = piece_attacks(abs(code), square, code > 0, occupied)
+            if new != old:
+                journal.append((code > 0, old & ~new, new & ~old))
+        # A piece that moves (the mover, the castling rook) is paired with its attacks from
+        # the square it left, so only the squares it stops or starts attacking change
+        added = self._pieces_attacks(changed, occupied)
+        for color, old in removed:
+            for i, (added_color, new) in enumerate(added):
+                if added_color == color:
+                    del added[i]
+                    journal.append((color, old & ~new, new & ~old))
+                    break
+            else:
+                journal.append((color, old, 0))
+        journal += [(color, 0, new) for color, new in added]
+        self._apply(journal, 1)
+        self.history.append(journal)
+        self._pending = None
+
+    def undo(self):
+        '''
+        Description: takes back the changes of the last `begin` and `end`.
+        '''
+        self._apply(self.history.pop(), -1)
+
+    def is_attacked(self, square, color):
+        return self.counts[color][square] > 0
@@ -0,0 +1,253 @@
+# batch_eval.py
+# vectorized static evaluation of many positions at once, with NumPy
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from array_board import BISHOP, BLACK, KNIGHT, PAWN, PIECE_CODES, QUEEN, ROOK, SQUARE_NAMES, WHITE, ArrayBoard
+from bitboard import piece_attacks
+from engine import PIECE_SQUARE
+
+logger = logging.getLogger('chess.batch_eval')
+
+# Plane p holds the white pieces of code p + 1 for p < 6 and the black pieces of code
+# p - 5 after that: P, R, N, B, Q, K (w), then P, R, N, B, Q, K (b).
+PLANE_CODES = np.array([1, 2, 3, 4, 5, 6, -1, -2, -3, -4, -5, -6], dtype=np.int8)
+PLANES = len(PLANE_CODES)
+
+# Material plus piece-square values per plane and square, from white's point of view, the
+# same values the engine's `evaluate` uses
+PIECE_SQUARE_PLANES = np.array([PIECE_SQUARE[WHITE][code] if code > 0 else [-value for value in PIECE_SQUARE[BLACK][-code]]
+                                for code in PLANE_CODES.tolist()], dtype=np.int32)
+
+_FILE_A = np.uint64(0x0101010101010101)
+_FILE_H = np.uint64(0x8080808080808080)
+_FILE_AB = np.uint64(0x0303030303030303)
+_FILE_GH = np.uint64(0xC0C0C0C0C0C0C0C0)
+# Directions as (shift, squares a shifted piece must not land on): positive shifts go
+# left (towards h8), negative ones right; the masks drop pieces that wrapped around a file
+STRAIGHT_DIRECTIONS = [(8, ~np.uint64(0)), (-8, ~np.uint64(0)), (1, ~_FILE_A), (-1, ~_FILE_H)]
+DIAGONAL_DIRECTIONS = [(9, ~_FILE_A), (7, ~_FILE_H), (-7, ~_FILE_A), (-9, ~_FILE_H)]
+KNIGHT_DIRECTIONS = [(17, ~_FILE_A), (15, ~_FILE_H), (10, ~_FILE_AB), (6, ~_FILE_GH),
+                     (-6, ~_FILE_AB), (-10, ~_FILE_GH), (-15, ~_FILE_A), (-17, ~_FILE_H)]
+
+
+# Set bits of every byte value, for the popcount of NumPy releases before 2.0
+_BYTE_COUNTS = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def _byte_popcount(bitboards):
+    '''
+    Description: (N,) number of set bits of each of `bitboards`, looked up byte by byte.
+    '''
+    as_bytes = np.ascontiguousarray(bitboards, dtype=np.uint64).view(np.uint8).reshape(len(bitboards), 8)
+    return _BYTE_COUNTS[as_bytes].sum(axis=1, dtype=np.uint8)
+
+
+# np.bitwise_count appeared in NumPy 2.0
+popcount = getattr(np, 'bitwise_count', _byte_popcount)
+
+
+def _shift(bitboards, amount):
+    return bitboards << np.uint64(amount) if amount > 0 else bitboards >> np.uint64(-amount)
+
+
+def _ray_attacks(sliders, empty, amount, mask):
+    '''
+    Description: union of the attacks of `sliders` in one direction (Kogge-Stone fill).
+    '''
+    empty = empty & mask
+    sliders = sliders | (empty & _shift(sliders, amount))
+    empty = empty & _shift(empty, amount)
+    sliders = sliders | (empty & _shift(sliders, 2*amount))
+    empty = empty & _shift(empty, 2*amount)
+    sliders = sliders | (empty & _shift(sliders, 4*amount))
+    return _shift(sliders, amount) & mask
+
+
+def bitboards(planes):
+    '''
+    Description: (N, 12) uint64 array, one bitboard per plane (bit i is square i).
+    '''
+    packed = np.packbits(planes.astype(bool), axis=2, bitorder='little')
+    return np.ascontiguousarray(packed).view('<u8').reshape(len(planes), PLANES)
+
+
+def board_codes(boards):
+    '''
+    Description: (N, 64) int8 array of piece codes for an iterable of boards: `Position`s,
+    `ArrayBoard`s or dict boards such as `initialize_board()` with 'P(w)' style strings.
+    '''
+    rows = []
+    for board in boards:
+        board = getattr(board, 'board', board)
+        if isinstance(board, ArrayBoard):
+            rows.append(board.squares.tobytes())
+        else:
+            rows.append(bytes(PIECE_CODES[board[name]] & 0xFF for name in SQUARE_NAMES))
+    return np.frombuffer(b''.join(rows), dtype=np.int8).reshape(len(rows), 64)
+
+
+def encode(boards):
+    '''
+    Description: encodes boards (see `board_codes`) as an (N, 12, 64) uint8 tensor of
+    piece planes, see PLANE_CODES for the plane order.
+    '''
+    return encode_codes(board_codes(boards))
+
+
+def encode_codes(codes):
+    return (codes[:, None, :] == PLANE_CODES[None, :, None]).astype(np.uint8)
+
+
+def material_pst(planes):
+    '''
+    Description: (N,) material plus piece-square score from white's point of view.
+    '''
+    return planes.reshape(len(planes), -1).astype(np.int32) @ PIECE_SQUARE_PLANES.reshape(-1)
+
+
+def mobility(planes):
+    '''
+    Description: (N, 2) number of pseudo-legal knight, bishop, rook and queen moves of
+    black (column 0) and white (column 1).
+
+    Rays of different sliders in one direction never share a square they can move to
+    (the nearer slider blocks the farther one), and neither do the knights shifted by one
+    knight jump, so the per-piece counts are popcounts of whole-board shifts and fills.
+    '''
+    boards = bitboards(planes)
+    own = [np.bitwise_or.reduce(boards[:, 6:], axis=1), np.bitwise_or.reduce(boards[:, :6], axis=1)]
+    empty = ~(own[BLACK] | own[WHITE])
+    result = np.zeros((len(planes), 2), dtype=np.int32)
+    for color, offset in ((BLACK, 6), (WHITE, 0)):
+        pieces = boards[:, offset:offset + 6]
+        queens = pieces[:, QUEEN - 1]
+        targets = ~own[color]
+        moves = np.zeros(len(planes), dtype=np.int32)
+        for sliders, directions in ((pieces[:, ROOK - 1] | queens, STRAIGHT_DIRECTIONS),
+                                    (pieces[:, BISHOP - 1] | queens, DIAGONAL_DIRECTIONS)):
+            for amount, mask in directions:
+                moves += popcount(_ray_attacks(sliders, empty, amount, mask) & targets)
+        knights = pieces[:, KNIGHT - 1]
+        for amount, mask in KNIGHT_DIRECTIONS:
+            moves += popcount(_shift(knights, amount) & mask & targets)
+        result[:, color] = moves
+    return result
+
+
+def pawn_structure(planes):
+    '''
+    Description: (N, 2) arrays of doubled, isolated and passed pawns of black (column 0)
+    and white (column 1). A doubled pawn is every pawn beyond the first on a file.
+    '''
+    count = len(planes)
+    pawns = [planes[:, 6 + PAWN - 1].reshape(count, 8, 8).astype(bool),
+             planes[:, PAWN - 1].reshape(count, 8, 8).astype(bool)]
+    doubled = np.zeros((count, 2), dtype=np.int32)
+    isolated = np.zeros((count, 2), dtype=np.int32)
+    passed = np.zeros((count, 2), dtype=np.int32)
+    for color in (BLACK, WHITE):
+        on_file = pawns[color].sum(axis=1)
+        doubled[:, color] = np.maximum(on_file - 1, 0).sum(axis=1)
+        has_pawn = np.pad(on_file > 0, ((0, 0), (1, 1)))
+        neighbours = has_pawn[:, :-2] | has_pawn[:, 2:]
+        isolated[:, color] = (on_file * ~neighbours).sum(axis=1)
+
+        # Enemy pawns strictly ahead on the same file, then spread to the adjacent files
+        enemy = pawns[1 - color]
+        if color == WHITE:
+            ahead = np.flip(np.logical_or.accumulate(np.flip(enemy, axis=1), axis=1), axis=1)
+            ahead = np.concatenate([ahead[:, 1:], np.zeros((count, 1, 8), dtype=bool)], axis=1)
+        else:
+            ahead = np.logical_or.accumulate(enemy, axis=1)
+            ahead = np.concatenate([np.zeros((count, 1, 8), dtype=bool), ahead[:, :-1]], axis=1)
+        padded = np.pad(ahead, ((0, 0), (0, 0), (1, 1)))
+        blocked = padded[:, :, :-2] | padded[:, :, 1:-1] | padded[:, :, 2:]
+        passed[:, color] = (pawns[color] & ~blocked).sum(axis=(1, 2))
+    return {'doubled': doubled, 'isolated': isolated, 'passed': passed}
+
+
+def evaluate_batch(planes):
+    '''
+    Description: static features of every position of an (N, 12, 64) plane tensor, as a
+    dict of arrays: 'material_pst' (N,) and 'mobility', 'doubled', 'isolated', 'passed'
+    (N, 2), indexed by color like the rest of chess.py (BLACK = 0, WHITE = 1).
+    '''
+    features = {'material_pst': material_pst(planes), 'mobility': mobility(planes)}
+    features.update(pawn_structure(planes))
+    return features
+
+
+def reference_features(board):
+    '''
+    Description: the features of `evaluate_batch` for one `ArrayBoard`, computed square
+    by square in plain Python. It is the reference the vectorized code must match.
+    '''
+    squares = board.squares
+    occupied = board.occupied[0] | board.occupied[1]
+    features = {'material_pst': 0, 'mobility': [0, 0], 'doubled': [0, 0], 'isolated': [0, 0], 'passed': [0, 0]}
+    pawn_files = [[[] for _ in range(8)], [[] for _ in range(8)]]
+    for square, code in enumerate(squares):
+        if not code:
+            continue
+        color, piece = int(code > 0), abs(code)
+        value = PIECE_SQUARE[color][piece][square]
+        features['material_pst'] += value if color == WHITE else -value
+        if piece in (KNIGHT, BISHOP, ROOK, QUEEN):
+            features['mobility'][color] += bin(piece_attacks(piece, square, color, occupied)
+                                               & ~board.occupied[color]).count('1')
+        elif piece == PAWN:
+            pawn_files[color][square & 7].append(square >> 3)
+    for color in (BLACK, WHITE):
+        files = pawn_files[color]
+        for file, ranks in enumerate(files):
+            features['doubled'][color] += max(len(ranks) - 1, 0)
+            if not any(files[neighbour] for neighbour in (file - 1, file + 1) if 0 <= neighbour < 8):
+                features['isolated'][color] += len(ranks)
+            for rank in ranks:
+                enemies = [enemy for neighbour in (file - 1, file, file + 1) if 0 <= neighbour < 8
+                           for enemy in pawn_files[1 - color][neighbour]]
+                if not any(enemy > rank if color == WHITE else enemy < rank for enemy in enemies):
+                    features['passed'][color] += 1
+    return features
+
+
+def export(path, planes, features=None):
+    '''
+    Description: saves the plane tensor to `path`: a '.npy' file holds the planes only,
+    any other path is written as a compressed '.npz' archive with 'planes' and one array
+    per feature.
+    '''
+    path = str(path)
+    if path.endswith('.npy'):
+        np.save(path, planes)
+    else:
+        np.savez_compressed(path, planes=planes, **(features or {}))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py batch-eval',
+                                     description='Encode positions as piece planes and compute their static features.')
+    parser.add_argument('path', help="file of FENs, or a PGN file with --pgn (every position of every game)")
+    parser.add_argument('--pgn', action='store_true', help='read the positions of the games of a PGN file')
+    parser.add_argument('-o', '--output', required=True, help='.npz file (planes and features) or .npy file (planes)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.pgn:
+        import pgn
+        codes = board_codes(position for _, _, position in pgn.read_positions(args.path))
+    else:
+        from fen import load_fens
+        codes = board_codes(load_fens(args.path))
+    loaded = time.perf_counter()
+    planes = encode_codes(codes)
+    # A .npy file only holds the planes
+    features = None if args.output.endswith('.npy') else evaluate_batch(planes)
+    export(args.output, planes, features)
+    done = time.perf_counter()
+    logger.info('%s positions: loaded in %.2fs, encoded and evaluated in %.2fs, written to %s',
+                f'{len(planes):,}', loaded - start, done - loaded, args.output)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# bench_attacks.py
+# square threat and check queries: attack maps against scanning the attackers
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chess
+from array_board import SQUARE_NAMES
+from position import Position
+
+
+def random_positions(count, seed=0):
+    '''
+    Description: `count` positions reached by random play, each with its attack maps.
+    '''
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position().track_attacks()
+        for _ in range(rng.randint(1, 80)):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.make(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def time_queries(positions, queries):
+    '''
+    Description: seconds taken by `queries` calls to `is_square_threatened` spread over
+    `positions`, every square asked for both colors.
+    '''
+    boards = [position.board for position in positions]
+    start = time.perf_counter()
+    done = 0
+    while done < queries:
+        for board in boards:
+            for square in SQUARE_NAMES:
+                chess.is_square_threatened(board, '(w)', square)
+                chess.is_square_threatened(board, '(b)', square)
+            done += 128
+    return time.perf_counter() - start, done
+
+
+def time_make_unmake(positions, track):
+    moves = [(position, position.legal_moves()) for position in positions]
+    start = time.perf_counter()
+    count = 0
+    for position, legal_moves in moves:
+        if not track:
+            attacks, position.attacks = position.attacks, None
+        for move in legal_moves:
+            position.make(move)
+            position.unmake()
+        count += len(legal_moves)
+        if not track:
+            position.attacks = attacks
+    return time.perf_counter() - start, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare attack-map lookups with scanning for attackers.')
+    parser.add_argument('-n', '--positions', type=int, default=200)
+    parser.add_argument('-q', '--queries', type=int, default=200000)
+    args = parser.parse_args()
+
+    positions = random_positions(args.positions)
+    print(f'{len(positions)} positions')
+
+    elapsed, done = time_queries(positions, args.queries)
+    print(f'is_square_threatened, attack maps: {done/elapsed:>12,.0f} queries/s')
+    for position in positions:
+        position.board.attacks = None
+    elapsed, done = time_queries(positions, args.queries)
+    print(f'is_square_threatened, scanning:    {done/elapsed:>12,.0f} queries/s')
+    for position in positions:
+        position.board.attacks = position.attacks
+
+    for track in (False, True):
+        elapsed, count = time_make_unmake(positions, track)
+        label = 'with attack maps' if track else 'without'
+        print(f'make/unmake, {label:<16}   {count/elapsed:>12,.0f} moves/s')
+
+    # Check detection, as play() does after every move
+    start = time.perf_counter()
+    checks = sum(position.is_check() for position in positions for _ in range(100))
+    elapsed = time.perf_counter() - start
+    print(f'is_check, attack maps:             {len(positions)*100/elapsed:>12,.0f} queries/s ({checks//100} in check)')
+    for position in positions:
+        position.attacks = None
+    start = time.perf_counter()
+    sum(position.is_check() for position in positions for _ in range(100))
+    elapsed = time.perf_counter() - start
+    print(f'is_check, scanning:                {len(positions)*100/elapsed:>12,.0f} queries/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# bench_batch_eval.py
+# vectorized batch evaluation against the scalar reference
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+
+from batch_eval import board_codes, encode_codes, evaluate_batch, reference_features
+from position import Position
+
+
+def random_boards(count, seed=0):
+    '''
+    Description: `count` boards reached by random play from the starting position.
+    '''
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        position = Position()
+        for _ in range(rng.randint(1, 120)):
+            moves = position.legal_moves()
+            if not moves or len(boards) >= count:
+                break
+            position.make(rng.choice(moves))
+            boards.append(position.board.copy())
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time batch evaluation against the scalar reference.')
+    parser.add_argument('-n', '--count', type=int, default=20000, help='positions to evaluate')
+    parser.add_argument('--reference-count', type=int, default=2000,
+                        help='positions to evaluate with the scalar reference')
+    args = parser.parse_args()
+
+    boards = random_boards(args.count)
+    start = time.perf_counter()
+    codes = board_codes(boards)
+    encoded = time.perf_counter()
+    planes = encode_codes(codes)
+    features = evaluate_batch(planes)
+    elapsed = time.perf_counter() - encoded
+    print(f'batch:     {len(boards)/(encoded - start):>10,.0f} positions/s gathering codes, '
+          f'{len(boards)/elapsed:>10,.0f} positions/s encoding and evaluating')
+
+    reference = boards[:args.reference_count]
+    start = time.perf_counter()
+    expected = [reference_features(board) for board in reference]
+    elapsed = time.perf_counter() - start
+    print(f'reference: {len(reference)/elapsed:>10,.0f} positions/s')
+
+    for name, values in features.items():
+        if not np.array_equal(values[:len(reference)], np.array([features_[name] for features_ in expected])):
+            print(f'MISMATCH in {name}')
+            sys.exit(1)
+    print(f'features match the reference on {len(reference):,} positions')
+
+
+if __name__ == '__main__':
+    main()
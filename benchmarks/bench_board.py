@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# bench_board.py
+# move validation throughput: dict board vs ArrayBoard
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chess
+from array_board import ArrayBoard, initialize_array_board
+
+# Moves from the starting position covering every validator, legal and illegal.
+MOVES = ['e4', 'd4', 'a3', 'h4', 'e5', 'Nf3', 'Nc3', 'Nh3', 'Nd4',
+         'Bb5', 'Bc4', 'Ra3', 'Rh3', 'Qh5', 'Qd3', 'Kf2', 'dxe5']
+
+
+def bench(board, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for move in MOVES:
+            chess.check_validity(board, '(w)', move)
+    elapsed = time.perf_counter() - start
+    return iterations*len(MOVES)/elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    dict_board = chess.initialize_board()
+    array_board = initialize_array_board()
+    assert ArrayBoard.from_dict(dict_board) == array_board
+    for name, board in [('dict', dict_board), ('ArrayBoard', array_board)]:
+        rate = bench(board, args.iterations)
+        print(f'{name:>10}: {rate:12,.0f} validations/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# bench_explore.py
+# position index: build throughput with bounded memory and lookup latency of positions from the games
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import explore
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time building and querying a position statistics index.')
+    parser.add_argument('paths', nargs='+', help='PGN or game record (.cgr) files to index')
+    parser.add_argument('--chunk-entries', type=int, default=1 << 16,
+                        help='(position, move) pairs held in memory before spilling (default: 65536)')
+    parser.add_argument('--lookups', type=int, default=2000, help='positions to look up (default: 2000)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'positions.idx')
+        games = (game for name in args.paths for game in explore.read_games(name))
+        # tracemalloc slows the build several times over, compare build times between runs of this script only
+        tracemalloc.start()
+        start = time.perf_counter()
+        game_count, entry_count = explore.build_index(games, path, chunk_entries=args.chunk_entries)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'build: {game_count} games, {entry_count:,} entries in {elapsed:.2f}s '
+              f'({game_count/elapsed:,.0f} games/s), peak memory {peak/2**20:.1f} MB, '
+              f'index {os.path.getsize(path)/2**20:.1f} MB')
+
+        # Positions to query: a few plies into random games, where most queries land
+        rng = random.Random(args.seed)
+        sample = [game for name in args.paths for game in explore.read_games(name)]
+        positions = []
+        for _ in range(args.lookups):
+            game = rng.choice(sample)
+            moves = list(explore.game_moves(game))
+            ply = rng.randrange(min(len(moves), 20))
+            positions.append(moves[ply][0])
+        with explore.ExplorerIndex(path) as index:
+            times = []
+            for key in positions:
+                start = time.perf_counter()
+                found = list(index.entries(key))
+                times.append((time.perf_counter() - start)*1000)
+                if not found:
+                    raise RuntimeError('An indexed position is missing from the index')
+        times.sort()
+        print(f'lookup: median {statistics.median(times):.3f} ms, '
+              f'99th percentile {times[int(0.99*len(times))]:.3f} ms, max {times[-1]:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
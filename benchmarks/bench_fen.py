@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# bench_fen.py
+# bulk FEN loading throughput
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fen import STARTING_FEN, from_fen, load_fens, to_fen
+
+
+def write_fens(path, count, seed=0):
+    '''
+    Description: writes `count` FENs reached by random play from the starting position.
+    '''
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        written = 0
+        while written < count:
+            position = from_fen(STARTING_FEN)
+            for _ in range(rng.randint(1, 120)):
+                moves = position.legal_moves()
+                if not moves or written >= count:
+                    break
+                position.make(rng.choice(moves))
+                f.write(to_fen(position) + '\n')
+                written += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time loading positions from a file of FENs.')
+    parser.add_argument('path', nargs='?', default='fens.txt', help='FEN file, one position per line')
+    parser.add_argument('-n', '--count', type=int, default=100000,
+                        help='positions to generate when the file does not exist (e.g. 1000000)')
+    args = parser.parse_args()
+
+    if not Path(args.path).exists():
+        print(f'Generating {args.count:,} FENs into {args.path}...')
+        write_fens(args.path, args.count)
+
+    start = time.perf_counter()
+    count = sum(1 for _ in load_fens(args.path))
+    elapsed = time.perf_counter() - start
+    print(f'Loaded {count:,} positions in {elapsed:.2f}s: {count/elapsed:,.0f} positions/s')
+
+
+if __name__ == '__main__':
+    main()
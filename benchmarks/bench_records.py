@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# bench_records.py
+# binary game records against PGN text: file size, replay speed and random access to one game
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chess
+import pgn
+import records
+from position import Position
+
+
+def random_games(count, max_plies, seed):
+    '''
+    Description: `count` game dicts of random legal moves, each ending at mate, a draw or
+    `max_plies` plies.
+    '''
+    rng = random.Random(seed)
+    games = []
+    for number in range(count):
+        position = Position()
+        moves = []
+        result = '*'
+        while len(moves) < max_plies:
+            ended = chess.game_result(position)
+            if ended is not None:
+                result = ended[0]
+                break
+            move = rng.choice(position.legal_moves())
+            moves.append(chess.move_to_san(position, move))
+            position.make(move)
+        games.append({'headers': {'Event': 'bench', 'Round': str(number + 1)}, 'moves': moves, 'result': result})
+    return games
+
+
+def replay_text(path):
+    '''
+    Description: reads and replays every game of a PGN file, SAN parsing included.
+    Returns the number of plies.
+    '''
+    chess.san_cache.clear()
+    plies = 0
+    for game in pgn.read_games(path):
+        for _ in pgn.replay(game['moves'], pgn.starting_position(game)):
+            plies += 1
+    return plies
+
+
+def replay_records(path):
+    '''
+    Description: reads and replays every game of a record file from its move codes.
+    Returns the number of plies.
+    '''
+    plies = 0
+    with records.Records(path) as games:
+        for n in range(len(games)):
+            for _ in games.positions(n):
+                plies += 1
+    return plies
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    return time.perf_counter() - start, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare binary game records with PGN text.')
+    parser.add_argument('pgn', nargs='?', help='PGN file to convert (default: random games)')
+    parser.add_argument('-n', '--games', type=int, default=500, help='random games to generate (default: 500)')
+    parser.add_argument('--max-plies', type=int, default=200, help='longest random game (default: 200)')
+    parser.add_argument('--lookups', type=int, default=20, help='random single-game fetches to time (default: 20)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        text_path = args.pgn
+        if text_path is None:
+            text_path = os.path.join(directory, 'games.pgn')
+            pgn.write_games(text_path, random_games(args.games, args.max_plies, args.seed))
+        record_path = os.path.join(directory, 'games' + records.EXTENSION)
+        elapsed, (written, skipped) = timed(records.write_games, record_path, pgn.read_games(text_path))
+        print(f'convert: {written} games in {elapsed:.2f}s ({skipped} with illegal moves left out)')
+
+        text_size, record_size = os.path.getsize(text_path), os.path.getsize(record_path)
+        print(f'size: PGN {text_size:,} bytes, records {record_size:,} bytes ({text_size/record_size:.1f}x smaller)')
+
+        text_time, text_plies = timed(replay_text, text_path)
+        record_time, record_plies = timed(replay_records, record_path)
+        print(f'replay PGN:     {text_time:>7.2f}s, {text_plies/text_time:>10,.0f} plies/s')
+        print(f'replay records: {record_time:>7.2f}s, {record_plies/record_time:>10,.0f} plies/s '
+              f'({text_time/record_time:.1f}x faster)')
+
+        # Fetching game n from text means reading the games before it
+        rng = random.Random(args.seed)
+        numbers = [rng.randrange(written) for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for n in numbers:
+            game = next(itertools.islice(pgn.read_games(text_path), n, None))
+            position = pgn.starting_position(game)
+            for _ in pgn.replay(game['moves'], position):
+                pass
+        text_lookup = (time.perf_counter() - start)/len(numbers)
+        with records.Records(record_path) as games:
+            start = time.perf_counter()
+            for n in numbers:
+                games.replay(n)
+            record_lookup = (time.perf_counter() - start)/len(numbers)
+        print(f'fetch and replay one game: PGN {1000*text_lookup:.2f} ms, records {1000*record_lookup:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# bench_render.py
+# frames per second of every render format, against printing the board square by square
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from array_board import FILES, RANKS
+from position import Position
+from render import FORMATS, GRID_FORMATS, Renderer
+
+
+def random_game(plies, seed=0):
+    '''
+    Description: the positions of a random game of up to `plies` plies, as copies.
+    '''
+    rng = random.Random(seed)
+    position = Position()
+    positions = [position.copy()]
+    for _ in range(plies):
+        moves = position.legal_moves()
+        if not moves:
+            break
+        position.make(rng.choice(moves))
+        positions.append(position.copy())
+    return positions
+
+
+def print_per_square(board, out):
+    '''
+    Description: the text grid written the way `print_board` used to, one print per square.
+    '''
+    for row in RANKS[::-1]:
+        print(row, end='  ', file=out)
+        for col in FILES:
+            print(board[col+row], end=' ', file=out)
+        print(file=out)
+    for col in FILES:
+        print('  ' + col, end='  ', file=out)
+    print(file=out)
+    print('-'*(5*8 + 4), file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time writing board frames to /dev/null.')
+    parser.add_argument('-n', '--plies', type=int, default=200, help='plies of the random game rendered')
+    parser.add_argument('-r', '--repeat', type=int, default=20, help='times the game is rendered')
+    args = parser.parse_args()
+
+    positions = random_game(args.plies)
+    frames = len(positions)*args.repeat
+    with open(os.devnull, 'w') as out:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for position in positions:
+                print_per_square(position.board, out)
+                out.flush()
+        elapsed = time.perf_counter() - start
+        print(f'{"per-square print":<18} {frames/elapsed:>10,.0f} frames/s')
+
+        for fmt, diff in [(fmt, False) for fmt in FORMATS] + [(fmt, True) for fmt in GRID_FORMATS]:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                renderer = Renderer(fmt, out, diff)
+                for position in positions:
+                    renderer.frame(position)
+                renderer.close()
+            elapsed = time.perf_counter() - start
+            print(f'{fmt + (" diff" if diff else ""):<18} {frames/elapsed:>10,.0f} frames/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# bench_smp.py
+# lazy SMP scaling: nodes per second and time to depth from 1 to N worker processes
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fen import from_fen
+from smp import ParallelSearcher
+
+POSITIONS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r1bq1rk1/pp2bppp/2n1pn2/2pp4/3P4/2PBPN2/PP1N1PPP/R2QK2R w KQ - 0 8',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time lazy SMP searches to a fixed depth with 1 to N workers.')
+    parser.add_argument('-n', '--workers', type=int, default=os.cpu_count() or 1, help='most workers to try')
+    parser.add_argument('-d', '--depth', type=int, default=5, help='depth every search goes to')
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPUs, depth {args.depth}, {len(POSITIONS)} positions')
+    baseline = None
+    for workers in range(1, args.workers + 1):
+        with ParallelSearcher(workers) as searcher:
+            elapsed = nodes = 0
+            for fen in POSITIONS:
+                searcher.tt.clear()
+                start = time.perf_counter()
+                result = searcher.search(from_fen(fen), max_depth=args.depth)
+                elapsed += time.perf_counter() - start
+                nodes += result.nodes
+        baseline = baseline or (elapsed, nodes/elapsed)
+        print(f'{workers:>3} workers: {elapsed:>7.2f}s to depth {args.depth} ({baseline[0]/elapsed:.2f}x), '
+              f'{nodes/elapsed:>9,.0f} nodes/s ({nodes/elapsed/baseline[1]:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# bench_startup.py
+# cold start of chess.py commands against requests to one warm `serve-stdin` worker
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CHESS = str(ROOT / 'chess.py')
+
+GAME = ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Ba4', 'Nf6', 'O-O', 'Be7', 'Re1', 'b5', 'Bb3', 'd6',
+        'c3', 'O-O', 'h3', 'Nb8', 'd4', 'Nbd7']
+
+
+def cold(command, runs):
+    '''
+    Description: median wall time, in milliseconds, of `runs` fresh processes running `command`.
+    '''
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append((time.perf_counter() - start)*1000)
+    return statistics.median(times)
+
+
+def warm(runs):
+    '''
+    Description: median time, in milliseconds, of a game request to a warm worker, and
+    the time the worker took to start.
+    '''
+    start = time.perf_counter()
+    worker = subprocess.Popen([sys.executable, CHESS, 'serve-stdin'], cwd=ROOT, stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, text=True, bufsize=1)
+    request = json.dumps({'moves': GAME}) + '\n'
+    times = []
+    for run in range(runs + 1):
+        sent = time.perf_counter()
+        worker.stdin.write(request)
+        worker.stdin.flush()
+        answer = json.loads(worker.stdout.readline())
+        if answer['status'] != 'ok':
+            raise RuntimeError(f'Worker rejected the game: {answer}')
+        if run == 0:
+            started = (time.perf_counter() - start)*1000
+        else:
+            times.append((time.perf_counter() - sent)*1000)
+    worker.stdin.close()
+    worker.wait()
+    return statistics.median(times), started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time cold chess.py starts against a warm serve-stdin worker.')
+    parser.add_argument('-n', '--runs', type=int, default=20, help='runs of every command')
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.pgn', delete=False) as f:
+        f.write('[Event "bench"]\n\n' + ' '.join(GAME) + ' *\n')
+        game_path = f.name
+    try:
+        commands = [
+            ('python -c pass', [sys.executable, '-c', 'pass']),
+            ('chess.py (usage)', [sys.executable, CHESS]),
+            ('chess.py help', [sys.executable, CHESS, 'help']),
+            ('chess.py pgn GAME', [sys.executable, CHESS, 'pgn', game_path]),
+            # Run as a module, chess.py itself is loaded from its cached bytecode too
+            ('python -m chess pgn GAME', [sys.executable, '-m', 'chess', 'pgn', game_path]),
+        ]
+        for name, command in commands:
+            print(f'{name:<26} {cold(command, args.runs):>8.1f} ms')
+    finally:
+        Path(game_path).unlink()
+    per_request, started = warm(args.runs)
+    print(f'{"serve-stdin request":<26} {per_request:>8.1f} ms (worker start and first game: {started:.1f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# load_server.py
+# load generator for the chess.py game server (chess.py serve)
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import chess
+from position import Position
+from server import percentile
+
+
+def random_games(count, max_plies=80, seed=0):
+    '''
+    Description: `count` games of random legal moves, promotions and en passant
+    captures included, as SAN lists. A game stops early at mate or stalemate.
+    '''
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        position = Position()
+        moves = []
+        for _ in range(max_plies):
+            candidates = position.legal_moves()
+            if not candidates:
+                break
+            move = rng.choice(candidates)
+            moves.append(chess.move_to_san(position, move))
+            position.make(move)
+        games.append(moves)
+    return games
+
+
+async def run_client(connect, games, latencies):
+    reader, writer = await connect()
+    for moves in games:
+        writer.write(b'new\n')
+        await reader.readuntil(b'\n\n')
+        for move in moves:
+            start = time.perf_counter()
+            writer.write(move.encode() + b'\n')
+            answer = await reader.readuntil(b'\n\n')
+            latencies.append(time.perf_counter() - start)
+            if not answer.startswith(b'ok'):
+                raise RuntimeError(f'Server rejected {move}: {answer.decode().splitlines()[0]}')
+    writer.write(b'quit\n')
+    await writer.drain()
+    writer.close()
+
+
+async def run(args):
+    if args.unix:
+        def connect():
+            return asyncio.open_unix_connection(args.unix)
+    else:
+        def connect():
+            return asyncio.open_connection(args.host, args.port)
+
+    games = random_games(args.games, args.plies, args.seed)
+    latencies = []
+    start = time.perf_counter()
+    clients = [run_client(connect, [games[(client + i) % len(games)] for i in range(args.games_per_client)], latencies)
+               for client in range(args.clients)]
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f'{args.clients} clients, {len(latencies):,} moves in {elapsed:.2f}s: {len(latencies)/elapsed:,.0f} moves/s')
+    print('client latency ms: ' + ', '.join(f'{name} {percentile(latencies, fraction)*1000:.2f}'
+                                            for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))))
+
+    reader, writer = await connect()
+    writer.write(b'stats\nquit\n')
+    print('server:', json.dumps(json.loads(await reader.readline())))
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play many concurrent random games against a running chess.py server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', metavar='PATH', help='connect to this Unix socket instead of TCP')
+    parser.add_argument('-c', '--clients', type=int, default=200, help='concurrent connections')
+    parser.add_argument('--games-per-client', type=int, default=2)
+    parser.add_argument('--games', type=int, default=50, help='distinct random games to play')
+    parser.add_argument('--plies', type=int, default=80, help='maximum plies per game')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+# bitboard.py
+# attack tables and move generation over the masks kept by ArrayBoard
+from array_board import (BISHOP, EMPTY, KING, KNIGHT, PAWN, PIECE_LETTERS, QUEEN, ROOK, SQUARE_INDEX,
+                         SQUARE_NAMES, WHITE, as_array_board)
+
+# Castling rights, one bit per side and wing.
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+
+FULL = (1 << 64) - 1
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+FILE_MASKS = [0x0101010101010101 << file for file in range(8)]
+RANK_MASKS = [RANK_1 << (8*rank) for rank in range(8)]
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+
+# Moves are 16-bit integers: bits 0-5 hold the origin square, bits 6-11 the target
+# square and bits 12-15 the promotion piece type (0 when the move is not a promotion).
+# Castling is encoded as the king's two-square move, e.g. e1 -> g1.
+def encode_move(from_index, to_index, promotion=0):
+    return from_index | (to_index << 6) | (promotion << 12)
+
+
+def decode_move(move):
+    return move & 63, (move >> 6) & 63, move >> 12
+
+
+def move_to_uci(move):
+    '''
+    Description: long algebraic (UCI) name of a move, e.g. e2e4, e1g1 or e7e8q.
+    '''
+    from_index, to_index, promotion = move & 63, (move >> 6) & 63, move >> 12
+    name = SQUARE_NAMES[from_index] + SQUARE_NAMES[to_index]
+    return name + PIECE_LETTERS[promotion].lower() if promotion else name
+
+
+def move_from_uci(text):
+    '''
+    Description: inverse of `move_to_uci`. Raises ValueError on malformed input.
+    '''
+    try:
+        promotion = PIECE_LETTERS.index(text[4].upper()) if len(text) == 5 else 0
+        if len(text) not in (4, 5) or promotion in (0, PAWN, KING) and len(text) == 5:
+            raise ValueError
+        return encode_move(SQUARE_INDEX[text[:2]], SQUARE_INDEX[text[2:4]], promotion)
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid UCI move: {text}') from None
+
+
+def _leaper_table(offsets):
+    table = []
+    for square in range(64):
+        file, rank = square & 7, square >> 3
+        mask = 0
+        for file_step, rank_step in offsets:
+            if 0 <= file + file_step < 8 and 0 <= rank + rank_step < 8:
+                mask |= 1 << ((rank + rank_step)*8 + file + file_step)
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_table([(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+KING_ATTACKS = _leaper_table([(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+# PAWN_ATTACKS[color][square]: squares attacked by a pawn of `color` standing on `square`.
+PAWN_ATTACKS = [_leaper_table([(-1, -1), (1, -1)]), _leaper_table([(-1, 1), (1, 1)])]
+
+# Classical ray lookups. Rays pointing towards higher square indexes are cut at their
+# lowest blocker, rays pointing towards lower indexes at their highest blocker.
+NORTH, EAST, NORTH_EAST, NORTH_WEST, SOUTH, WEST, SOUTH_WEST, SOUTH_EAST = range(8)
+_DIRECTIONS = [(0, 1), (1, 0), (1, 1), (-1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1)]
+RAYS = []
+for _file_step, _rank_step in _DIRECTIONS:
+    _rays = []
+    for _square in range(64):
+        _file, _rank, _mask = _square & 7, _square >> 3, 0
+        while 0 <= _file + _file_step < 8 and 0 <= _rank + _rank_step < 8:
+            _file, _rank = _file + _file_step, _rank + _rank_step
+            _mask |= 1 << (_rank*8 + _file)
+        _rays.append(_mask)
+    RAYS.append(_rays)
+del _file_step, _rank_step, _rays, _square, _file, _rank, _mask
+
+_N, _E, _NE, _NW, _S, _W, _SW, _SE = RAYS
+
+
+def _slider_attacks(positive, negative, square, occupied):
+    attacks = 0
+    for rays in positive:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in negative:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def bishop_attacks(square, occupied):
+    return _slider_attacks((_NE, _NW), (_SW, _SE), square, occupied)
+
+
+def rook_attacks(square, occupied):
+    return _slider_attacks((_N, _E), (_S, _W), square, occupied)
+
+
+def queen_attacks(square, occupied):
+    return bishop_attacks(square, occupied) | rook_attacks(square, occupied)
+
+
+def squares_of(mask):
+    '''
+    Description: yields the index of every set bit in `mask`, lowest first.
+    '''
+    while mask:
+        bit = mask & -mask
+        yield bit.bit_length() - 1
+        mask ^= bit
+
+
+def piece_attacks(piece, square, color, occupied):
+    '''
+    Description: mask of squares attacked by a `piece` of `color` standing on `square`.
+    '''
+    if piece == PAWN:
+        return PAWN_ATTACKS[color][square]
+    if piece == KNIGHT:
+        return KNIGHT_ATTACKS[square]
+    if piece == BISHOP:
+        return bishop_attacks(square, occupied)
+    if piece == ROOK:
+        return rook_attacks(square, occupied)
+    if piece == QUEEN:
+        return queen_attacks(square, occupied)
+    return KING_ATTACKS[square]
+
+
+def attackers_to(board, square, color, occupied=None):
+    '''
+    Description: mask of the pieces of `color` that attack `square`.
+    '''
+    if occupied is None:
+        occupied = board.occupied[0] | board.occupied[1]
+    pieces = board.pieces[color]
+    return ((PAWN_ATTACKS[1 - color][square] & pieces[PAWN])
+            | (KNIGHT_ATTACKS[square] & pieces[KNIGHT])
+            | (KING_ATTACKS[square] & pieces[KING])
+            | (bishop_attacks(square, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+            | (rook_attacks(square, occupied) & (pieces[ROOK] | pieces[QUEEN])))
+
+
+def is_square_attacked(board, square, color):
+    '''
+    Description: True if any piece of `color` attacks `square`.
+    '''
+    pieces = board.pieces[color]
+    if (KNIGHT_ATTACKS[square] & pieces[KNIGHT]) or (PAWN_ATTACKS[1 - color][square] & pieces[PAWN]) \
+            or (KING_ATTACKS[square] & pieces[KING]):
+        return True
+    occupied = board.occupied[0] | board.occupied[1]
+    return bool((bishop_attacks(square, occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+                or (rook_attacks(square, occupied) & (pieces[ROOK] | pieces[QUEEN])))
+
+
+def in_check(board, color):
+    king = board.pieces[color][KING]
+    return bool(king) and is_square_attacked(board, king.bit_length() - 1, 1 - color)
+
+
+def castling_rights_from_board(board):
+    '''
+    Description: castling rights implied by kings and rooks standing on their home squares.
+    '''
+    squares = board.squares
+    rights = 0
+    if squares[4] == KING:
+        rights |= (WHITE_KINGSIDE if squares[7] == ROOK else 0) | (WHITE_QUEENSIDE if squares[0] == ROOK else 0)
+    if squares[60] == -KING:
+        rights |= (BLACK_KINGSIDE if squares[63] == -ROOK else 0) | (BLACK_QUEENSIDE if squares[56] == -ROOK else 0)
+    return rights
+
+
+def apply_move(board, move):
+    '''
+    Description: plays `move` on an `ArrayBoard`, including the rook of a castling move,
+    the pawn taken en passant and promotions. Returns the information `undo_move` needs.
+    '''
+    from_index, to_index, promotion = move & 63, (move >> 6) & 63, move >> 12
+    squares = board.squares
+    moved = squares[from_index]
+    captured = squares[to_index]
+    captured_index = to_index
+    piece = abs(moved)
+    if piece == PAWN and not captured and (from_index - to_index) & 7:
+        # En passant: the captured pawn stands beside the origin square
+        captured_index = (from_index & 56) | (to_index & 7)
+        captured = squares[captured_index]
+        board.put(captured_index, EMPTY)
+    elif piece == KING and abs(to_index - from_index) == 2:
+        rook_from, rook_to = (from_index + 3, from_index + 1) if to_index > from_index else (from_index - 4, from_index - 1)
+        board.put(rook_to, squares[rook_from])
+        board.put(rook_from, EMPTY)
+    board.put(to_index, (promotion if moved > 0 else -promotion) if promotion else moved)
+    board.put(from_index, EMPTY)
+    return move, moved, captured, captured_index
+
+
+def undo_move(board, undo):
+    '''
+    Description: reverts a move played with `apply_move`.
+    '''
+    move, moved, captured, captured_index = undo
+    from_index, to_index = move & 63, (move >> 6) & 63
+    board.put(from_index, moved)
+    board.put(to_index, EMPTY)
+    if captured:
+        board.put(captured_index, captured)
+    if abs(moved) == KING and abs(to_index - from_index) == 2:
+        rook_from, rook_to = (from_index + 3, from_index + 1) if to_index > from_index else (from_index - 4, from_index - 1)
+        board.put(rook_from, board.squares[rook_to])
+        board.put(rook_to, EMPTY)
+
+
+def leaves_king_in_check(board, move):
+    '''
+    Description: True if playing `move` would leave the mover's own king attacked.
+    Only the masks are adjusted, the board itself is not touched.
+    '''
+    from_index, to_index = move & 63, (move >> 6) & 63
+    squares = board.squares
+    moved = squares[from_index]
+    color = moved > 0
+    to_bit = 1 << to_index
+    occupied = ((board.occupied[0] | board.occupied[1]) ^ (1 << from_index)) | to_bit
+    # Enemy pieces that survive the move: a capture removes the piece on the target square
+    survivors = FULL ^ to_bit
+    if abs(moved) == KING:
+        king = to_index
+    else:
+        if not board.pieces[color][KING]:
+            return False
+        king = board.pieces[color][KING].bit_length() - 1
+        if abs(moved) == PAWN and not squares[to_index] and (from_index - to_index) & 7:
+            captured_bit = 1 << ((from_index & 56) | (to_index & 7))
+            occupied ^= captured_bit
+            survivors ^= captured_bit
+    enemy = board.pieces[1 - color]
+    return bool((KNIGHT_ATTACKS[king] & enemy[KNIGHT] & survivors)
+                or (PAWN_ATTACKS[color][king] & enemy[PAWN] & survivors)
+                or (KING_ATTACKS[king] & enemy[KING])
+                or (bishop_attacks(king, occupied) & (enemy[BISHOP] | enemy[QUEEN]) & survivors)
+                or (rook_attacks(king, occupied) & (enemy[ROOK] | enemy[QUEEN]) & survivors))
+
+
+def _add_pawn_moves(moves, from_index, to_index, promotes):
+    if promotes:
+        for piece in PROMOTION_PIECES:
+            moves.append(from_index | (to_index << 6) | (piece << 12))
+    else:
+        moves.append(from_index | (to_index << 6))
+
+
+def generate_pseudo_legal_moves(board, color, castling_rights=None, ep_square=None):
+    '''
+    Description: every move the pieces of `color` can make, ignoring whether the own
+    king is left in check. `castling_rights` defaults to the rights implied by the board,
+    `ep_square` is the square a pawn may capture en passant onto, if any.
+    '''
+    board = as_array_board(board)
+    if castling_rights is None:
+        castling_rights = castling_rights_from_board(board)
+    pieces = board.pieces[color]
+    own = board.occupied[color]
+    enemy = board.occupied[1 - color]
+    occupied = own | enemy
+    empty = ~occupied & FULL
+    moves = []
+
+    # Pawns: pushes are shifted as whole masks, captures use the attack table
+    pawns = pieces[PAWN]
+    if color == WHITE:
+        single = (pawns << 8) & empty
+        double = ((single & (RANK_1 << 16)) << 8) & empty
+        forward, last_rank = 8, RANK_8
+    else:
+        single = (pawns >> 8) & empty
+        double = ((single & (RANK_8 >> 16)) >> 8) & empty
+        forward, last_rank = -8, RANK_1
+    for to_index in squares_of(single):
+        _add_pawn_moves(moves, to_index - forward, to_index, (1 << to_index) & last_rank)
+    for to_index in squares_of(double):
+        moves.append((to_index - 2*forward) | (to_index << 6))
+    targets = enemy | (1 << ep_square if ep_square is not None else 0)
+    for from_index in squares_of(pawns):
+        for to_index in squares_of(PAWN_ATTACKS[color][from_index] & targets):
+            _add_pawn_moves(moves, from_index, to_index, (1 << to_index) & last_rank)
+
+    not_own = ~own & FULL
+    for from_index in squares_of(pieces[KNIGHT]):
+        for to_index in squares_of(KNIGHT_ATTACKS[from_index] & not_own):
+            moves.append(from_index | (to_index << 6))
+    for from_index in squares_of(pieces[BISHOP] | pieces[QUEEN]):
+        for to_index in squares_of(bishop_attacks(from_index, occupied) & not_own):
+            moves.append(from_index | (to_index << 6))
+    for from_index in squares_of(pieces[ROOK] | pieces[QUEEN]):
+        for to_index in squares_of(rook_attacks(from_index, occupied) & not_own):
+            moves.append(from_index | (to_index << 6))
+    for from_index in squares_of(pieces[KING]):
+        for to_index in squares_of(KING_ATTACKS[from_index] & not_own):
+            moves.append(from_index | (to_index << 6))
+
+    # Castling: the king may not start on, pass through or land on an attacked square
+    home = 4 if color == WHITE else 60
+    kingside, queenside = (WHITE_KINGSIDE, WHITE_QUEENSIDE) if color == WHITE else (BLACK_KINGSIDE, BLACK_QUEENSIDE)
+    if castling_rights & (kingside | queenside) and pieces[KING] & (1 << home):
+        rook = pieces[ROOK]
+        if castling_rights & kingside and rook & (1 << (home + 3)) and not occupied & (0b11 << (home + 1)) \
+                and not is_square_attacked(board, home, 1 - color) \
+                and not is_square_attacked(board, home + 1, 1 - color) \
+                and not is_square_attacked(board, home + 2, 1 - color):
+            moves.append(home | ((home + 2) << 6))
+        if castling_rights & queenside and rook & (1 << (home - 4)) and not occupied & (0b111 << (home - 3)) \
+                and not is_square_attacked(board, home, 1 - color) \
+                and not is_square_attacked(board, home - 1, 1 - color) \
+                and not is_square_attacked(board, home - 2, 1 - color):
+            moves.append(home | ((home - 2) << 6))
+    return moves
+
+
+def generate_legal_moves(board, color, castling_rights=None, ep_square=None):
+    '''
+    Description: the pseudo-legal moves of `color` that do not leave its king in check.
+    '''
+    board = as_array_board(board)
+    return [move for move in generate_pseudo_legal_moves(board, color, castling_rights, ep_square)
+            if not leaves_king_in_check(board, move)]
+
+
+def generate_moves(board, color, castling_rights=None, ep_square=None, legal=True):
+    if legal:
+        return generate_legal_moves(board, color, castling_rights, ep_square)
+    return generate_pseudo_legal_moves(board, color, castling_rights, ep_square)
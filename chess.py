@@ -2,31 +2,32 @@
 # chess.py
 # a study python program
 # author: @joaoreboucas1, march 2023
+import os
+import re
 import sys
-from pathlib import Path
+
+from array_board import (BETWEEN, BISHOP, BLACK, KING, KNIGHT, PAWN, PIECE_LETTERS, QUEEN, ROOK,
+                         SQUARE_INDEX, SQUARE_NAMES, WHITE, as_array_board)
+from bitboard import (BLACK_KINGSIDE, BLACK_QUEENSIDE, FILE_MASKS, RANK_MASKS, WHITE_KINGSIDE, WHITE_QUEENSIDE,
+                      decode_move, encode_move, is_square_attacked, leaves_king_in_check, piece_attacks,
+                      squares_of)
+import instrument
+from fen import from_fen
+from lru import LRUCache
+from position import Position
 
 pieces = ['P', 'R', 'N', 'B', 'Q', 'K']
 colors = ['(b)', '(w)']
 cols = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h']
 rows = [str(x) for x in range(1,9)]
-piece_locations = {
-    '(w)': {
-        'P': ['a2', 'b2', 'c2', 'd2', 'e2', 'f2', 'g2', 'h2'],
-        'R': ['a1', 'h1'],
-        'N': ['b1', 'g1'],
-        'B': ['c1', 'f1'],
-        'Q': ['d1'],
-        'K': ['e1']
-    },
-    '(b)': {
-        'P': ['a7', 'b7', 'c7', 'd7', 'e7', 'f7', 'g7', 'h7'],
-        'R': ['a8', 'h8'],
-        'N': ['b8', 'g8'],
-        'B': ['c8', 'f8'],
-        'Q': ['d8'],
-        'K': ['e8']
-    }
-}
+piece_names = {ROOK: 'rooks', KNIGHT: 'knights', BISHOP: 'bishops', QUEEN: 'queens', KING: 'king'}
+piece_move_pattern = re.compile('[RNBQK][a-h]?[1-8]?x?[a-h][1-8]')
+pawn_move_pattern = re.compile('([a-h]x)?[a-h][1-8](=?[QRBN])?')
+# Castling right each side of each player needs, see bitboard.py
+CASTLING_RIGHTS = {('(w)', 'short'): WHITE_KINGSIDE, ('(w)', 'long'): WHITE_QUEENSIDE,
+                   ('(b)', 'short'): BLACK_KINGSIDE, ('(b)', 'long'): BLACK_QUEENSIDE}
+# Results of `resolve_move`, keyed by (position key, move). Resize with san_cache.resize(n).
+san_cache = LRUCache(maxsize=65536)
 
 
 def initialize_board():
@@ -66,530 +67,736 @@ def initialize_board():
     return board
 
 
+def format_board(board):
+    '''
+    Description: the board as text, exactly as `print_board` shows it.
+    '''
+    lines = [row + '  ' + ''.join(board[col+row] + ' ' for col in cols) for row in rows[::-1]]
+    lines.append('  ' + ''.join('  ' + col + '  ' for col in cols))
+    lines.append('-'*(5*8 + 4))
+    return '\n'.join(lines)
+
+
 def print_board(board):
-    global rows, cols
-    for row in rows[::-1]:
-        print(row, end='  ')
-        for col in cols:
-            print(board[col+row], end=' ')
-        print()
-    print('  ', end='')
-    for col in cols:
-        print('  ' + col +'  ', end='')
-    print('')
-    print('-'*(5*8 + 4))
+    print(format_board(board))
 
 
-def move_piece(board, from_square, to_square):
+def move_piece(board, from_square, to_square, promotion=None):
     '''
     Description: moves a piece from a square to another.
+    Castles are given as the king move (e.g. e1 to g1) and also move the rook. A pawn
+    moving diagonally to an empty square captures en passant, and a pawn reaching the last
+    row becomes `promotion` (a piece letter, e.g. 'Q').
     '''
-    board[to_square] = board[from_square]
+    piece = board[from_square]
+    if piece[0] == 'P' and from_square[0] != to_square[0] and board[to_square] == 'None':
+        board[to_square[0] + from_square[1]] = 'None'
+    if promotion:
+        piece = promotion + piece[1:]
+    board[to_square] = piece
     board[from_square] = 'None'
+    if piece[0] == 'K' and from_square[0] == 'e' and to_square[0] in 'cg':
+        row = from_square[1]
+        rook_from, rook_to = ('h'+row, 'f'+row) if to_square[0] == 'g' else ('a'+row, 'd'+row)
+        board[rook_to] = board[rook_from]
+        board[rook_from] = 'None'
 
 
-def process_bishop_move(board, player, move, is_queen=False):
-    # Bishop move, like Bf4
-    global rows, cols, piece_locations
-    is_move_legal = False
+def find_piece_move(board, player, move, piece):
+    '''
+    Description: finds which piece of type `piece` performs `move` (e.g. Nf3, Nbd2, R1a3).
+    The candidates are read from the bitboard masks: a piece can reach the target square
+    exactly when the same piece standing on the target square would attack it. Origin
+    columns/rows given in the move and king safety narrow the candidates down.
+    '''
+    board = as_array_board(board)
     error_msg = None
-    opposite_player = '(b)' if player == '(w)' else '(w)'
+    is_move_legal = False
+    color = WHITE if player == '(w)' else BLACK
+    name = piece_names[piece]
 
     # Recognize target square
     to_square = move[-2:]
-    
-    # Can some bishop move to the target square?
+    to_index = SQUARE_INDEX[to_square]
+    occupied = board.occupied[0] | board.occupied[1]
+
+    # Which pieces of this type can be the one moving?
     # Conditions:
-    # - the bishop square and the target square must be connected by a diagonal
-    # - moving diagonally == moving the same distance vertically and horizontally
-    # - if the squares are diagonally connected, there must be no pieces between them
-    piece = 'B' if not is_queen else 'Q'
-    bishop_positions = piece_locations[player][piece]
-    for i, bishop_position in enumerate(bishop_positions):
-        # Check the trivial case in which the bishop is already in the target square
-        if to_square == bishop_position:
-            error_msg = f'Bishop is already in {to_square}.'
-            return None, to_square, is_move_legal, error_msg
-
-        to_col, to_row = to_square
-        from_col, from_row = bishop_position
-        horizontal_dist = ord(to_col) - ord(from_col)
-        vertical_dist = int(to_row) - int(from_row)
-        are_squares_diagonally_connected = abs(horizontal_dist) == abs(vertical_dist)
-        if are_squares_diagonally_connected:
-            break
-    
-    if not are_squares_diagonally_connected:
-        error_msg = f'No bishop can move to {move}.'
+    # - the piece must attack the target square
+    # - if the move gives an origin column and/or row (Rac1, N1c2), the piece must stand on it
+    own_pieces = board.pieces[color][piece]
+    for char in move[1:-2]:
+        if char in cols:
+            own_pieces &= FILE_MASKS[cols.index(char)]
+        elif char in rows:
+            own_pieces &= RANK_MASKS[rows.index(char)]
+    candidates = piece_attacks(piece, to_index, color, occupied) & own_pieces
+
+    if not candidates:
+        # Would a slider reach the square on an empty board? Then something blocks the path
+        on_line = piece_attacks(piece, to_index, color, 0) & own_pieces
+        if piece in (BISHOP, ROOK, QUEEN) and on_line:
+            from_square = SQUARE_NAMES[on_line.bit_length() - 1]
+            for trying_square in BETWEEN[from_square][to_square]:
+                if board[trying_square] != 'None':
+                    error_msg = f'{board[from_square]} in {from_square} cannot move to {to_square} because {board[trying_square]} in {trying_square} blocks the path.'
+                    return None, to_square, is_move_legal, error_msg
+        error_msg = f'No {name} can move to {to_square}.'
         return None, None, is_move_legal, error_msg
 
-    # If the squares are diagonally connected, we need to check if there is a piece in the way
-    if abs(vertical_dist) > 1:
-        for j in range(1, abs(vertical_dist)):
-            sign_vertical = int(vertical_dist/abs(vertical_dist))
-            sign_horizontal = int(horizontal_dist/abs(horizontal_dist))
-            trying_row = str(int(from_row) + j*sign_vertical)
-            trying_col = chr(ord(from_col) + j*sign_horizontal)
-            trying_square = trying_col + str(trying_row)
-            if board[trying_square] != 'None':
-                error_msg = f'Bishop in {bishop_position} cannot move to {to_square} because {board[trying_square]} in {trying_square} blocks the path.'
-                return None, to_square, is_move_legal, error_msg
+    # Pinned pieces do not count when deciding whether a move is ambiguous
+    from_indexes = list(squares_of(candidates))
+    if len(from_indexes) > 1:
+        from_indexes = [i for i in from_indexes if not leaves_king_in_check(board, encode_move(i, to_index))]
+        if len(from_indexes) > 1:
+            from_squares = ' and '.join(SQUARE_NAMES[i] for i in from_indexes)
+            error_msg = f'The move {move} is ambiguous: the {name} in {from_squares} can move to {to_square}.'
+            return None, None, is_move_legal, error_msg
+        if not from_indexes:
+            error_msg = f'No {name} can move to {to_square} without leaving the king in check.'
+            return None, None, is_move_legal, error_msg
+
+    from_square = SQUARE_NAMES[from_indexes[0]]
+    if leaves_king_in_check(board, encode_move(from_indexes[0], to_index)):
+        error_msg = f'{board[from_square]} in {from_square} cannot move to {to_square} because it would leave the king in check.'
+        return None, None, is_move_legal, error_msg
 
     is_move_legal = True
-    from_square = bishop_position
     return from_square, to_square, is_move_legal, error_msg
 
 
+def process_bishop_move(board, player, move):
+    # Bishop move, like Bf4
+    return find_piece_move(board, player, move, BISHOP)
+
+
+def process_knight_move(board, player, move):
+    # Knight move, like Nf3
+    return find_piece_move(board, player, move, KNIGHT)
+
+
+def process_rook_move(board, player, move):
+    # Rook move, like Rd1
+    return find_piece_move(board, player, move, ROOK)
+
+
+def process_queen_move(board, player, move):
+    # Queen move, like Qh5
+    return find_piece_move(board, player, move, QUEEN)
+
+
+def process_king_move(board, player, move):
+    # King move, like Ke2
+    return find_piece_move(board, player, move, KING)
+
+
 def process_pawn_move(board, player, move):
-    global rows, cols, piece_locations
+    # Pawn move, like e4
+    board = as_array_board(board)
     error_msg = None
     is_move_legal = False
-    opposite_player = '(b)' if player == '(w)' else '(w)'
+    color = WHITE if player == '(w)' else BLACK
 
     # Recognize target square
     to_square = move[-2:]
-    to_col = to_square[0]
+    to_index = SQUARE_INDEX[to_square]
     to_row = int(to_square[1])
     # Pawns move downward for black, upwards for white
-    pawn_direction = 1 if player=='(w)' else -1
+    pawn_direction = 8 if player=='(w)' else -8
 
     # Pawn cannot move to the first (last) row if they are from white (black)
     if (player=='(w)' and to_row==1) or (player=='(b)' and to_row==8):
         error_msg = f'As {player}, {move} is an illegal move.'
         return None, to_square, is_move_legal, error_msg
-    
+
+    if board.squares[to_index]:
+        error_msg = f'No pawn can move to {to_square} because it is occupied by {board[to_square]}.'
+        return None, None, is_move_legal, error_msg
+
     # Can a pawn move to the target square?
     # they can only move one square up (down)
     # if they are in their starting squares, they can move either one or two squares
-    pawn_starting_row = 2 if player == '(w)' else 7
-    if len(move) == 2 and (board[to_col + str(to_row - pawn_direction)] != 'P'+player \
-            and (board[to_col + str(to_row - 2*pawn_direction)] != 'P'+player) and (to_row - 2*pawn_direction)==pawn_starting_row):
-        error_msg = f'No pawn can move to {to_square}.'
-        return None, None, is_move_legal, error_msg
-
-    if len(move) == 2:
-        from_row = (to_row - pawn_direction) if board[to_col+str(to_row - pawn_direction)] == 'P'+player else (to_row - 2*pawn_direction)
-        from_square = to_col+str(from_row)
-        is_move_legal = True
-
-    # Can a pawn capture on the target square?
-    if len(move) == 4:
-        from_col = move[0]
-        from_row = str(to_row - pawn_direction)
-        from_square = from_col+from_row
-        if board[from_square] != 'P'+player:
-            error_msg = f'No pawn can capture in {to_square}.'
+    pawns = board.pieces[color][PAWN]
+    from_index = to_index - pawn_direction
+    double_step_row = 4 if player == '(w)' else 5
+    if not pawns & (1 << from_index):
+        if to_row == double_step_row and not board.squares[from_index] \
+                and pawns & (1 << (from_index - pawn_direction)):
+            from_index -= pawn_direction
+        else:
+            error_msg = f'No pawn can move to {to_square}.'
             return None, None, is_move_legal, error_msg
-        is_move_legal = True
-        # Update piece locations
-        for i, pawn_location in enumerate(piece_locations[player]['P']):
-            if pawn_location == from_square:
-                piece_locations[player]['P'][i] = to_square
-        captured_piece = board[to_square][0]
-        for i, piece_location in enumerate(piece_locations[opposite_player][captured_piece]):
-            if board[to_square] == piece_location:
-                piece_locations[opposite_player][captured_piece][i] = 'Captured'
+
+    from_square = SQUARE_NAMES[from_index]
+    if leaves_king_in_check(board, encode_move(from_index, to_index)):
+        error_msg = f'Pawn in {from_square} cannot move to {to_square} because it would leave the king in check.'
+        return None, None, is_move_legal, error_msg
+    is_move_legal = True
     return from_square, to_square, is_move_legal, error_msg
 
 
 def process_pawn_captures(board, player, move):
-    global rows, cols, piece_locations
+    # Pawn capture, like exd5 (check_validity allows an empty target square when it is
+    # the en passant square)
+    board = as_array_board(board)
     error_msg = None
     is_move_legal = False
+    color = WHITE if player == '(w)' else BLACK
 
     # Recognize target square
     to_square = move[-2:]
-    to_row = int(to_square[1])
+    to_index = SQUARE_INDEX[to_square]
     to_col = to_square[0]
     # Pawns move downward for black, upwards for white
-    pawn_direction = 1 if player=='(w)' else -1
+    pawn_direction = 8 if player=='(w)' else -8
     from_col = move[0]
     if abs(ord(from_col)-ord(to_col)) != 1:
         error_msg = f'Pawn in {from_col} cannot capture in {to_col}.'
         return None, None, is_move_legal, error_msg
-    from_row = str(to_row - pawn_direction)
-    from_square = from_col+from_row
-    if board[from_square] != 'P'+player:
+    from_index = to_index - pawn_direction + ord(from_col) - ord(to_col)
+    if not 0 <= from_index < 64 or not board.pieces[color][PAWN] & (1 << from_index):
         error_msg = f'No pawn can capture in {to_square}.'
         return None, None, is_move_legal, error_msg
+    from_square = SQUARE_NAMES[from_index]
+    if leaves_king_in_check(board, encode_move(from_index, to_index)):
+        error_msg = f'Pawn in {from_square} cannot capture in {to_square} because it would leave the king in check.'
+        return None, None, is_move_legal, error_msg
     is_move_legal = True
     return from_square, to_square, is_move_legal, error_msg
 
 
-def process_knight_move(board, player, move):
-    # Knight move, like Nf3
-    global rows, cols, piece_locations
+def process_castles(board, player, rook_col, path_cols, king_cols, castling_rights=None):
+    '''
+    Description: shared checks for both castles. The king and the rook must be on their
+    home squares and, when `castling_rights` is given, must not have moved yet. The squares
+    in `path_cols` must be empty and the squares in `king_cols` (where the king starts,
+    passes and lands) must not be threatened.
+    '''
+    board = as_array_board(board)
     error_msg = None
     is_move_legal = False
-    opposite_player = '(b)' if player == '(w)' else '(w)'
-
-    # Recognize target square
-    to_square = move[-2:]
-    to_col = to_square[0]
-    to_row = int(to_square[1])
-
-    knights_positions = piece_locations[player]['N']
-    knights_available = []
+    king_row = '1' if player=='(w)' else '8'
+    opposite_player = '(b)' if player=='(w)' else '(w)'
+    side = 'short' if rook_col == 'h' else 'long'
+    player_name = 'White' if player == '(w)' else 'Black'
 
-    for from_square in knights_positions:
-        from_col, from_row = from_square
-        from_row = int(from_row)
-        if (abs(to_row - from_row) == 1 and abs(ord(to_col) - ord(from_col)) == 2) or \
-                (abs(to_row - from_row) == 2 and abs(ord(to_col) - ord(from_col)) == 1):
-            knights_available.append(True)
-        else:
-            knights_available.append(False)
-    
-    is_move_legal = knights_available[0] != knights_available[1]
-    if is_move_legal:      
-        from_square = knights_positions[0] if knights_available[0] else knights_positions[1]
-    else:
-        if knights_available[0]:
-            error_msg = f'The move {move} is ambiguous: both knights in {knights_positions[0]} and {knights_positions[1]} can move to {to_square}.'
-        else:
-            error_msg = f'No knights can move to {to_square}.'
+    if board[f'e{king_row}'] != f'K{player}':
+        error_msg = f"{player_name}'s king must be on e{king_row} to castle."
         return None, None, is_move_legal, error_msg
-    
-    return from_square, to_square, is_move_legal, error_msg
-
-
-def process_rook_move(board, player, move, is_queen=False):
-    # Knight move, like Nf3
-    global rows, cols, piece_locations
-    error_msg = None
-    is_move_legal = False
-    opposite_player = '(b)' if player == '(w)' else '(w)'
-
-    # Recognize target square
-    to_square = move[-2:]
-    to_col = to_square[0]
-    to_row = to_square[1]
-
-    piece = 'R' if not is_queen else 'Q'
-
-    rook_locations = piece_locations[player][piece]
-    available_rooks = []
-    for rook_location in rook_locations:
-        from_col, from_row = rook_location
-        are_squares_vertically_connected = from_col == to_col
-        vert_collision = False
-        hor_collision = False
-        if are_squares_vertically_connected:
-            # Check for collision
-            for i in range(1, abs(int(to_row) - int(from_row))):
-                sign = -1 if (int(to_row) > int(from_row)) else 1
-                mid_row = str(int(to_row) + i*sign)
-                if board[to_col + mid_row] != 'None':
-                    vert_collision = True
-                    break
-        are_squares_horizontally_connected = from_row == to_row
-        if are_squares_horizontally_connected:
-            # Check for collision
-            for i in range(1, abs(ord(to_col) - ord(from_col))):
-                sign = -1 if (ord(to_col) > ord(from_col)) else 1
-                mid_col = chr(ord(to_col) + i*sign)
-                print(mid_col)
-                if board[mid_col + to_row] != 'None':
-                    hor_collision = True
-                    break
-        if (are_squares_horizontally_connected and not hor_collision) or (are_squares_vertically_connected and not vert_collision):
-            available_rooks.append(True)
-        else:
-            available_rooks.append(False)
-    try:
-        is_move_legal = available_rooks[0] != available_rooks[1]
-    except:
-        is_move_legal = available_rooks[0]
-    if is_move_legal:        
-        from_square = rook_locations[0] if rook_locations[0] else rook_locations[1]
-    else:
-        if available_rooks[0]:
-            error_msg = f'The move {move} is ambiguous: both rooks in {rook_locations[0]} and {rook_locations[1]} can move to {to_square}.'
-        else:
-            error_msg = f'No rooks can move to {to_square}.'
+    if board[f'{rook_col}{king_row}'] != f'R{player}':
+        error_msg = f"{player_name}'s rook must be on {rook_col}{king_row} to castle."
         return None, None, is_move_legal, error_msg
-    return from_square, to_square, is_move_legal, error_msg
-
-
-def process_queen_move(board, player, move):  
-    fictitious_move = 'B'+move[1:]
-    from_square, to_square, is_move_legal, error_msg = process_bishop_move(board, player, fictitious_move, is_queen=True)
-    if is_move_legal:
-        return from_square, to_square, is_move_legal, error_msg
-
-    fictitious_move = 'R'+move[1:]
-    from_square, to_square, is_move_legal, error_msg = process_rook_move(board, player, fictitious_move, is_queen=True)
-    if is_move_legal:
-        return from_square, to_square, is_move_legal, error_msg
-    
-    return None, None, is_move_legal, error_msg
-
-
-def process_king_move(board, player, move):
-    global píece_locations, cols, rows
-    is_move_legal = False
-    error_msg = None
-    opposite_player = '(b)' if player == '(w)' else '(w)'
-
-    from_square = piece_locations[player]['K'][0]
-    to_square = move[-2:]
-    to_col, to_row = to_square
-    from_col, from_row = from_square
-
-    horizontal_dist = ord(to_col) - ord(from_col)
-    vertical_dist = int(to_row) - int(from_row)
-
-    is_move_legal = abs(horizontal_dist) <= 1 and abs(vertical_dist) <= 1
+    if castling_rights is not None and not castling_rights & CASTLING_RIGHTS[player, side]:
+        error_msg = f'{player_name} cannot {side} castles because the king or the {rook_col}{king_row} rook has already moved.'
+        return None, None, is_move_legal, error_msg
+    for col in path_cols:
+        if board[col+king_row] != 'None':
+            error_msg = f'Cannot {side} castles because {board[col+king_row]} in {col+king_row} blocks the path.'
+            return None, None, is_move_legal, error_msg
+    for col in king_cols:
+        if is_square_threatened(board, opposite_player, col+king_row):
+            error_msg = f'Cannot {side} castles because {col+king_row} is threatened.'
+            return None, None, is_move_legal, error_msg
 
-    return from_square, to_square, is_move_legal, error_msg
+    is_move_legal = True
+    return f'e{king_row}', f'{king_cols[-1]}{king_row}', is_move_legal, error_msg
 
 
-def process_long_castles(board, player, move):
-    error_msg = None
-    king_row = '1' if player=='(w)' else '8'
-    opposite_player = '(b)' if player=='(w)' else '(w)'
-    is_move_legal = board[f'e{king_row}']==f'K{player}' \
-        and board[f'a{king_row}']==f'R{player}' \
-        and (not is_square_threatened(board, opposite_player, f'b{king_row}')) \
-        and (not is_square_threatened(board, opposite_player, f'c{king_row}')) \
-        and (not is_square_threatened(board, opposite_player, f'd{king_row}'))
-    if not is_move_legal:
-        error_msg = "Cannot short castles because there are pieces in the way."
-    return None, None, is_move_legal, error_msg
+def process_long_castles(board, player, move, castling_rights=None):
+    return process_castles(board, player, 'a', 'bcd', 'edc', castling_rights)
 
 
-def process_short_castles(board, player, move):
-    error_msg = None
-    king_row = '1' if player=='(w)' else '8'
-    opposite_player = '(b)' if player=='(w)' else '(w)'
-    is_move_legal = board[f'e{king_row}']==f'K{player}' \
-        and board[f'h{king_row}']==f'R{player}' \
-        and (not is_square_threatened(board, opposite_player, f'f{king_row}')) \
-        and (not is_square_threatened(board, opposite_player, f'g{king_row}'))
-    if not is_move_legal:
-        error_msg = "Cannot short castles because there are pieces in the way."
-    return None, None, is_move_legal, error_msg
+def process_short_castles(board, player, move, castling_rights=None):
+    return process_castles(board, player, 'h', 'fg', 'efg', castling_rights)
 
 
 def is_square_threatened(board, player, square):
     '''
-    Checks if `square` is threatened by `player`
+    Checks if `square` is threatened by `player`.
+    Boards of a `Position` that tracks its attack maps answer with a single lookup.
     '''
-    global pieces, piece_locations
-    piece_processes = {
-        'R': process_rook_move,
-        'N': process_knight_move,
-        'B': process_bishop_move,
-        'Q': process_queen_move,
-        'K': process_king_move,
-        'P': process_pawn_captures
-    }
-    for piece in pieces:
-        specific_piece_locations = piece_locations[player][piece]
-        if specific_piece_locations is None:
-            continue
-        
-        for location in specific_piece_locations:
-            if piece == "P":
-                pawn_col = location[0]
-                move = f'{pawn_col}x{square}'
-                _,_, is_move_legal,_ = piece_processes[piece](board, player, move)
-            else:
-                move = f'{piece}{square}' 
-                _,_, is_move_legal,_ = piece_processes[piece](board, player, move)
-            if is_move_legal:
-                print(f"Piece {piece} from {player} in {location} is threatening {square}")
-                return True
-        return False
+    board = as_array_board(board)
+    color = WHITE if player == '(w)' else BLACK
+    if board.attacks is not None:
+        return board.attacks.counts[color][SQUARE_INDEX[square]] > 0
+    return is_square_attacked(board, SQUARE_INDEX[square], color)
 
 
-def process_move(board, player, move):
+def process_move(board, player, move, castling_rights=None, ep_square=None):
     '''
     Checks if move is a readable move. Then, checks if move is valid (i.e. the piece can move to the square)
     Translates a move in algebraic notation to a from_square and to_square
+    `castling_rights` (see bitboard.py) and `ep_square` (a square index) come from the
+    position; without them castling only looks at the pieces and en passant is impossible.
     '''
-    global rows, cols, piece_locations
+    board = as_array_board(board)
     error_msg = None
     is_move_legal = False
-    opposite_player = '(b)' if player == '(w)' else '(w)'
-    if move not in ['o-o', 'o-o-o']:
-        to_square = move[-2:]
-        to_col = to_square[0]
-        to_row = int(to_square[1])
-    pawn_direction = 1 if player=='(w)' else -1
+    move = move.rstrip('+#')
 
     # Is the move readable?
-    # In order for a move to be readable, it must:
-    # - start with a piece name (N, B, R, K, Q) or a column name (pawn moves) or 'o' (castles)
-    # - in case of piece moves, they must have 3, 4, or 5 chars
-    #   - if they have 3 chars, then the last two chars must be a recognizable square on the board
-    #   - if they have 4 chars, then the second char must be either a row, a col or 'x' and the last two chars must be a recognizable square on the board
-    #   - if they have 5 chars, then the second char must be either a row, a col or 'x'; the third char must be 'x' and the last two chars must ber a recognizable square on the board
-    # - in case of pawn moves, they must have 2 or 4 chars
-    #   - if they have 2 chars, then the last two chars must be a recognizable square on the board
-    #   - if they have 4 chars, then the second char must be 'x' and the last two chars must be a recognizable square on the board
-    # - in case of castles, the moves are 'o-o' and 'o-o-o'
-    if move[0] not in pieces + cols + ['o']:
-        error_msg =  f'Unrecognizable move: {move}.'
-        return None, None, is_move_legal, error_msg
-    
-    if (move[0]=='o' and move not in ['o-o', 'o-o-o']) or move[-2:] not in board.keys():
-        error_msg =  f'Unrecognizable move: {move}.'
-        return None, None, is_move_legal, error_msg
-
-    if move[0] in pieces and len(move) not in [3,4,5]:
-        error_msg =  f'Unrecognizable move: {move}.'
-        return None, None, is_move_legal, error_msg
-
-    if move[0] in pieces and len(move) == 4 and move[1] not in rows + cols + ['x']:
-        error_msg = f'Unrecognizable move: {move}.'
-        return None, None, is_move_legal, error_msg
-    
-    if move[0] in pieces and len(move) == 5 and (move[1] != 'x' or move[2] not in rows + cols + ['x']):
-        error_msg = f'Unrecognizable move: {move}.'
-        return None, None, is_move_legal, error_msg
-    
-    if move[0] in cols and len(move) not in [2,4]:
-        error_msg =  f'Unrecognizable move: {move}.'
-        return None, None, is_move_legal, error_msg
-
-    if move[0] in cols and len(move) == 4 and move[1] != 'x':
+    # In order for a move to be readable, it must be one of:
+    # - a piece move: piece name (N, B, R, K, Q), optionally the column and/or row the piece
+    #   comes from, optionally 'x' for captures, then the target square (Nf3, Nbd2, R1a3, Qh4xe1)
+    # - a pawn move: the target square (e4)
+    # - a pawn capture: the column of the pawn, 'x', then the target square (exd5)
+    # - castles: 'o-o' and 'o-o-o' ('O-O' and '0-0' are also accepted)
+    # Pawn moves to the last row add the promotion piece (a8=Q, exd8=N; the '=' is optional).
+    # A trailing '+' or '#' is ignored.
+    if move.replace('O', 'o').replace('0', 'o') in ['o-o', 'o-o-o']:
+        move = move.replace('O', 'o').replace('0', 'o')
+    elif not (piece_move_pattern.fullmatch(move) or pawn_move_pattern.fullmatch(move)):
         error_msg = f'Unrecognizable move: {move}.'
         return None, None, is_move_legal, error_msg
 
     # Processing moves
-    if move[0] in cols:
+    if move == 'o-o':
+        return process_short_castles(board, player, move, castling_rights)
+
+    elif move == 'o-o-o':
+        return process_long_castles(board, player, move, castling_rights)
+
+    elif move[0] in cols:
+        move, promotion = split_promotion(move)
         if len(move) == 2:
-            return process_pawn_move(board, player, move)
+            from_square, to_square, is_move_legal, error_msg = process_pawn_move(board, player, move)
         else:
-            return process_pawn_captures(board, player, move)
-    
+            from_square, to_square, is_move_legal, error_msg = process_pawn_captures(board, player, move)
+        if is_move_legal:
+            last_row = '8' if player == '(w)' else '1'
+            if to_square[1] == last_row and not promotion:
+                error_msg = f'A pawn reaching {to_square} must promote, e.g. {move}=Q.'
+                return None, None, False, error_msg
+            if promotion and to_square[1] != last_row:
+                error_msg = f'Only a pawn reaching row {last_row} can promote.'
+                return None, None, False, error_msg
+        return from_square, to_square, is_move_legal, error_msg
+
     elif move[0] == 'B':
         return process_bishop_move(board, player, move)
-    
+
     elif move[0] == 'N':
         return process_knight_move(board, player, move)
 
     elif move[0] == 'R':
         return process_rook_move(board, player, move)
-    
+
     elif move[0] == 'K':
         return process_king_move(board, player, move)
-    
+
     elif move[0] == 'Q':
         return process_queen_move(board, player, move)
 
-    elif move == 'o-o':
-        # Short castles
-        if player=='(w)':
-            if board['e1'] != 'K'+player:
-                error_msg = f"White's king must be on e1 to castle."
-                return None, to_square, is_move_legal, error_msg
-            if board['h1'] != 'R'+player:
-                error_msg = f"White's rook must be on h1 to castle."
-                return None, to_square, is_move_legal, error_msg
-            if board['f1'] != 'None' or board['g1'] != 'None':
-                if board['f1'] != 'None':
-                    error_msg = f'Cannot short castles because {board["f1"]} in f1 blocks the path.'
-                    return None, to_square, is_move_legal, error_msg
-                else:
-                    error_msg = f'Cannot short castles because {board["g1"]} in g1 blocks the path.'
-                    return None, to_square, is_move_legal, error_msg
-            is_move_legal = True
-            board['f1'] = 'R'+player
-            board['g1'] = 'K'+player
-            board['e1'] = 'None'
-            board['h1'] = 'None'
-            return None, None, is_move_legal, error_msg 
-
-
-    elif move == 'o-o-o':
-        return process_long_castles(board, player, move)
 
+def move_to_san(position, move):
+    '''
+    Description: the algebraic notation of a legal `move` (a move code) in `position`,
+    e.g. Nf3, Nbd2, exd5, O-O or e8=Q, with '+' or '#' appended for checks and mates.
+    '''
+    squares = position.board.squares
+    from_index, to_index, promotion = decode_move(move)
+    piece = abs(squares[from_index])
+    to_square = SQUARE_NAMES[to_index]
+    if piece == KING and abs(to_index - from_index) == 2:
+        san = 'O-O' if to_index > from_index else 'O-O-O'
+    elif piece == PAWN:
+        san = (SQUARE_NAMES[from_index][0] + 'x' if (from_index - to_index) & 7 else '') + to_square
+        if promotion:
+            san += '=' + PIECE_LETTERS[promotion]
     else:
-        error_msg = f'Unrecognized move {move}.'
-        return None, None, is_move_legal, error_msg
+        # Add the origin column, else row, else both when another piece of the same type
+        # could also move to the target square
+        others = [other & 63 for other in position.legal_moves()
+                  if (other >> 6) & 63 == to_index and other & 63 != from_index and abs(squares[other & 63]) == piece]
+        origin = ''
+        if others:
+            from_square = SQUARE_NAMES[from_index]
+            if all(other & 7 != from_index & 7 for other in others):
+                origin = from_square[0]
+            elif all(other >> 3 != from_index >> 3 for other in others):
+                origin = from_square[1]
+            else:
+                origin = from_square
+        san = PIECE_LETTERS[piece] + origin + ('x' if squares[to_index] else '') + to_square
+    position.make(move)
+    if position.is_check():
+        san += '+' if position.legal_moves() else '#'
+    position.unmake()
+    return san
 
 
-def check_validity(board, player, move):
+def check_validity(board, player, move, castling_rights=None, ep_square=None):
     """
     Given a legal move, see which piece is in the landing square
     """
-    from_square, to_square, is_move_legal, error_msg = process_move(board, player, move)
-    
-    if not is_move_legal:
-        return None, None, is_move_legal, error_msg
-    
+    board = as_array_board(board)
+    move = move.rstrip('+#')
+    from_square, to_square, is_move_legal, error_msg = process_move(board, player, move, castling_rights, ep_square)
+
+    if not is_move_legal or move[0] in 'oO0':
+        return from_square, to_square, is_move_legal, error_msg
+    move = split_promotion(move)[0]
+
     opposite_player = '(b)' if player=='(w)' else '(w)'
+    is_capture = 'x' in move
     if board[to_square][-3:] == player:
-        return False, f"Cannot move {board[from_square]} to {to_square} because it's occupied by {board[to_square]}."
-    
-    if board[to_square][-3:] == opposite_player and (move[1] != 'x' or move[2] != 'x'):
-        return False, f"""Cannot move {board[from_square]} to {to_square} because it's occupied by {board[to_square]}.
-            Did you mean {move[0]}x{move[-2:]}?"""
-    
-    if board[to_square] == "None" and (move[1] == 'x' or (len(move) > 2 and move[2] == 'x')):
-        return False, f"""Cannot capture on {to_square} because it's empty.
-            Did you mean {move[0]}{move[-2:]}?"""
-    
+        error_msg = f"Cannot move {board[from_square]} to {to_square} because it's occupied by {board[to_square]}."
+        return None, None, False, error_msg
+
+    if board[to_square][-3:] == opposite_player and not is_capture:
+        error_msg = f"Cannot move {board[from_square]} to {to_square} because it's occupied by {board[to_square]}. Did you mean {move[:-2]}x{move[-2:]}?"
+        return None, None, False, error_msg
+
+    is_en_passant = move[0] in cols and ep_square is not None and SQUARE_INDEX[to_square] == ep_square
+    if board[to_square] == 'None' and is_capture and not is_en_passant:
+        error_msg = f"Cannot capture on {to_square} because it's empty. Did you mean {move[:-2].replace('x', '')}{move[-2:]}?"
+        return None, None, False, error_msg
+
     return from_square, to_square, is_move_legal, error_msg
 
 
-def play():
+def resolve_move(position, move):
+    '''
+    Description: `check_validity` for a `Position`, memoized in `san_cache`.
+    The Zobrist key covers everything the answer depends on (pieces, side to move,
+    castling rights, en passant), so replaying known lines skips the SAN parsing and
+    the validators entirely. Errors are cached as well.
+    '''
+    cache_key = (position.key, move)
+    result = san_cache.get(cache_key)
+    if result is None:
+        result = check_validity(position.board, position.player, move, position.castling_rights,
+                                position.ep_square)
+        san_cache.put(cache_key, result)
+    return result
+
+
+def split_promotion(move):
     '''
-    Starts a chess.py match.
+    Description: splits the promotion off a pawn move: 'e8=Q' gives ('e8', QUEEN), 'exd8N'
+    gives ('exd8', KNIGHT) and moves without one give (move, 0).
+    '''
+    move = move.rstrip('+#')
+    if move and move[-1] in 'QRBN' and move[0] in cols:
+        return move[:-2] if move[-2] == '=' else move[:-1], PIECE_LETTERS.index(move[-1])
+    return move, 0
+
+
+def san_move_code(from_square, to_square, move):
+    '''
+    Description: the move code of the SAN `move` that `resolve_move` found to go from
+    `from_square` to `to_square`, with its promotion piece if any.
+    '''
+    return encode_move(SQUARE_INDEX[from_square], SQUARE_INDEX[to_square], split_promotion(move)[1])
+
+
+def game_result(position):
+    '''
+    Description: (result, reason) if the rules end the game in `position`, else None.
+    The result is '1-0', '0-1' or '1/2-1/2' and the reason 'checkmate', 'stalemate' or one
+    of the automatic draws of `Position.draw_reason`. Draws a player has to claim do not
+    end the game.
+    '''
+    if not position.legal_moves():
+        if position.is_check():
+            return ('0-1' if position.color == WHITE else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    reason = position.draw_reason(claim=False)
+    if reason is not None:
+        return '1/2-1/2', reason
+    return None
+
+
+def play(save_path=None, fen=None, engine_time=None, book_path=None, book_mode='hint', tablebase_path=None,
+         board_format='text', diff=False, quiet=False):
+    '''
+    Starts a chess.py match, from the position given by `fen` if any.
+    If `save_path` is given, the game is saved there as PGN when it ends, or as a binary
+    game record (see records.py) when it ends in .cgr.
+    If `engine_time` is given, the engine plays the side that does not move first,
+    thinking for `engine_time` seconds per move.
+    If `book_path` names a Polyglot book, `book_mode` 'hint' lists its moves before each
+    move typed in, and 'auto' makes the side that does not move first reply from the book
+    while the game is in it.
+    If `tablebase_path` is a directory of tablebases (see tablebase.py), the result of
+    positions they cover is announced and the engine plays them perfectly.
+    The board is shown in `board_format` (see render.py), only redrawing the squares that
+    changed if `diff` is set, and not at all if `quiet` is set.
     '''
     print('chess.py starting game!')
     playing = True
-    player = '(w)'
-    board = initialize_board()
-    print_board(board)
+    position = (from_fen(fen) if fen else Position()).track_attacks()
+    board = position.board
+    moves = []
+    result = '*'
+    # The engine and the auto-replying book play the side that does not move first
+    computer_color = 1 - position.color
+    tablebase = None
+    if tablebase_path is not None:
+        import tablebase as tablebase_module
+        tablebase = tablebase_module.Tablebase(tablebase_path)
+    if engine_time is not None:
+        import engine
+        searcher = engine.Searcher(tablebase=tablebase)
+        # The engine searches its own copy, which does not pay for the attack maps
+        engine_position = position.copy()
+    opening_book = None
+    if book_path is not None:
+        import book
+        opening_book = book.Book(book_path)
+    renderer = None
+    if not quiet:
+        import render
+        renderer = render.Renderer(board_format, diff=diff)
+        renderer.frame(position)
     while playing:
-        move = input('{} to move: '.format('White' if player=='(w)' else 'Black'))
-        if move == 'q':
+        player = position.player
+        player_name = 'White' if player=='(w)' else 'Black'
+        ended = game_result(position)
+        if ended is not None:
+            result, reason = ended
+            if reason == 'checkmate':
+                print(f'Checkmate! {player_name} is mated.')
+            elif reason == 'stalemate':
+                print(f'Stalemate! {player_name} has no legal moves.')
+            else:
+                print(f'Draw by {reason}.')
             break
-        from_square, to_square, is_move_legal, error_msg = check_validity(board, player, move)
-        while not is_move_legal:
-            move = input(f'{error_msg} Please, input a legal move: ')
+        if position.is_check():
+            print(f'{player_name} is in check.')
+        if tablebase is not None:
+            verdict = tablebase.probe_position(position)
+            if verdict is not None:
+                if verdict.wdl:
+                    winner = player_name if verdict.wdl > 0 else ('Black' if player=='(w)' else 'White')
+                    if verdict.dtm is not None:
+                        print(f'Tablebase: {winner} mates in {(verdict.dtm + 1)//2} moves.')
+                    elif verdict.dtz is not None:
+                        print(f'Tablebase: {winner} wins, {abs(verdict.dtz)} plies to the next capture, pawn move or mate.')
+                    else:
+                        print(f'Tablebase: {winner} wins.')
+                else:
+                    print('Tablebase: draw.')
+        book_entries = opening_book.find(position) if opening_book is not None else []
+        if position.color == computer_color and (book_mode == 'auto' and book_entries or engine_time is not None):
+            if book_mode == 'auto' and book_entries:
+                computer_move = opening_book.choose(position)
+                details = 'from the book'
+            else:
+                search = searcher.search(engine_position, time_limit=engine_time)
+                computer_move = search.move
+                details = f'depth {search.depth}, {search.nodes:,} nodes, {search.nps:,} nodes/s'
+            san = move_to_san(position, computer_move)
+            from_square, to_square = SQUARE_NAMES[computer_move & 63], SQUARE_NAMES[(computer_move >> 6) & 63]
+            print(f'{"Engine" if engine_time is not None else "Book"} plays {san}: {board[from_square]} '
+                  f'from {from_square} to {to_square} ({details})')
+            position.make(computer_move)
+            if engine_time is not None:
+                engine_position.make(computer_move)
+            moves.append(san)
+            if renderer is not None:
+                renderer.frame(position)
+            continue
+        if book_mode == 'hint' and book_entries:
+            total = sum(entry.weight for entry in book_entries) or 1
+            print('Book moves: ' + ', '.join(f'{move_to_san(position, entry.move)} ({100*entry.weight/total:.0f}%)'
+                                             for entry in book_entries[:5]))
+        claimable = position.draw_reason()
+        if claimable is not None:
+            print(f"{player_name} may claim a draw by {claimable}: type 'draw' to claim it.")
+        move = input('{} to move: '.format('White' if player=='(w)' else 'Black'))
+        while True:
             if move == 'q':
-                exit()
-            from_square, to_square, is_move_legal, error_msg = check_validity(board, player, move)
+                playing = False
+                break
+            if move == 'draw' and claimable is not None:
+                print(f'{player_name} claims a draw by {claimable}.')
+                result = '1/2-1/2'
+                playing = False
+                break
+            from_square, to_square, is_move_legal, error_msg = resolve_move(position, move)
+            if is_move_legal:
+                break
+            move = input(f'{error_msg} Please, input a legal move: ')
+        if not playing:
+            break
 
         if board[to_square] != 'None':
             print(f'{board[from_square]} captures {board[to_square]} on {to_square}')
         else:
             print(f'Moving {board[from_square]} from {from_square} to {to_square}')
-        move_piece(board, from_square, to_square)
-        print_board(board)
-        
-        if player=='(w)':
-            player = '(b)'
-        elif player=='(b)':
-            player = '(w)'
+        position.make(san_move_code(from_square, to_square, move))
+        if engine_time is not None:
+            engine_position.make(san_move_code(from_square, to_square, move))
+        moves.append(move)
+        if renderer is not None:
+            renderer.frame(position)
+
+    if renderer is not None:
+        renderer.close()
+
+    if save_path is not None:
+        import pgn
+        headers = {'Event': 'chess.py game'}
+        if fen:
+            headers.update(SetUp='1', FEN=fen)
+        game = {'headers': headers, 'moves': moves, 'result': result}
+        if save_path.endswith('.cgr'):
+            import records
+            records.write_games(save_path, [game])
+        else:
+            pgn.write_games(save_path, [game])
+        print(f'Game saved to {save_path}')
 
 
 def help():
     '''
     Explains algebraic notation
+    help.txt is read from the directory of this script, whatever the current directory.
     '''
-    with open('help.txt') as f:
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'help.txt')) as f:
         print(f.read())
     exit()
 
 
+def configure_logging():
+    '''
+    Description: sends log records to standard error. Only the subcommands that log call
+    it, so the others do not pay for importing logging.
+    '''
+    import logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s: %(message)s', stream=sys.stderr)
+
+
+# Functions timed when instrumentation is on (CHESS_PY_PROFILE=1 or --profile), see instrument.py
+HOT_PATH = ['process_move', 'process_pawn_move', 'process_pawn_captures', 'process_rook_move',
+            'process_knight_move', 'process_bishop_move', 'process_queen_move', 'process_king_move',
+            'process_long_castles', 'process_short_castles', 'check_validity']
+# Every command applies and takes back moves through these
+POSITION_HOT_PATH = ['make', 'unmake']
+instrument.install(globals(), HOT_PATH)
+instrument.install(Position, POSITION_HOT_PATH)
+
+
 if __name__=='__main__':
+    # Modules that `import chess` (pgn, server...) get this module instead of running
+    # chess.py a second time
+    sys.modules.setdefault('chess', sys.modules[__name__])
+    if len(sys.argv) > 1 and sys.argv[1] == '--profile':
+        del sys.argv[1]
+        instrument.enable()
+        instrument.install(globals(), HOT_PATH)
+        instrument.install(Position, POSITION_HOT_PATH)
+    if instrument.enabled():
+        configure_logging()
+
     if len(sys.argv) == 1:
-        program = Path(sys.argv[0]).name
-        print(f'Usage: python {program} command')
+        program = os.path.basename(sys.argv[0])
+        print(f'Usage: python {program} [--profile] command')
         print('Available commands:')
-        print('    play: start a game')
+        print('    play: start a game (--fen FEN starts from a position, --save FILE saves it as PGN,')
+        print('          --vs-engine plays against the engine, --book FILE uses an opening book,')
+        print('          --format text|unicode|ansi|fen|json shows the board, --diff redraws changes, --quiet hides it)')
+        print('    pgn: replay and check the games of a PGN file')
+        print('    validate: validate a PGN collection in parallel, reporting JSON lines')
+        print('    records: convert PGN to compact binary game records (records convert) or print them (records show)')
+        print('    perft: count move generation nodes (perft --check runs the standard suite)')
+        print('    book: build a Polyglot opening book from PGN (book build) or list its moves (book probe)')
+        print('    explore: index position statistics of game collections (explore build) and query them (explore query)')
+        print('    tablebase: generate KQK/KRK/KPK endgame tablebases or probe a position (Syzygy tables too)')
+        print('    batch-eval: encode the positions of a FEN or PGN file as NumPy planes and features')
+        print('    serve: host many games at once over TCP or a Unix socket')
+        print('    uci: run the engine as a UCI engine on standard input and output (--threads N for lazy SMP)')
+        print('    serve-stdin: keep one warm process answering newline-delimited game requests on standard input')
         print('    help: explain algebraic notation')
+        print(f'--profile (or {instrument.ENVIRONMENT_VARIABLE}=1) logs call counts and latencies of the move')
+        print('validation at exit and on SIGUSR1')
         exit()
-    
+
     if sys.argv[1] == 'play':
-        play()
+        import argparse
+        parser = argparse.ArgumentParser(prog='chess.py play', description='Start a game.')
+        parser.add_argument('--fen', help='start from this FEN position instead of the initial position')
+        parser.add_argument('--save', metavar='FILE',
+                            help='save the game as PGN when it ends, as a binary game record if FILE ends in .cgr')
+        parser.add_argument('--vs-engine', action='store_true', help='play against the engine')
+        parser.add_argument('--engine-time', type=float, default=1.0, metavar='SECONDS',
+                            help='engine thinking time per move (default: 1.0)')
+        parser.add_argument('--book', metavar='FILE', help='Polyglot opening book')
+        parser.add_argument('--book-mode', choices=['hint', 'auto'], default='hint',
+                            help='list the book moves before each move (hint), or reply from the book (auto)')
+        parser.add_argument('--tablebases', metavar='DIR', help='directory of endgame tablebases')
+        parser.add_argument('--format', choices=['text', 'unicode', 'ansi', 'fen', 'json'], default='text',
+                            help='how the board is shown (default: text)')
+        parser.add_argument('--diff', action='store_true',
+                            help='keep the board on top of the terminal and only redraw the squares that change '
+                                 '(text, unicode and ansi formats)')
+        parser.add_argument('--quiet', action='store_true', help='do not show the board')
+        args = parser.parse_args(sys.argv[2:])
+        if args.diff and args.format not in ('text', 'unicode', 'ansi'):
+            parser.error(f'--diff does not work with --format {args.format}')
+        play(args.save, args.fen, args.engine_time if args.vs_engine else None, args.book, args.book_mode,
+             args.tablebases, args.format, args.diff, args.quiet)
+        exit()
+
+    if sys.argv[1] == 'pgn':
+        import pgn
+        pgn.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'validate':
+        import validate
+        validate.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'records':
+        import records
+        records.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'perft':
+        import perft
+        perft.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'book':
+        import book
+        book.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'explore':
+        import explore
+        explore.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'tablebase':
+        import tablebase
+        configure_logging()
+        tablebase.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'batch-eval':
+        import batch_eval
+        configure_logging()
+        batch_eval.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'serve':
+        import server
+        configure_logging()
+        server.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'uci':
+        import uci
+        uci.main(sys.argv[2:])
+        exit()
+
+    if sys.argv[1] == 'serve-stdin':
+        import worker
+        worker.main(sys.argv[2:])
         exit()
 
     if sys.argv[1] == 'help':
         help()
-        exit()
\ No newline at end of file
+        exit()
@@ -0,0 +1,390 @@
+# engine.py
+# alpha-beta search engine for chess.py positions
+import time
+from collections import namedtuple
+
+from array_board import BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE
+from bitboard import in_check, leaves_king_in_check
+
+MATE = 100000
+# Scores beyond this are mates, stored in the transposition table relative to the node
+MATE_BOUND = MATE - 1000
+# Tablebase wins without a distance to mate (Syzygy) score below mates, above any material
+TABLEBASE_WIN = MATE_BOUND - 1000
+INFINITY = MATE + 1
+# The clock, node limit and stop flag are checked every CHECK_INTERVAL + 1 nodes, often
+# enough that a stop request ends the search within a few milliseconds
+CHECK_INTERVAL = 255
+
+PIECE_VALUES = [0, 100, 500, 320, 330, 900, 20000]
+
+# Piece-square tables from white's point of view, written as seen on a diagram: the
+# first row is rank 8. Values from the "simplified evaluation function".
+_PAWN_TABLE = [
+    0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+    5,   5,  10,  25,  25,  10,   5,   5,
+    0,   0,   0,  20,  20,   0,   0,   0,
+    5,  -5, -10,   0,   0, -10,  -5,   5,
+    5,  10,  10, -20, -20,  10,  10,   5,
+    0,   0,   0,   0,   0,   0,   0,   0]
+_KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50]
+_BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20]
+_ROOK_TABLE = [
+    0,   0,   0,   0,   0,   0,   0,   0,
+    5,  10,  10,  10,  10,  10,  10,   5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    0,   0,   0,   5,   5,   0,   0,   0]
+_QUEEN_TABLE = [
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+    -5,   0,   5,   5,   5,   5,   0,  -5,
+    0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20]
+_KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20,  20,   0,   0,   0,   0,  20,  20,
+    20,  30,  10,   0,   0,  10,  30,  20]
+_TABLES = {PAWN: _PAWN_TABLE, KNIGHT: _KNIGHT_TABLE, BISHOP: _BISHOP_TABLE,
+           ROOK: _ROOK_TABLE, QUEEN: _QUEEN_TABLE, KING: _KING_TABLE}
+
+# PIECE_SQUARE[color][piece][square]: material plus positional bonus, squares indexed like
+# the board (a1 = 0). Black reads the white table mirrored vertically.
+PIECE_SQUARE = [[[0]*64 for _ in range(7)], [[0]*64 for _ in range(7)]]
+for _piece, _table in _TABLES.items():
+    for _square in range(64):
+        _file, _rank = _square & 7, _square >> 3
+        PIECE_SQUARE[WHITE][_piece][_square] = PIECE_VALUES[_piece] + _table[(7 - _rank)*8 + _file]
+        PIECE_SQUARE[1 - WHITE][_piece][_square] = PIECE_VALUES[_piece] + _table[_rank*8 + _file]
+
+# Transposition table entry flags
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+SearchResult = namedtuple('SearchResult', ['move', 'score', 'depth', 'nodes', 'elapsed', 'nps', 'pv'])
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(position):
+    '''
+    Description: static evaluation in centipawns from the point of view of the side to move:
+    material plus piece-square bonuses.
+    '''
+    score = 0
+    for color in (0, 1):
+        tables = PIECE_SQUARE[color]
+        side = 0
+        for piece, squares in enumerate(position.piece_squares[color]):
+            if squares:
+                table = tables[piece]
+                for square in squares:
+                    side += table[square]
+        score += side if color == WHITE else -side
+    return score if position.color == WHITE else -score
+
+
+class TranspositionTable:
+    '''
+    Description: fixed-size hash table of search results indexed by the low bits of the
+    Zobrist key. Each slot holds (key, depth, score, flag, move, generation). A slot is
+    replaced when the new result is at least as deep or the old one comes from an earlier
+    search (older generation); otherwise the deeper result is kept.
+    '''
+    __slots__ = ('size', 'mask', 'entries', 'generation')
+
+    def __init__(self, size_log2=20):
+        self.size = 1 << size_log2
+        self.mask = self.size - 1
+        self.entries = [None]*self.size
+        self.generation = 0
+
+    def probe(self, key):
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or depth >= entry[1] or entry[5] != self.generation:
+            self.entries[index] = (key, depth, score, flag, move, self.generation)
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.entries = [None]*self.size
+        self.generation = 0
+
+
+class Searcher:
+    '''
+    Description: negamax alpha-beta with iterative deepening, a transposition table,
+    quiescence search and move ordering by TT move, MVV-LVA, killer moves and the history
+    heuristic. One `Searcher` can be reused across moves of a game to keep its table.
+
+    With a `tablebase` (see tablebase.py), positions it covers are scored exactly.
+
+    Setting `stop` to True (e.g. from another thread) ends the search at the next check.
+    It is not cleared by `search`, so a stop sent just before a search starts is not
+    lost: the caller resets it to False before starting the next search.
+    '''
+
+    def __init__(self, tt_size_log2=20, tablebase=None):
+        self.tt = TranspositionTable(tt_size_log2)
+        self.tablebase = tablebase
+        self.killers = []
+        self.history = []
+        self.nodes = 0
+        self.deadline = None
+        self.node_limit = None
+        self.stop = False
+
+    def _check_limits(self):
+        if self.stop or (self.deadline is not None and time.perf_counter() >= self.deadline) \
+                or (self.node_limit is not None and self.nodes >= self.node_limit):
+            raise SearchTimeout
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        squares = position.board.squares
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history[position.color]
+
+        def score(move):
+            if move == tt_move:
+                return 10000000
+            to_square = (move >> 6) & 63
+            victim = squares[to_square]
+            promotion = move >> 12
+            if victim or promotion:
+                # MVV-LVA: most valuable victim first, least valuable attacker as tie-break
+                attacker = abs(squares[move & 63])
+                return 1000000 + PIECE_VALUES[abs(victim)]*10 - PIECE_VALUES[attacker]//100 + PIECE_VALUES[promotion]
+            if move in killers:
+                return 900000
+            return history[move & 4095]
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def _is_repetition(self, position):
+        # Any earlier occurrence of the position, in the game or the search line, counts
+        # as a draw. The counts are kept by `make`, so there is no history to scan.
+        return position.repetitions[position.key] > 1
+
+    def quiescence(self, position, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & CHECK_INTERVAL:
+            self._check_limits()
+        board = position.board
+        checked = in_check(board, position.color)
+        if not checked:
+            stand_pat = evaluate(position)
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+        squares = board.squares
+        moves = position.pseudo_legal_moves()
+        if not checked:
+            moves = [move for move in moves if squares[(move >> 6) & 63] or move >> 12]
+        legal_moves = 0
+        for move in self._order_moves(position, moves, None, ply):
+            if leaves_king_in_check(board, move):
+                continue
+            legal_moves += 1
+            position.make(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        if checked and not legal_moves:
+            return -MATE + ply
+        return alpha
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        if (ply and self.tablebase is not None
+                and (position.board.occupied[0] | position.board.occupied[1]).bit_count() <= self.tablebase.max_pieces):
+            # Exact results, with the distance to mate turned into a mate score
+            result = self.tablebase.probe_position(position)
+            if result is not None:
+                if not result.wdl:
+                    return 0
+                if result.dtm is not None:
+                    return result.wdl*(MATE - ply - result.dtm)
+                # Syzygy wins prefer the shortest way to the next capture or pawn move; the
+                # distance counts from the last one, so a position that just zeroed scores 0
+                distance = abs(result.dtz) if result.dtz is not None and position.halfmove_clock else 0
+                return result.wdl*(TABLEBASE_WIN - ply - distance)
+        if depth <= 0:
+            return self.quiescence(position, alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes & CHECK_INTERVAL:
+            self._check_limits()
+        if ply and (position.halfmove_clock >= 100 or self._is_repetition(position)):
+            return 0
+
+        key = position.key
+        original_alpha = alpha
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if ply and entry[1] >= depth:
+                score = entry[2]
+                if score > MATE_BOUND:
+                    score -= ply
+                elif score < -MATE_BOUND:
+                    score += ply
+                flag = entry[3]
+                if flag == EXACT or (flag == LOWER_BOUND and score >= beta) or (flag == UPPER_BOUND and score <= alpha):
+                    return score
+
+        board = position.board
+        checked = in_check(board, position.color)
+        if checked:
+            depth += 1
+        while len(self.killers) <= ply:
+            self.killers.append([None, None])
+
+        best_score = -INFINITY
+        best_move = None
+        legal_moves = 0
+        squares = board.squares
+        for move in self._order_moves(position, position.pseudo_legal_moves(), tt_move, ply):
+            if leaves_king_in_check(board, move):
+                continue
+            legal_moves += 1
+            position.make(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not squares[(move >> 6) & 63] and not move >> 12:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[position.color][move & 4095] += depth*depth
+                        break
+
+        if not legal_moves:
+            return -MATE + ply if checked else 0
+
+        flag = UPPER_BOUND if best_score <= original_alpha else LOWER_BOUND if best_score >= beta else EXACT
+        stored = best_score
+        if stored > MATE_BOUND:
+            stored += ply
+        elif stored < -MATE_BOUND:
+            stored -= ply
+        self.tt.store(key, depth, stored, flag, best_move)
+        return best_score
+
+    def principal_variation(self, position, max_length=32):
+        '''
+        Description: follows the transposition table from `position` to rebuild the line
+        the last search expects.
+        '''
+        pv = []
+        seen = set()
+        while len(pv) < max_length and position.key not in seen:
+            seen.add(position.key)
+            entry = self.tt.probe(position.key)
+            if entry is None or entry[4] is None or entry[4] not in position.legal_moves():
+                break
+            pv.append(entry[4])
+            position.make(entry[4])
+        for _ in pv:
+            position.unmake()
+        return pv
+
+    def search(self, position, time_limit=None, max_depth=64, node_limit=None, on_iteration=None, start_depth=1):
+        '''
+        Description: iterative deepening search of `position` until `time_limit` seconds,
+        `max_depth` plies or `node_limit` nodes are reached, whichever comes first.
+        `on_iteration(result)` is called after every completed depth. The first iteration
+        searches `start_depth` plies (see smp.py, whose helper searchers start deeper).
+
+        Returns a `SearchResult`: move (None if there is no legal move), score in
+        centipawns for the side to move, depth reached, nodes, elapsed seconds, nodes per
+        second and the principal variation.
+        '''
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit is not None else None
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.killers = []
+        self.history = [[0]*4096, [0]*4096]
+        self.tt.new_search()
+
+        legal_moves = position.legal_moves()
+        best = SearchResult(legal_moves[0] if legal_moves else None, 0, 0, 0, 0.0, 0, [])
+        if len(legal_moves) <= 1:
+            return best
+        history_length = len(position.history)
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            try:
+                score = self.negamax(position, depth, -INFINITY, INFINITY, 0)
+            except SearchTimeout:
+                # Unwind whatever the interrupted iteration left on the position
+                while len(position.history) > history_length:
+                    position.unmake()
+                break
+            elapsed = time.perf_counter() - start
+            pv = self.principal_variation(position)
+            move = pv[0] if pv else best.move
+            best = SearchResult(move, score, depth, self.nodes, elapsed,
+                                int(self.nodes/elapsed) if elapsed else 0, pv)
+            if on_iteration is not None:
+                on_iteration(best)
+            if abs(score) > MATE_BOUND:
+                break
+        elapsed = time.perf_counter() - start
+        return best._replace(nodes=self.nodes, elapsed=elapsed, nps=int(self.nodes/elapsed) if elapsed else 0)
+
+
+def best_move(position, time_limit=1.0, max_depth=64, searcher=None):
+    '''
+    Description: searches `position` for up to `time_limit` seconds and returns a
+    `SearchResult` with the best move found, its score, the depth reached, the node
+    count and the nodes per second.
+    '''
+    if searcher is None:
+        searcher = Searcher()
+    return searcher.search(position, time_limit=time_limit, max_depth=max_depth)
@@ -0,0 +1,262 @@
+# explore.py
+# opening explorer: position statistics over game collections, in a sorted on-disk index
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+import pgn
+
+# File layout: header (magic, version, entry count), then the entries sorted by key and
+# move. An entry counts the games that reached a position (its Zobrist key) and went on
+# with a move, by result in the order of pgn.RESULTS. Move 0 counts the games that ended
+# in the position.
+MAGIC = b'CPEX'
+VERSION = 1
+HEADER_STRUCT = struct.Struct('<4sB3xQ')
+ENTRY_STRUCT = struct.Struct('<QH2xIIII')
+ENTRY_SIZE = ENTRY_STRUCT.size
+# Entries read at once when merging chunks
+READ_ENTRIES = 4096
+
+Entry = namedtuple('Entry', ['key', 'move', 'white_wins', 'black_wins', 'draws', 'unfinished'])
+
+
+def games_of(entry):
+    return entry.white_wins + entry.black_wins + entry.draws + entry.unfinished
+
+
+def game_moves(game):
+    '''
+    Description: yields (key, move) for every position of `game` and the move played from
+    it, then (key, 0) for the position it ends in. A game dict with 'moves' is replayed
+    through the move validation and stops at its first illegal move; one with 'codes'
+    (see records.py) was validated when it was stored and is played as it is. A game
+    with an invalid FEN tag yields nothing.
+    '''
+    try:
+        position = pgn.starting_position(game)
+    except ValueError:
+        return
+    if 'codes' in game:
+        for code in game['codes']:
+            key = position.key
+            position.make(code)
+            yield key, code
+    else:
+        key = position.key
+        for ply, move, error_msg in pgn.replay(game['moves'], position):
+            if error_msg is not None:
+                break
+            yield key, position.history[-1][0]
+            key = position.key
+    yield position.key, 0
+
+
+def _spill(counts, directory, chunks):
+    '''
+    Description: writes `counts` ({(key, move): [counts by result]}) to a new chunk file
+    in `directory`, sorted, and empties it.
+    '''
+    path = os.path.join(directory, f'chunk{len(chunks)}')
+    with open(path, 'wb') as f:
+        f.write(b''.join(ENTRY_STRUCT.pack(key, move, *results) for (key, move), results in sorted(counts.items())))
+    chunks.append(path)
+    counts.clear()
+
+
+def _read_chunk(path):
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(READ_ENTRIES*ENTRY_SIZE)
+            if not block:
+                return
+            yield from ENTRY_STRUCT.iter_unpack(block)
+
+
+def build_index(games, path, max_ply=None, chunk_entries=1 << 20):
+    '''
+    Description: writes the position index of `games` (game dicts, streamed, e.g. from
+    `pgn.read_games` or a `records.Records` file) to `path`. Each position is counted once
+    per game, at its first occurrence, up to `max_ply` plies into the game (all by default).
+
+    Counts are aggregated in memory until `chunk_entries` distinct (position, move) pairs
+    are held, then spilled to a sorted chunk file next to `path`; the chunks are merged
+    into the index at the end, so memory use does not depend on the number of games.
+    Returns (games read, entries written).
+    '''
+    game_count = entry_count = 0
+    counts = {}
+    chunks = []
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+        for game in games:
+            game_count += 1
+            result = pgn.RESULTS.index(game['result'])
+            seen = set()
+            for ply, (key, move) in enumerate(game_moves(game)):
+                if max_ply is not None and ply >= max_ply:
+                    break
+                if key in seen:
+                    continue
+                seen.add(key)
+                results = counts.get((key, move))
+                if results is None:
+                    results = counts[key, move] = [0, 0, 0, 0]
+                results[result] += 1
+            if len(counts) >= chunk_entries:
+                _spill(counts, directory, chunks)
+        if counts:
+            _spill(counts, directory, chunks)
+
+        with open(path, 'wb') as f:
+            f.write(HEADER_STRUCT.pack(MAGIC, VERSION, 0))
+            current = None
+            for entry in heapq.merge(*[_read_chunk(chunk) for chunk in chunks]):
+                if current is not None and entry[:2] == current[:2]:
+                    current = current[:2] + tuple(a + b for a, b in zip(current[2:], entry[2:]))
+                    continue
+                if current is not None:
+                    f.write(ENTRY_STRUCT.pack(*current))
+                    entry_count += 1
+                current = entry
+            if current is not None:
+                f.write(ENTRY_STRUCT.pack(*current))
+                entry_count += 1
+            f.seek(0)
+            f.write(HEADER_STRUCT.pack(MAGIC, VERSION, entry_count))
+    return game_count, entry_count
+
+
+class ExplorerIndex:
+    '''
+    Description: a position index, memory-mapped read only. A lookup is a binary search
+    over the sorted keys that touches about log2(entries) pages, like `book.Book`.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size = HEADER_STRUCT.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a position index')
+        if version != VERSION:
+            self.close()
+            raise ValueError(f'{path} has index format version {version}, expected {VERSION}')
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.buffer.close()
+
+    def _key_at(self, index):
+        return struct.unpack_from('<Q', self.buffer, HEADER_STRUCT.size + index*ENTRY_SIZE)[0]
+
+    def entries(self, key):
+        '''
+        Description: yields the entries of the position with Zobrist key `key`, by move.
+        '''
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        for index in range(low, self.size):
+            entry = Entry(*ENTRY_STRUCT.unpack_from(self.buffer, HEADER_STRUCT.size + index*ENTRY_SIZE))
+            if entry.key != key:
+                break
+            yield entry
+
+    def find(self, position):
+        '''
+        Description: the statistics of `position`: (total, moves), where total is an Entry
+        (move 0) summing every game that reached it, or None if none did, and moves are the
+        entries of the moves played from it, most played first.
+        '''
+        found = list(self.entries(position.key))
+        if not found:
+            return None, []
+        total = Entry(position.key, 0, *[sum(column) for column in zip(*[entry[2:] for entry in found])])
+        moves = sorted((entry for entry in found if entry.move), key=lambda entry: -games_of(entry))
+        return total, moves
+
+
+def format_stats(entry):
+    '''
+    Description: 'games  white% draw% black%' for an entry.
+    '''
+    games = games_of(entry)
+    return (f'{games:>8} games  {100*entry.white_wins/games:5.1f}% white  {100*entry.draws/games:5.1f}% draws  '
+            f'{100*entry.black_wins/games:5.1f}% black')
+
+
+def read_games(path):
+    '''
+    Description: the games of a PGN file, or of a game record file if `path` ends in .cgr.
+    '''
+    import records
+    if path.endswith(records.EXTENSION):
+        with records.Records(path) as games:
+            yield from games
+    else:
+        yield from pgn.read_games(path)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py explore',
+                                     description='Build or query an index of position statistics over game collections.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='index the positions of game collections')
+    build.add_argument('paths', nargs='+', help="PGN files, '-' for standard input, or game record files (.cgr)")
+    build.add_argument('-o', '--output', required=True, help='index file to write')
+    build.add_argument('--max-ply', type=int, help='plies of each game to index (default: all)')
+    build.add_argument('--chunk-entries', type=int, default=1 << 20,
+                       help='(position, move) pairs held in memory before spilling a chunk to disk (default: 1048576)')
+    query = commands.add_parser('query', help='show the statistics of a position and the moves played from it')
+    query.add_argument('index', help='index file')
+    query.add_argument('moves', nargs='*', help='SAN moves leading to the position')
+    query.add_argument('--fen', help='position the moves start from (default: initial position)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        games = (game for path in args.paths for game in read_games(path))
+        start = time.perf_counter()
+        game_count, entry_count = build_index(games, args.output, args.max_ply, args.chunk_entries)
+        print(f'{game_count} games, {entry_count} entries written to {args.output} '
+              f'in {time.perf_counter() - start:.1f}s')
+        return
+
+    import chess
+    from fen import from_fen
+    from position import Position
+    position = from_fen(args.fen) if args.fen else Position()
+    for ply, move, error_msg in pgn.replay(args.moves, position):
+        if error_msg is not None:
+            print(f'Illegal move {move} at ply {ply + 1}: {error_msg}', file=sys.stderr)
+            sys.exit(1)
+    with ExplorerIndex(args.index) as index:
+        start = time.perf_counter()
+        total, moves = index.find(position)
+        elapsed = time.perf_counter() - start
+        if total is None:
+            print(f'Position not in index (lookup {1000*elapsed:.2f} ms).')
+            sys.exit(1)
+        print(f'{"position":<8} {format_stats(total)}  (lookup {1000*elapsed:.2f} ms)')
+        games = games_of(total)
+        for entry in moves:
+            print(f'{chess.move_to_san(position, entry.move):<8} {format_stats(entry)}  '
+                  f'({100*games_of(entry)/games:.1f}% of games)')
@@ -0,0 +1,103 @@
+# fen.py
+# FEN parsing and serialization for chess.py positions
+from array_board import BLACK, PIECE_LETTERS, SQUARE_INDEX, SQUARE_NAMES, WHITE, ArrayBoard
+from bitboard import BLACK_KINGSIDE, BLACK_QUEENSIDE, WHITE_KINGSIDE, WHITE_QUEENSIDE
+from position import Position
+
+STARTING_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# FEN piece letters to piece codes: uppercase for white, lowercase for black
+FEN_CODES = {letter: code for code, letter in enumerate(PIECE_LETTERS) if code}
+FEN_CODES.update({letter.lower(): -code for letter, code in FEN_CODES.items()})
+FEN_LETTERS = {code: letter for letter, code in FEN_CODES.items()}
+_PLACEMENT_CODES = dict(FEN_CODES, **{'.': 0})
+_EXPAND_DIGITS = str.maketrans({str(n): '.'*n for n in range(1, 9)})
+CASTLING_LETTERS = [('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE), ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE)]
+
+
+def parse_placement(placement):
+    '''
+    Description: returns the 64 piece codes described by the piece placement field of a FEN.
+    '''
+    # Expand the digits into runs of '.', so every rank becomes exactly 8 characters
+    ranks = placement.translate(_EXPAND_DIGITS).split('/')
+    if len(ranks) != 8 or any(len(rank) != 8 for rank in ranks):
+        raise ValueError(f'Invalid FEN placement: {placement}')
+    try:
+        return [_PLACEMENT_CODES[char] for char in ''.join(reversed(ranks))]
+    except KeyError:
+        raise ValueError(f'Invalid FEN placement: {placement}') from None
+
+
+def from_fen(fen):
+    '''
+    Description: builds a `Position` directly from a FEN string, without replaying moves.
+    Missing trailing fields default to '- - 0 1'. Raises ValueError on malformed input.
+    '''
+    fields = fen.split()
+    if len(fields) < 2 or len(fields) > 6:
+        raise ValueError(f'Invalid FEN: {fen}')
+    placement, side = fields[0], fields[1]
+    castling, ep, halfmove, fullmove = (fields[2:] + ['-', '-', '0', '1'][len(fields) - 2:])[:4]
+    if side not in ('w', 'b'):
+        raise ValueError(f'Invalid FEN side to move: {side}')
+
+    castling_rights = 0
+    if castling != '-':
+        for letter, right in CASTLING_LETTERS:
+            if letter in castling:
+                castling_rights |= right
+        if not castling_rights or set(castling) - set('KQkq'):
+            raise ValueError(f'Invalid FEN castling rights: {castling}')
+
+    if ep == '-':
+        ep_square = None
+    elif ep in SQUARE_INDEX and ep[1] == ('6' if side == 'w' else '3'):
+        ep_square = SQUARE_INDEX[ep]
+    else:
+        raise ValueError(f'Invalid FEN en passant square: {ep}')
+
+    try:
+        halfmove_clock, fullmove_number = int(halfmove), int(fullmove)
+    except ValueError:
+        raise ValueError(f'Invalid FEN move counters: {halfmove} {fullmove}') from None
+
+    color = WHITE if side == 'w' else BLACK
+    return Position(ArrayBoard(parse_placement(placement)), color, castling_rights, ep_square,
+                    halfmove_clock, fullmove_number)
+
+
+def to_fen(position):
+    '''
+    Description: serializes `position` as a FEN string.
+    '''
+    squares = position.board.squares
+    ranks = []
+    for rank in range(7, -1, -1):
+        row = ''
+        empty = 0
+        for code in squares[rank*8:rank*8 + 8]:
+            if code:
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                row += FEN_LETTERS[code]
+            else:
+                empty += 1
+        ranks.append(row + (str(empty) if empty else ''))
+    castling = ''.join(letter for letter, right in CASTLING_LETTERS if position.castling_rights & right) or '-'
+    ep = SQUARE_NAMES[position.ep_square] if position.ep_square is not None else '-'
+    side = 'w' if position.color == WHITE else 'b'
+    return f"{'/'.join(ranks)} {side} {castling} {ep} {position.halfmove_clock} {position.fullmove_number}"
+
+
+def load_fens(path):
+    '''
+    Description: lazily yields a `Position` for every non-empty line of the file at `path`.
+    Anything after a ';' on a line (e.g. EPD-style annotations) is ignored.
+    '''
+    with open(path) as f:
+        for line in f:
+            fen = line.split(';', 1)[0].strip()
+            if fen:
+                yield from_fen(fen)
@@ -0,0 +1,182 @@
+# instrument.py
+# opt-in call counts and latency histograms for the move validation hot path
+import os
+import time
+
+# chess.py imports this module on every start, so everything only needed once
+# instrumentation is on is imported by the functions that use it
+
+# Setting this environment variable to anything but '' or '0' turns instrumentation on
+ENVIRONMENT_VARIABLE = 'CHESS_PY_PROFILE'
+
+# Histogram bucket b counts calls that took less than 2**b nanoseconds (the last
+# bucket takes everything slower)
+BUCKETS = 40
+
+
+class CallStats:
+    '''
+    Description: call count, total and extreme latencies and a log2 latency histogram of
+    one function, in nanoseconds.
+    '''
+    __slots__ = ('name', 'calls', 'total', 'minimum', 'maximum', 'histogram')
+
+    def __init__(self, name):
+        self.name = name
+        self.clear()
+
+    def clear(self):
+        self.calls = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = 0
+        self.histogram = [0]*BUCKETS
+
+    def record(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        if self.minimum is None or elapsed < self.minimum:
+            self.minimum = elapsed
+        if elapsed > self.maximum:
+            self.maximum = elapsed
+        self.histogram[min(elapsed.bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, fraction):
+        '''
+        Description: upper bound, in nanoseconds, of the histogram bucket holding the
+        `fraction` percentile, capped by the slowest call seen.
+        '''
+        target = fraction*self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(1 << bucket, self.maximum)
+        return self.maximum
+
+
+_stats = {}
+_reporting = False
+
+
+def enabled():
+    return os.environ.get(ENVIRONMENT_VARIABLE, '') not in ('', '0')
+
+
+def enable():
+    '''
+    Description: turns instrumentation on for this process and the processes it starts,
+    through the environment variable. Modules call `install` when they are imported.
+    '''
+    os.environ[ENVIRONMENT_VARIABLE] = '1'
+
+
+def stats_for(name):
+    if name not in _stats:
+        _stats[name] = CallStats(name)
+    return _stats[name]
+
+
+def _timed(function, stats):
+    import functools
+    perf_counter_ns = time.perf_counter_ns
+    record = stats.record
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(perf_counter_ns() - start)
+    return timed
+
+
+def install(namespace, names):
+    '''
+    Description: replaces the functions `names` of a module namespace (its `globals()`),
+    or the methods `names` of a class, with timed wrappers, once, and arranges for the
+    report to be logged at exit and on SIGUSR1. Calls between functions of the module go
+    through the namespace, so they are timed too, and a caller's time includes its
+    callees'. Methods are reported as Class.method. Nothing is installed unless
+    instrumentation is enabled, so disabled runs call the plain functions.
+    '''
+    if not enabled():
+        return
+    for name in names:
+        if isinstance(namespace, type):
+            function = getattr(namespace, name)
+            if not hasattr(function, '__wrapped__'):
+                setattr(namespace, name, _timed(function, stats_for(f'{namespace.__name__}.{name}')))
+            continue
+        function = namespace[name]
+        if not hasattr(function, '__wrapped__'):
+            namespace[name] = _timed(function, stats_for(name))
+    _start_reporting()
+
+
+def _start_reporting():
+    global _reporting
+    if _reporting:
+        return
+    _reporting = True
+    import atexit
+    import signal
+    import threading
+    atexit.register(log_report)
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda signum, frame: log_report())
+
+
+def report():
+    '''
+    Description: the collected statistics as text, one line per function, slowest total first.
+    '''
+    lines = [f'{"function":<24} {"calls":>10} {"total ms":>10} {"mean us":>9} {"p50 us":>9} '
+             f'{"p90 us":>9} {"p99 us":>9} {"max us":>9}']
+    stats = sorted(list(_stats.values()), key=lambda stats: -stats.total)
+    for entry in stats:
+        if not entry.calls:
+            continue
+        lines.append(f'{entry.name:<24} {entry.calls:>10,} {entry.total/1e6:>10.1f} {entry.total/entry.calls/1e3:>9.2f} '
+                     f'{entry.percentile(0.5)/1e3:>9.2f} {entry.percentile(0.9)/1e3:>9.2f} '
+                     f'{entry.percentile(0.99)/1e3:>9.2f} {entry.maximum/1e3:>9.2f}')
+    return '\n'.join(lines)
+
+
+def log_report():
+    import logging
+    logging.getLogger('chess.instrument').info('instrumentation report (pid %d)\n%s', os.getpid(), report())
+
+
+def reset():
+    # The wrappers hold on to their CallStats, so they are zeroed in place
+    for stats in _stats.values():
+        stats.clear()
+
+
+def take():
+    '''
+    Description: the statistics collected since the last `take` (or `reset`), as plain
+    tuples that pickle cheaply, and resets them. Pool worker processes exit without
+    running atexit handlers, so they return these with their results and the parent
+    process `merge`s them into its own report.
+    '''
+    taken = {name: (stats.calls, stats.total, stats.minimum, stats.maximum, stats.histogram)
+             for name, stats in _stats.items() if stats.calls}
+    reset()
+    return taken
+
+
+def merge(taken):
+    '''
+    Description: adds statistics returned by `take` in another process to this process's.
+    '''
+    for name, (calls, total, minimum, maximum, histogram) in taken.items():
+        stats = stats_for(name)
+        stats.calls += calls
+        stats.total += total
+        if stats.minimum is None or minimum < stats.minimum:
+            stats.minimum = minimum
+        stats.maximum = max(stats.maximum, maximum)
+        stats.histogram = [a + b for a, b in zip(stats.histogram, histogram)]
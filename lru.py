@@ -0,0 +1,70 @@
+# lru.py
+# bounded least-recently-used cache with hit/miss counters
+from collections import OrderedDict
+
+
+class LRUCache:
+    '''
+    Description: a bounded mapping that evicts the least recently used entry once it
+    holds more than `maxsize` entries. A `maxsize` of 0 disables caching.
+
+    `hits`, `misses` and `evictions` are counted so the size can be tuned, see `stats`.
+    '''
+    __slots__ = ('maxsize', 'hits', 'misses', 'evictions', '_entries')
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def resize(self, maxsize):
+        '''
+        Description: changes the capacity, evicting the oldest entries if it shrinks.
+        '''
+        self.maxsize = maxsize
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits/lookups if lookups else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -0,0 +1,104 @@
+# perft.py
+# move generation node counts, the correctness and speed gate for chess.py
+import argparse
+import sys
+import time
+
+from bitboard import move_to_uci
+from fen import STARTING_FEN, from_fen
+
+# Standard perft positions with their published node counts per depth
+# (https://www.chessprogramming.org/Perft_Results)
+PERFT_SUITE = [
+    ('initial', STARTING_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603, 193690690]),
+    ('position 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position 4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333, 15833292]),
+    ('position 5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487, 89941194]),
+    ('position 6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def perft(position, depth):
+    '''
+    Description: number of leaf nodes of the legal move tree of `position` at `depth`.
+    The last ply is counted without being played.
+    '''
+    moves = position.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        position.make(move)
+        nodes += perft(position, depth - 1)
+        position.unmake()
+    return nodes
+
+
+def divide(position, depth):
+    '''
+    Description: perft split by root move, as a list of (move, nodes).
+    '''
+    counts = []
+    for move in position.legal_moves():
+        position.make(move)
+        counts.append((move, perft(position, depth - 1)))
+        position.unmake()
+    return counts
+
+
+def check(max_nodes=100000, out=sys.stdout):
+    '''
+    Description: runs every depth of PERFT_SUITE whose expected count is at most `max_nodes`
+    and reports each result. Returns True if every count matches.
+    '''
+    all_passed = True
+    for name, fen, expected in PERFT_SUITE:
+        position = from_fen(fen)
+        for depth, nodes in enumerate(expected, 1):
+            if nodes > max_nodes:
+                break
+            start = time.perf_counter()
+            count = perft(position, depth)
+            elapsed = time.perf_counter() - start
+            passed = count == nodes
+            all_passed &= passed
+            status = 'ok' if passed else f'FAILED (expected {nodes:,})'
+            print(f'{name:>10} depth {depth}: {count:>12,} nodes {count/elapsed:>10,.0f} nodes/s {status}', file=out)
+    return all_passed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py perft',
+                                     description='Count the leaf nodes of the legal move tree.')
+    parser.add_argument('depth', type=int, nargs='?', default=4)
+    parser.add_argument('--fen', default=STARTING_FEN, help='position to count from (default: initial position)')
+    parser.add_argument('--divide', action='store_true', help='print the node count of every root move')
+    parser.add_argument('--check', action='store_true',
+                        help='check the standard perft positions against their published counts')
+    parser.add_argument('--max-nodes', type=int, default=100000,
+                        help='with --check, skip depths whose expected count is larger than this')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        if not check(args.max_nodes):
+            sys.exit(1)
+        return
+
+    position = from_fen(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(position, args.depth)
+        for move, nodes in sorted(counts, key=lambda count: move_to_uci(count[0])):
+            print(f'{move_to_uci(move)}: {nodes}')
+        nodes = sum(nodes for _, nodes in counts)
+    else:
+        nodes = perft(position, args.depth)
+    elapsed = time.perf_counter() - start
+    print(f'Nodes: {nodes:,}  Time: {elapsed:.2f}s  Speed: {nodes/elapsed:,.0f} nodes/s')
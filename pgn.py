@@ -0,0 +1,288 @@
+# pgn.py
+# streaming PGN reader and writer for chess.py
+import argparse
+import mmap
+import re
+import sys
+
+import chess
+from fen import from_fen
+from position import Position
+
+# The seven tag roster comes first, in this order, when writing a game
+SEVEN_TAG_ROSTER = ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result']
+RESULTS = ['1-0', '0-1', '1/2-1/2', '*']
+
+header_pattern = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variation brackets, NAGs and everything else (move numbers, moves, results)
+token_pattern = re.compile(r'\{[^}]*\}|;[^\n]*|[()]|\$\d+|[^\s(){};]+')
+move_number_pattern = re.compile(r'^\d+\.*')
+# What `_game_texts` follows across lines: comment braces, ';' comments, variation brackets
+# and results (whole tokens only)
+scan_pattern = re.compile(r'[{};()]|(?<![^\s(){};])(?:1-0|0-1|1/2-1/2|\*)(?![^\s(){};])')
+
+
+def _lines(path):
+    '''
+    Description: yields the lines of `path` as bytes. Regular files are memory-mapped, so
+    the operating system pages the file in and out as it is scanned and memory use does
+    not depend on the file size; '-' reads standard input line by line instead.
+    '''
+    if path == '-':
+        yield from sys.stdin.buffer
+        return
+    with open(path, 'rb') as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+        with buffer:
+            readline = buffer.readline
+            line = readline()
+            while line:
+                yield line
+                line = readline()
+
+
+def _game_texts(lines):
+    '''
+    Description: groups lines into (header lines, movetext lines) pairs, one per game.
+    A game ends at its result token ('1-0', '0-1', '1/2-1/2' or '*'), or when a header line
+    follows some movetext, so games without tags are told apart too. Comments and
+    variations are followed across lines: a result inside them does not end the game, and
+    a line starting with '[' inside a comment is not a header.
+    '''
+    headers, movetext = [], []
+    in_comment = False
+    depth = 0
+    results = set(RESULTS)
+    for line in lines:
+        line = line.decode('utf-8', errors='replace').strip()
+        if not in_comment:
+            if not line or line.startswith('%'):
+                continue
+            if line.startswith('['):
+                if movetext:
+                    yield headers, movetext
+                    headers, movetext = [], []
+                    depth = 0
+                headers.append(line)
+                continue
+        start = 0
+        for match in scan_pattern.finditer(line):
+            token = match.group()
+            if in_comment:
+                in_comment = token != '}'
+            elif token == '{':
+                in_comment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                depth += 1
+            elif token == ')':
+                depth = max(depth - 1, 0)
+            elif depth == 0 and token in results:
+                movetext.append(line[start:match.end()].strip())
+                yield headers, movetext
+                headers, movetext = [], []
+                start = match.end()
+        rest = line[start:].strip()
+        if rest:
+            movetext.append(rest)
+    if headers or movetext:
+        yield headers, movetext
+
+
+def parse_movetext(text):
+    '''
+    Description: returns the mainline SAN moves and the result found in `text`. Comments,
+    variations, NAGs, move numbers and '!'/'?' annotations are skipped.
+    '''
+    moves = []
+    result = '*'
+    depth = 0
+    for token in token_pattern.findall(text):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth or token[0] in '{;$':
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            move = move_number_pattern.sub('', token).rstrip('!?')
+            if move:
+                moves.append(move)
+    return moves, result
+
+
+def parse_game(header_lines, movetext_lines):
+    '''
+    Description: builds a game dict from its header and movetext lines.
+
+    Returns:
+        game: {'headers': {tag: value}, 'moves': [SAN moves], 'result': '1-0' | '0-1' | '1/2-1/2' | '*'}
+    '''
+    headers = {}
+    for line in header_lines:
+        for tag, value in header_pattern.findall(line):
+            headers[tag] = value.replace('\\"', '"').replace('\\\\', '\\')
+    # Lines stay apart so that a ';' comment ends with its line
+    moves, result = parse_movetext('\n'.join(movetext_lines))
+    if result == '*' and headers.get('Result') in RESULTS:
+        result = headers['Result']
+    return {'headers': headers, 'moves': moves, 'result': result}
+
+
+def read_games(path):
+    '''
+    Description: lazily yields the games of the PGN file at `path`, one game dict at a time
+    (see `parse_game`). Moves are not validated, use `replay` for that.
+    '''
+    for header_lines, movetext_lines in _game_texts(_lines(path)):
+        yield parse_game(header_lines, movetext_lines)
+
+
+def starting_position(game, fen=None):
+    '''
+    Description: the position `game` starts from: its FEN tag if it has one, else `fen`
+    if given, else the initial position.
+    '''
+    fen = game['headers'].get('FEN', fen)
+    return from_fen(fen) if fen else Position()
+
+
+def replay(moves, position=None):
+    '''
+    Description: plays SAN `moves` on `position` (the starting position by default),
+    resolving every move through `chess.resolve_move`.
+
+    Yields (ply, move, error_msg) after each move, with `position` already updated and
+    error_msg None. The first illegal move is yielded with its error message and ends the
+    replay, leaving `position` just before it.
+    '''
+    if position is None:
+        position = Position()
+    for ply, move in enumerate(moves):
+        from_square, to_square, is_move_legal, error_msg = chess.resolve_move(position, move)
+        if not is_move_legal:
+            yield ply, move, error_msg
+            return
+        position.make(chess.san_move_code(from_square, to_square, move))
+        yield ply, move, None
+
+
+def read_positions(path):
+    '''
+    Description: lazily yields (game, ply, position) for every move of every game in `path`.
+    The same `Position` object is updated in place between yields, copy it to keep it.
+    Games stop at their first illegal move; games with an invalid FEN tag are skipped.
+    '''
+    for game in read_games(path):
+        try:
+            position = starting_position(game)
+        except ValueError:
+            continue
+        for ply, move, error_msg in replay(game['moves'], position):
+            if error_msg is not None:
+                break
+            yield game, ply, position
+
+
+def format_game(game):
+    '''
+    Description: serializes a game dict as PGN text.
+    '''
+    headers = dict(game.get('headers', {}))
+    headers['Result'] = game.get('result', headers.get('Result', '*'))
+    tags = [tag for tag in SEVEN_TAG_ROSTER if tag in headers] + \
+        [tag for tag in headers if tag not in SEVEN_TAG_ROSTER]
+    lines = []
+    for tag in tags:
+        value = str(headers[tag]).replace('\\', '\\\\').replace('"', '\\"')
+        lines.append(f'[{tag} "{value}"]')
+    lines.append('')
+
+    # Move numbers continue from the FEN tag, if any
+    fullmove_number, black_first = 1, False
+    if 'FEN' in headers:
+        fields = headers['FEN'].split()
+        black_first = len(fields) > 1 and fields[1] == 'b'
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+
+    # Movetext lines are wrapped before 80 characters
+    tokens = []
+    for ply, move in enumerate(game['moves'], int(black_first)):
+        if ply % 2 == 0:
+            tokens.append(f'{fullmove_number + ply//2}.')
+        elif black_first and ply == 1:
+            tokens.append(f'{fullmove_number}...')
+        tokens.append(move)
+    tokens.append(headers['Result'])
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = f'{line} {token}' if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def write_games(path, games):
+    '''
+    Description: writes `games` (any iterable, consumed lazily) to the PGN file at `path`.
+    Returns the number of games written.
+    '''
+    count = 0
+    with open(path, 'w') as f:
+        for game in games:
+            if count:
+                f.write('\n')
+            f.write(format_game(game))
+            count += 1
+    return count
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py pgn',
+                                     description='Replay every game of a PGN file through the move validation.')
+    parser.add_argument('path', help="PGN file to read, '-' for standard input")
+    parser.add_argument('-o', '--output', help='write the games that replay cleanly to this PGN file')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='only print a summary instead of a line per game')
+    args = parser.parse_args(argv)
+    counts = {'games': 0, 'errors': 0}
+
+    def checked_games():
+        for index, game in enumerate(read_games(args.path)):
+            headers = game['headers']
+            error = None
+            try:
+                position = starting_position(game)
+            except ValueError as e:
+                error = str(e)
+            else:
+                for ply, move, error_msg in replay(game['moves'], position):
+                    if error_msg is not None:
+                        error = f'ply {ply + 1} ({move}): {error_msg}'
+            counts['games'] += 1
+            if error is not None:
+                counts['errors'] += 1
+            if not args.quiet:
+                players = f"{headers.get('White', '?')} - {headers.get('Black', '?')}"
+                print(f"{index + 1}: {players} {game['result']} {len(game['moves'])} plies {error or 'OK'}")
+            if error is None:
+                yield game
+
+    if args.output:
+        count = write_games(args.output, checked_games())
+        print(f'Wrote {count} games to {args.output}')
+    else:
+        for _ in checked_games():
+            pass
+    if args.quiet:
+        print(f"{counts['games']} games, {counts['errors']} with errors")
@@ -0,0 +1,269 @@
+# position.py
+# per-game state for chess.py: board, piece lists, side to move, castling, en passant and clocks
+from attack_maps import AttackMaps
+from array_board import (BISHOP, COLOR_NAMES, EMPTY, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE, as_array_board,
+                         initialize_array_board)
+from bitboard import (ALL_CASTLING, BLACK_KINGSIDE, BLACK_QUEENSIDE, PAWN_ATTACKS, WHITE_KINGSIDE,
+                      WHITE_QUEENSIDE, castling_rights_from_board, generate_legal_moves,
+                      generate_pseudo_legal_moves, in_check)
+from zobrist import CASTLING_KEYS, EP_KEYS, PIECE_KEYS, SIDE_KEY, state_key
+
+# Castling rights that survive a move touching each square: moving from or capturing
+# on a king or rook home square drops the matching rights.
+CASTLING_MASK = [ALL_CASTLING]*64
+CASTLING_MASK[0] &= ~WHITE_QUEENSIDE
+CASTLING_MASK[7] &= ~WHITE_KINGSIDE
+CASTLING_MASK[4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[56] &= ~BLACK_QUEENSIDE
+CASTLING_MASK[63] &= ~BLACK_KINGSIDE
+CASTLING_MASK[60] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+# b1, d1, ..., a2, c2, ...: the squares a light-squared bishop can reach
+LIGHT_SQUARES = 0x55AA55AA55AA55AA
+
+
+class Position:
+    '''
+    Description: the full state of one game.
+
+    Attributes:
+        board: an `ArrayBoard` with the pieces and their masks
+        piece_squares: piece_squares[color][piece] lists the squares holding that piece
+        color: the side to move (WHITE or BLACK)
+        castling_rights: bitmask of WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE
+        ep_square: square a pawn may capture onto en passant, or None
+        halfmove_clock: plies since the last capture or pawn move
+        fullmove_number: starts at 1 and grows after every black move
+        history: undo records of the moves played, consumed by `unmake`
+        key: 64-bit Zobrist key of the position (see zobrist.py)
+        repetitions: how many times each key has occurred in the game so far, so the
+            repetition count of the current position is one lookup
+        attacks: `AttackMaps` of the position once `track_attacks` is called, else None
+
+    `make` and `unmake` update everything incrementally, so many games can be held and
+    played in one process without copying state.
+    '''
+    __slots__ = ('board', 'piece_squares', 'piece_index', 'color', 'castling_rights',
+                 'ep_square', 'halfmove_clock', 'fullmove_number', 'history', 'key', 'repetitions', 'attacks')
+
+    def __init__(self, board=None, color=WHITE, castling_rights=None, ep_square=None,
+                 halfmove_clock=0, fullmove_number=1):
+        self.board = as_array_board(board) if board is not None else initialize_array_board()
+        self.color = color
+        self.castling_rights = castling_rights_from_board(self.board) if castling_rights is None else castling_rights
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.fullmove_number = fullmove_number
+        self.history = []
+        self.attacks = None
+        # piece_index[square] is the position of `square` inside its piece list, which
+        # lets a piece be removed from the list in O(1) by swapping in the last entry
+        black, white = [[] for _ in range(7)], [[] for _ in range(7)]
+        self.piece_squares = [black, white]
+        self.piece_index = piece_index = [0]*64
+        # Like `make`, only keep an en-passant square that a pawn could actually capture onto
+        if ep_square is not None and not PAWN_ATTACKS[1 - color][ep_square] & self.board.pieces[color][PAWN]:
+            self.ep_square = None
+        # The key is computed in the same pass, see zobrist.compute_key
+        key = state_key(self.color, self.castling_rights, self.ep_square)
+        for square, code in enumerate(self.board.squares):
+            if code:
+                squares = white[code] if code > 0 else black[-code]
+                piece_index[square] = len(squares)
+                squares.append(square)
+                key ^= PIECE_KEYS[code][square]
+        self.key = key
+        self.repetitions = {key: 1}
+
+    @property
+    def player(self):
+        return COLOR_NAMES[self.color]
+
+    def copy(self):
+        '''
+        Description: a position with the same state and repetition counts, but no moves to unmake.
+        '''
+        position = Position(self.board.copy(), self.color, self.castling_rights, self.ep_square,
+                            self.halfmove_clock, self.fullmove_number)
+        position.repetitions = dict(self.repetitions)
+        return position
+
+    def track_attacks(self):
+        '''
+        Description: starts keeping per-color attack counts (see attack_maps.py), updated
+        by every `make` and `unmake`. They are shared with the board, so
+        `chess.is_square_threatened` and `is_check` become lookups. Returns self.
+        '''
+        self.attacks = self.board.attacks = AttackMaps(self.board)
+        return self
+
+    def _add(self, square, code):
+        squares = self.piece_squares[code > 0][abs(code)]
+        self.piece_index[square] = len(squares)
+        squares.append(square)
+        self.board.put(square, code)
+        self.key ^= PIECE_KEYS[code][square]
+
+    def _remove(self, square):
+        code = self.board.squares[square]
+        squares = self.piece_squares[code > 0][abs(code)]
+        last = squares.pop()
+        if last != square:
+            index = self.piece_index[square]
+            squares[index] = last
+            self.piece_index[last] = index
+        self.board.put(square, EMPTY)
+        self.key ^= PIECE_KEYS[code][square]
+
+    def _relocate(self, from_square, to_square):
+        code = self.board.squares[from_square]
+        index = self.piece_index[from_square]
+        self.piece_squares[code > 0][abs(code)][index] = to_square
+        self.piece_index[to_square] = index
+        self.board.put(to_square, code)
+        self.board.put(from_square, EMPTY)
+        self.key ^= PIECE_KEYS[code][from_square] ^ PIECE_KEYS[code][to_square]
+
+    def make(self, move):
+        '''
+        Description: plays `move` (a 16-bit move code, see bitboard.encode_move). The move
+        is trusted to be legal.
+        '''
+        from_square, to_square, promotion = move & 63, (move >> 6) & 63, move >> 12
+        squares = self.board.squares
+        moved = squares[from_square]
+        piece = abs(moved)
+        captured = squares[to_square]
+        captured_square = to_square
+        if piece == PAWN and not captured and to_square == self.ep_square:
+            captured_square = (from_square & 56) | (to_square & 7)
+            captured = squares[captured_square]
+        self.history.append((move, captured, self.castling_rights, self.ep_square, self.halfmove_clock, self.key))
+        castles = piece == KING and abs(to_square - from_square) == 2
+        attacks = self.attacks
+        if attacks is not None:
+            changed = [from_square, to_square]
+            if captured_square != to_square:
+                changed.append(captured_square)
+            if castles:
+                changed += (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            attacks.begin(changed)
+
+        if captured:
+            self._remove(captured_square)
+        if castles:
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            self._relocate(rook_from, rook_to)
+        if promotion:
+            self._remove(from_square)
+            self._add(to_square, promotion if moved > 0 else -promotion)
+        else:
+            self._relocate(from_square, to_square)
+        if attacks is not None:
+            attacks.end()
+
+        castling_rights = self.castling_rights & CASTLING_MASK[from_square] & CASTLING_MASK[to_square]
+        self.key ^= CASTLING_KEYS[self.castling_rights] ^ CASTLING_KEYS[castling_rights] ^ SIDE_KEY
+        self.castling_rights = castling_rights
+        if self.ep_square is not None:
+            self.key ^= EP_KEYS[self.ep_square & 7]
+            self.ep_square = None
+        if piece == PAWN and abs(to_square - from_square) == 16:
+            # Only record the square when an enemy pawn could actually capture onto it
+            ep_square = (from_square + to_square) >> 1
+            if PAWN_ATTACKS[self.color][ep_square] & self.board.pieces[1 - self.color][PAWN]:
+                self.ep_square = ep_square
+                self.key ^= EP_KEYS[ep_square & 7]
+        self.halfmove_clock = 0 if piece == PAWN or captured else self.halfmove_clock + 1
+        if self.color != WHITE:
+            self.fullmove_number += 1
+        self.color = 1 - self.color
+        self.repetitions[self.key] = self.repetitions.get(self.key, 0) + 1
+
+    def unmake(self):
+        '''
+        Description: takes back the last move played with `make`.
+        '''
+        move, captured, self.castling_rights, self.ep_square, self.halfmove_clock, key = self.history.pop()
+        count = self.repetitions[self.key] - 1
+        if count:
+            self.repetitions[self.key] = count
+        else:
+            del self.repetitions[self.key]
+        from_square, to_square, promotion = move & 63, (move >> 6) & 63, move >> 12
+        self.color = 1 - self.color
+        if self.color != WHITE:
+            self.fullmove_number -= 1
+
+        if promotion:
+            self._remove(to_square)
+            self._add(from_square, PAWN if self.color == WHITE else -PAWN)
+        else:
+            self._relocate(to_square, from_square)
+        moved = self.board.squares[from_square]
+        if abs(moved) == KING and abs(to_square - from_square) == 2:
+            rook_from, rook_to = (from_square + 3, from_square + 1) if to_square > from_square else (from_square - 4, from_square - 1)
+            self._relocate(rook_to, rook_from)
+        if captured:
+            if abs(moved) == PAWN and to_square == self.ep_square:
+                self._add((from_square & 56) | (to_square & 7), captured)
+            else:
+                self._add(to_square, captured)
+        self.key = key
+        if self.attacks is not None:
+            self.attacks.undo()
+
+    def legal_moves(self):
+        return generate_legal_moves(self.board, self.color, self.castling_rights, self.ep_square)
+
+    def pseudo_legal_moves(self):
+        return generate_pseudo_legal_moves(self.board, self.color, self.castling_rights, self.ep_square)
+
+    def is_check(self):
+        if self.attacks is not None:
+            king = self.board.pieces[self.color][KING]
+            return bool(king) and self.attacks.counts[1 - self.color][king.bit_length() - 1] > 0
+        return in_check(self.board, self.color)
+
+    def repetition_count(self):
+        '''
+        Description: how many times the current position has occurred in the game, this
+        time included. Keys only repeat between irreversible moves, so this counts the
+        repetitions the rules care about.
+        '''
+        return self.repetitions.get(self.key, 0)
+
+    def is_insufficient_material(self):
+        '''
+        Description: True if neither side can ever mate: bare kings, a single knight or
+        bishop, or any number of bishops all on squares of the same color.
+        '''
+        black, white = self.board.pieces
+        if black[PAWN] | white[PAWN] | black[ROOK] | white[ROOK] | black[QUEEN] | white[QUEEN]:
+            return False
+        knights = black[KNIGHT] | white[KNIGHT]
+        bishops = black[BISHOP] | white[BISHOP]
+        if bin(knights | bishops).count('1') <= 1:
+            return True
+        return not knights and (not bishops & LIGHT_SQUARES or not bishops & ~LIGHT_SQUARES)
+
+    def draw_reason(self, claim=True):
+        '''
+        Description: why the game is drawn, or None. Insufficient material, fivefold
+        repetition and the seventy-five-move rule end the game by themselves; with `claim`,
+        threefold repetition and the fifty-move rule, which a player has to claim, count too.
+        Checkmate takes precedence and is not looked at here.
+        '''
+        if self.is_insufficient_material():
+            return 'insufficient material'
+        count = self.repetitions.get(self.key, 0)
+        if count >= 5:
+            return 'fivefold repetition'
+        if self.halfmove_clock >= 150:
+            return 'seventy-five-move rule'
+        if claim:
+            if count >= 3:
+                return 'threefold repetition'
+            if self.halfmove_clock >= 100:
+                return 'fifty-move rule'
+        return None
@@ -0,0 +1,231 @@
+# records.py
+# compact binary game records: 16-bit move codes and an index to fetch any game by number
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+
+import chess
+import pgn
+from position import Position
+
+# File layout: header, games, then the index of game offsets (unsigned 64-bit).
+# Header: magic, version, game count, index offset
+MAGIC = b'CPGR'
+VERSION = 1
+EXTENSION = '.cgr'
+HEADER_STRUCT = struct.Struct('<4sB3xIQ')
+# Every game: result (index in pgn.RESULTS), tags length in bytes, ply count, then the
+# tags as UTF-8 'tag\0value\0...' and the moves as `bitboard.encode_move` codes
+GAME_STRUCT = struct.Struct('<BxHH')
+# Codes and offsets are stored little-endian whatever the machine
+SWAP_BYTES = sys.byteorder != 'little'
+
+
+def from_san(moves, position=None):
+    '''
+    Description: the move codes of SAN `moves`, written as in PGN or as typed into
+    `chess.play` ('0-0', 'exd8Q', with or without '+'), played from `position` (the
+    initial position by default). `position` is left after the last move.
+    Raises ValueError at the first illegal move.
+    '''
+    if position is None:
+        position = Position()
+    codes = array('H')
+    for ply, move in enumerate(moves):
+        from_square, to_square, is_move_legal, error_msg = chess.resolve_move(position, move)
+        if not is_move_legal:
+            raise ValueError(f'ply {ply + 1} ({move}): {error_msg}')
+        code = chess.san_move_code(from_square, to_square, move)
+        position.make(code)
+        codes.append(code)
+    return codes
+
+
+def to_san(codes, position=None):
+    '''
+    Description: the SAN moves of `codes` played from `position` (the initial position by
+    default), the inverse of `from_san`. `position` is left after the last move.
+    '''
+    if position is None:
+        position = Position()
+    moves = []
+    for code in codes:
+        moves.append(chess.move_to_san(position, code))
+        position.make(code)
+    return moves
+
+
+class RecordWriter:
+    '''
+    Description: writes games to a record file one at a time. The index and the header are
+    written by `close` (or at the end of a `with` block), so memory use does not depend on
+    the number of games beyond 8 bytes each for the index.
+    '''
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER_STRUCT.pack(MAGIC, VERSION, 0, 0))
+        self.offsets = array('Q')
+
+    def add(self, codes, headers=None, result='*'):
+        '''
+        Description: appends a game given by its move codes, tags and result.
+        '''
+        tags = '\0'.join(f'{tag}\0{value}' for tag, value in (headers or {}).items()).encode('utf-8')
+        codes = array('H', codes)
+        if SWAP_BYTES:
+            codes.byteswap()
+        self.offsets.append(self.file.tell())
+        self.file.write(GAME_STRUCT.pack(pgn.RESULTS.index(result), len(tags), len(codes)))
+        self.file.write(tags)
+        self.file.write(codes.tobytes())
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        offsets = array('Q', self.offsets)
+        if SWAP_BYTES:
+            offsets.byteswap()
+        self.file.write(offsets.tobytes())
+        self.file.seek(0)
+        self.file.write(HEADER_STRUCT.pack(MAGIC, VERSION, len(self.offsets), index_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_games(path, games):
+    '''
+    Description: converts `games` (game dicts with SAN moves, streamed, e.g. from
+    `pgn.read_games`) to the record file at `path`. Games with an illegal move are left
+    out. Returns (games written, games left out).
+    '''
+    written = skipped = 0
+    with RecordWriter(path) as writer:
+        for game in games:
+            try:
+                codes = from_san(game['moves'], pgn.starting_position(game))
+            except ValueError:
+                skipped += 1
+                continue
+            writer.add(codes, game['headers'], game['result'])
+            written += 1
+    return written, skipped
+
+
+class Records:
+    '''
+    Description: a record file, memory-mapped read only. Game `n` is found through the
+    index and decoded from its move codes alone, without reading the games before it or
+    parsing any SAN. `records[n]` is a game dict like `pgn.parse_game` gives, but with
+    'codes' (an array of move codes) instead of 'moves'.
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, index_offset = HEADER_STRUCT.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not a game record file')
+        if version != VERSION:
+            self.close()
+            raise ValueError(f'{path} has record format version {version}, expected {VERSION}')
+        self.offsets = array('Q', self.buffer[index_offset:index_offset + 8*self.size])
+        if SWAP_BYTES:
+            self.offsets.byteswap()
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.buffer.close()
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += self.size
+        if not 0 <= n < self.size:
+            raise IndexError(f'game {n} out of range ({self.size} games)')
+        offset = self.offsets[n]
+        result, tags_length, plies = GAME_STRUCT.unpack_from(self.buffer, offset)
+        offset += GAME_STRUCT.size
+        fields = self.buffer[offset:offset + tags_length].decode('utf-8').split('\0') if tags_length else []
+        offset += tags_length
+        codes = array('H', self.buffer[offset:offset + 2*plies])
+        if SWAP_BYTES:
+            codes.byteswap()
+        return {'headers': dict(zip(fields[::2], fields[1::2])), 'codes': codes, 'result': pgn.RESULTS[result]}
+
+    def __iter__(self):
+        for n in range(self.size):
+            yield self[n]
+
+    def positions(self, n):
+        '''
+        Description: lazily yields (ply, position) after every move of game `n`. The same
+        `Position` object is updated in place between yields, copy it to keep it.
+        '''
+        game = self[n]
+        position = pgn.starting_position(game)
+        for ply, code in enumerate(game['codes']):
+            position.make(code)
+            yield ply, position
+
+    def replay(self, n):
+        '''
+        Description: the position at the end of game `n`.
+        '''
+        game = self[n]
+        position = pgn.starting_position(game)
+        for code in game['codes']:
+            position.make(code)
+        return position
+
+    def game(self, n):
+        '''
+        Description: game `n` as a game dict with SAN moves, ready for `pgn.format_game`.
+        '''
+        game = self[n]
+        moves = to_san(game['codes'], pgn.starting_position(game))
+        return {'headers': game['headers'], 'moves': moves, 'result': game['result']}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py records',
+                                     description='Convert PGN to compact binary game records and read them back.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='convert a PGN collection to a record file')
+    convert.add_argument('path', help="PGN file, '-' for standard input")
+    convert.add_argument('-o', '--output', required=True, help=f'record file to write ({EXTENSION})')
+    show = commands.add_parser('show', help='print games of a record file as PGN')
+    show.add_argument('records', help='record file')
+    show.add_argument('games', nargs='*', type=int, help='numbers of the games to print, from 1 (default: all)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        written, skipped = write_games(args.output, pgn.read_games(args.path))
+        print(f'{written} games written to {args.output}, {skipped} with illegal moves left out')
+        return
+
+    with Records(args.records) as records:
+        numbers = args.games or range(1, len(records) + 1)
+        for index, number in enumerate(numbers):
+            if not 1 <= number <= len(records):
+                print(f'No game {number}: {args.records} has {len(records)} games.', file=sys.stderr)
+                sys.exit(1)
+            if index:
+                print()
+            print(pgn.format_game(records.game(number - 1)), end='')
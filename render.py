@@ -0,0 +1,131 @@
+# render.py
+# board rendering: every frame is built in one string and written at once
+import json
+import sys
+
+from array_board import FILES, PIECE_NAMES
+from fen import FEN_LETTERS, to_fen
+
+FORMATS = ['text', 'unicode', 'ansi', 'fen', 'json']
+# Formats drawn as a grid of squares, which diff mode can update square by square
+GRID_FORMATS = ['text', 'unicode', 'ansi']
+
+# Indexed by piece code like PIECE_NAMES (negative codes are black pieces)
+GLYPHS = ['·', '♙', '♖', '♘', '♗', '♕', '♔', '♚', '♛', '♝', '♞', '♜', '♟']
+# The ANSI format draws every piece with the filled glyph and tells the colors apart
+# by the foreground color, which reads better on a colored background
+SOLID_GLYPHS = [' ', '♟', '♜', '♞', '♝', '♛', '♚', '♚', '♛', '♝', '♞', '♜', '♟']
+LIGHT_SQUARE, DARK_SQUARE = 180, 137
+WHITE_PIECE, BLACK_PIECE = 231, 16
+RESET = '\x1b[0m'
+
+
+def _ansi_cell(code, square):
+    background = LIGHT_SQUARE if ((square >> 3) + square) & 1 else DARK_SQUARE
+    foreground = WHITE_PIECE if code > 0 else BLACK_PIECE
+    return f'\x1b[48;5;{background};38;5;{foreground}m {SOLID_GLYPHS[code]} {RESET}'
+
+
+# Per format: the text of a square as a function of (piece code, square index), the
+# first screen column of file a and the columns taken by a square (separator included)
+_CELLS = {
+    'text': (lambda code, square: PIECE_NAMES[code], 3, 5),
+    'unicode': (lambda code, square: GLYPHS[code], 2, 2),
+    'ansi': (_ansi_cell, 2, 3),
+}
+_FOOTERS = {
+    'text': '\n  ' + ''.join('  ' + file + '  ' for file in FILES) + '\n' + '-'*(5*8 + 4),
+    'unicode': '\n  ' + ' '.join(FILES),
+    'ansi': '\n  ' + ''.join(f' {file} ' for file in FILES),
+}
+# Lines a grid frame takes on the screen
+GRID_HEIGHTS = {'text': 10, 'unicode': 9, 'ansi': 9}
+
+
+def render_grid(squares, fmt='text'):
+    '''
+    Description: the 64 piece codes `squares` as a grid with rank 8 on top. The 'text'
+    grid is the one `print_board` shows.
+    '''
+    cell, _, _ = _CELLS[fmt]
+    separator = '' if fmt == 'ansi' else ' '
+    lines = []
+    for rank in range(7, -1, -1):
+        row = separator.join(cell(squares[square], square) for square in range(rank*8, rank*8 + 8))
+        lines.append(f'{rank + 1} {" " if fmt == "text" else ""}{row}{separator if fmt == "text" else ""}')
+    return '\n'.join(lines) + _FOOTERS[fmt]
+
+
+def render_json(position):
+    '''
+    Description: the position as one line of compact JSON: its FEN, the side to move,
+    whether it is in check and the 64 squares from a1 to h8 as FEN letters ('.' if empty).
+    '''
+    return json.dumps({'fen': to_fen(position), 'turn': 'w' if position.color else 'b',
+                       'check': position.is_check(),
+                       'squares': ''.join(FEN_LETTERS.get(code, '.') for code in position.board.squares)},
+                      separators=(',', ':'))
+
+
+def render(position, fmt='text'):
+    '''
+    Description: `position` rendered in one of FORMATS, as a single string without a
+    trailing newline.
+    '''
+    if fmt in GRID_FORMATS:
+        return render_grid(position.board.squares, fmt)
+    if fmt == 'fen':
+        return to_fen(position)
+    if fmt == 'json':
+        return render_json(position)
+    raise ValueError(f'Unknown format: {fmt} (available: {", ".join(FORMATS)})')
+
+
+class Renderer:
+    '''
+    Description: writes one frame per call to `out`, with a single write and flush.
+
+    In diff mode (grid formats on an ANSI terminal) the first frame clears the screen,
+    draws the board on top and keeps the lines below it scrolling on their own, so the
+    prompts and messages never move the board. Later frames only redraw the squares that
+    changed, from a saved and restored cursor position.
+    '''
+
+    def __init__(self, fmt='text', out=None, diff=False):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown format: {fmt} (available: {", ".join(FORMATS)})')
+        if diff and fmt not in GRID_FORMATS:
+            raise ValueError(f'Diff mode needs a grid format ({", ".join(GRID_FORMATS)})')
+        self.fmt = fmt
+        self.out = out or sys.stdout
+        self.diff = diff
+        self.previous = None
+
+    def frame(self, position):
+        squares = position.board.squares
+        if not self.diff:
+            text = render(position, self.fmt) + '\n'
+        elif self.previous is None:
+            height = GRID_HEIGHTS[self.fmt]
+            # Clear, draw, then limit scrolling to the lines below the board
+            text = f'\x1b[2J\x1b[H{render_grid(squares, self.fmt)}\x1b[{height + 1};r\x1b[{height + 1};1H'
+        else:
+            cell, first_column, width = _CELLS[self.fmt]
+            parts = ['\x1b7']
+            for square, (old, new) in enumerate(zip(self.previous, squares)):
+                if old != new:
+                    parts.append(f'\x1b[{8 - (square >> 3)};{first_column + width*(square & 7) + 1}H{cell(new, square)}')
+            parts.append('\x1b8')
+            text = ''.join(parts) if len(parts) > 2 else ''
+        self.previous = list(squares)
+        if text:
+            self.out.write(text)
+            self.out.flush()
+
+    def close(self):
+        '''
+        Description: gives the whole screen back to scrolling after diff mode.
+        '''
+        if self.diff and self.previous is not None:
+            self.out.write('\x1b[r')
+            self.out.flush()
@@ -0,0 +1,227 @@
+# server.py
+# asyncio line server hosting many independent chess.py games in one process
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import time
+
+import chess
+import render
+from fen import from_fen, to_fen
+from position import Position
+
+logger = logging.getLogger('chess.server')
+
+# Latencies kept for the percentiles, the most recent ones win
+LATENCY_SAMPLES = 100000
+
+
+def percentile(sorted_values, fraction):
+    '''
+    Description: nearest-rank percentile of an already sorted list, 0.0 if it is empty.
+    '''
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, int(round(fraction*len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class ServerStats:
+    '''
+    Description: throughput counters and a window of recent move latencies (seconds from
+    reading a move to writing its answer).
+    '''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.connections = 0
+        self.active = 0
+        self.moves = 0
+        self.illegal = 0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, latency, is_move_legal):
+        self.moves += 1
+        if not is_move_legal:
+            self.illegal += 1
+        self.latencies.append(latency)
+
+    def mark(self):
+        '''
+        Description: a baseline for `snapshot`: the time and the move count now.
+        '''
+        return time.perf_counter(), self.moves
+
+    def snapshot(self, since=None):
+        '''
+        Description: the counters as a JSON-ready dict. 'interval_moves_per_second' is the
+        throughput since the baseline `since` (from `mark`, the start by default), so every
+        reader keeps its own and reading changes nothing. Latencies are in milliseconds.
+        '''
+        now = time.perf_counter()
+        last_time, last_moves = since or (self.started, 0)
+        latencies = sorted(self.latencies)
+        return {
+            'connections': self.connections,
+            'active': self.active,
+            'moves': self.moves,
+            'illegal': self.illegal,
+            'uptime': round(now - self.started, 3),
+            'moves_per_second': round(self.moves/(now - self.started), 1),
+            'interval_moves_per_second': round((self.moves - last_moves)/(now - last_time), 1) if now > last_time else 0.0,
+            'latency_ms': {name: round(percentile(latencies, fraction)*1000, 3)
+                           for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))},
+        }
+
+
+class GameServer:
+    '''
+    Description: hosts one game per connection. Every game owns its `Position`, so
+    nothing is shared between connections except the read-only tables and the SAN cache.
+
+    The protocol is line based. A client sends one command per line and every answer
+    ends with an empty line:
+        <SAN move>   'ok <from> <to>' or 'illegal <error message>', then the board
+        board        the board
+        fen          the FEN of the position
+        status       'over <result> <reason>' once the rules end the game (checkmate,
+                     stalemate, automatic draws), else 'ongoing', followed by
+                     ' claimable <reason>' when the side to move may claim a draw
+        new [FEN]    starts a new game, from FEN if given, then the board
+        format NAME  shows the board in this connection in one of render.FORMATS from now
+                     on, or not at all after moves and 'new' with 'none'
+        stats        the server counters as one JSON line
+        quit         closes the connection
+    Boards are in `board_format` until a connection asks for another one.
+    '''
+
+    def __init__(self, board_format='text'):
+        self.stats = ServerStats()
+        self.board_format = board_format
+
+    async def handle_connection(self, reader, writer):
+        stats = self.stats
+        stats.connections += 1
+        stats.active += 1
+        position = Position()
+        board_format = self.board_format
+        # The interval of this connection's 'stats' answers starts at its previous one
+        stats_since = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                start = time.perf_counter()
+                command = line.decode('utf-8', errors='replace').strip()
+                if not command:
+                    continue
+                if command == 'quit':
+                    break
+                if command == 'board':
+                    answer = render.render(position, 'text' if board_format == 'none' else board_format)
+                elif command == 'fen':
+                    answer = to_fen(position)
+                elif command == 'status':
+                    answer = self.status(position)
+                elif command == 'stats':
+                    answer = json.dumps(stats.snapshot(stats_since))
+                    stats_since = stats.mark()
+                elif command.split()[0] == 'new':
+                    fen = command[3:].strip()
+                    try:
+                        position = from_fen(fen) if fen else Position()
+                        answer = 'ok' if board_format == 'none' else render.render(position, board_format)
+                    except ValueError as e:
+                        answer = f'error {e}'
+                elif command.split()[0] == 'format':
+                    name = command[6:].strip()
+                    if name in render.FORMATS or name == 'none':
+                        board_format = name
+                        answer = f'ok {name}'
+                    else:
+                        answer = f'error unknown format {name}'
+                else:
+                    answer = self.play_move(position, command, start, board_format)
+                writer.write((answer + '\n\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            stats.active -= 1
+            writer.close()
+
+    def play_move(self, position, move, start, board_format='text'):
+        '''
+        Description: validates `move` with `check_validity` (through the SAN cache) and
+        plays it on `position` if it is legal. Returns the answer text, followed by the
+        board unless `board_format` is 'none'.
+        '''
+        from_square, to_square, is_move_legal, error_msg = chess.resolve_move(position, move)
+        if is_move_legal:
+            position.make(chess.san_move_code(from_square, to_square, move))
+            answer = f'ok {from_square} {to_square}'
+        else:
+            answer = f'illegal {error_msg}'
+        if board_format != 'none':
+            answer += '\n' + render.render(position, board_format)
+        self.stats.record(time.perf_counter() - start, is_move_legal)
+        return answer
+
+    def status(self, position):
+        ended = chess.game_result(position)
+        if ended is not None:
+            return 'over {} {}'.format(*ended)
+        claimable = position.draw_reason()
+        return 'ongoing' if claimable is None else f'ongoing claimable {claimable}'
+
+    async def report_stats(self, interval):
+        since = self.stats.mark()
+        while True:
+            await asyncio.sleep(interval)
+            logger.info('%s', json.dumps(self.stats.snapshot(since)))
+            since = self.stats.mark()
+
+
+async def serve(host='127.0.0.1', port=8765, unix_path=None, stats_interval=10.0, board_format='text'):
+    '''
+    Description: runs a `GameServer` on TCP `host`:`port`, or on the Unix socket at
+    `unix_path` if given, logging its counters every `stats_interval` seconds.
+    '''
+    game_server = GameServer(board_format)
+    if unix_path:
+        server = await asyncio.start_unix_server(game_server.handle_connection, path=unix_path)
+    else:
+        server = await asyncio.start_server(game_server.handle_connection, host, port, backlog=4096)
+    logger.info('Serving games on %s', unix_path or ', '.join(str(socket.getsockname()) for socket in server.sockets))
+    reporter = asyncio.ensure_future(game_server.report_stats(stats_interval)) if stats_interval > 0 else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if reporter is not None:
+            reporter.cancel()
+        logger.info('%s', json.dumps(game_server.stats.snapshot()))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py serve',
+                                     description='Host many games at once over a line-based TCP or Unix socket protocol.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='TCP port to listen on (default: 8765)')
+    parser.add_argument('--unix', metavar='PATH', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--stats-interval', type=float, default=10.0, metavar='SECONDS',
+                        help='log the counters this often, 0 to disable (default: 10)')
+    parser.add_argument('--format', choices=render.FORMATS, default='text',
+                        help='how boards are shown until a connection changes it (default: text)')
+    parser.add_argument('--quiet', action='store_true',
+                        help='answer moves without the board (connections can still ask for one)')
+    args = parser.parse_args(argv)
+
+    # chess.py configures logging before calling this
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.stats_interval, 'none' if args.quiet else args.format))
+    except KeyboardInterrupt:
+        pass
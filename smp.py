@@ -0,0 +1,270 @@
+# smp.py
+# lazy SMP: several processes search the same position and share a transposition table
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+from engine import SearchResult, Searcher, SearchTimeout
+from fen import from_fen, to_fen
+
+# An entry is two 64-bit words: the key xor the data, then the data. A reader only
+# accepts an entry whose words xor back to its key, so an entry torn by two processes
+# writing it at once reads as a miss and no lock is needed.
+# Data bits: move (16), depth (8), flag (2), generation (8), score + SCORE_OFFSET (20)
+SCORE_OFFSET = 1 << 19
+# Header words: generation, stop requested by the caller, search over, unused, then the
+# node count of every worker
+GENERATION, STOP, DONE = 0, 1, 2
+HEADER_WORDS = 4
+
+
+def pack(depth, score, flag, move, generation):
+    return ((move or 0) | depth << 16 | flag << 24 | generation << 26
+            | (score + SCORE_OFFSET) << 34)
+
+
+def unpack(key, data):
+    '''
+    Description: the entry tuple of `engine.TranspositionTable`:
+    (key, depth, score, flag, move, generation).
+    '''
+    return (key, (data >> 16) & 0xFF, (data >> 34) - SCORE_OFFSET, (data >> 24) & 3,
+            (data & 0xFFFF) or None, (data >> 26) & 0xFF)
+
+
+class SharedTranspositionTable:
+    '''
+    Description: a transposition table in shared memory, with the interface of
+    `engine.TranspositionTable`, that every worker process probes and stores into. The
+    process that creates it (`name` None) owns the memory and unlinks it in `close`.
+    The generation is kept in the header, so only the owner advances it (`next_generation`)
+    and `new_search` just reads it.
+    '''
+
+    def __init__(self, size_log2=20, workers=1, name=None):
+        self.size = 1 << size_log2
+        self.mask = self.size - 1
+        self.workers = workers
+        # Entries start on an even word
+        self.offset = HEADER_WORDS + workers + (workers & 1)
+        nbytes = 8*(self.offset + 2*self.size)
+        self.owner = name is None
+        self.shared = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes if self.owner else 0)
+        self.words = self.shared.buf[:nbytes].cast('Q')
+        self.generation = self.words[GENERATION]
+
+    def __reduce__(self):
+        # Spawned workers attach to the same memory by name
+        return (SharedTranspositionTable, (self.size.bit_length() - 1, self.workers, self.shared.name))
+
+    def probe(self, key):
+        index = self.offset + 2*(key & self.mask)
+        words = self.words
+        data = words[index + 1]
+        if data and words[index] ^ data == key:
+            return unpack(key, data)
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = self.offset + 2*(key & self.mask)
+        words = self.words
+        old = words[index + 1]
+        if not old or words[index] ^ old == key or depth >= (old >> 16) & 0xFF \
+                or (old >> 26) & 0xFF != self.generation:
+            data = pack(depth, score, flag, move, self.generation)
+            words[index] = key ^ data
+            words[index + 1] = data
+
+    def new_search(self):
+        self.generation = self.words[GENERATION]
+
+    def next_generation(self):
+        self.words[GENERATION] = (self.words[GENERATION] + 1) & 0xFF
+        self.generation = self.words[GENERATION]
+
+    def clear(self):
+        self.shared.buf[8*self.offset:8*(self.offset + 2*self.size)] = bytes(16*self.size)
+        self.words[GENERATION] = self.generation = 0
+
+    def close(self):
+        self.words.release()
+        self.shared.close()
+        if self.owner:
+            self.shared.unlink()
+
+
+class WorkerDied(Exception):
+    pass
+
+
+class WorkerSearcher(Searcher):
+    '''
+    Description: the searcher of one worker. It stops when the caller or the end of the
+    search says so through the table header, publishes its node count there, and orders
+    the root moves after the first differently from the other workers, so that they
+    spread over the tree and fill the shared table for each other.
+    '''
+
+    def __init__(self, index, tt, tablebase=None):
+        # The table of its own that Searcher makes is replaced by the shared one
+        super().__init__(tt_size_log2=0, tablebase=tablebase)
+        self.tt = tt
+        self.index = index
+
+    def _check_limits(self):
+        words = self.tt.words
+        words[HEADER_WORDS + self.index] = self.nodes
+        if words[STOP] or words[DONE]:
+            raise SearchTimeout
+        super()._check_limits()
+
+    def _order_moves(self, position, moves, tt_move, ply):
+        moves = super()._order_moves(position, moves, tt_move, ply)
+        if ply == 0 and self.index and len(moves) > 2:
+            shift = self.index % (len(moves) - 1)
+            moves[1:] = moves[1 + shift:] + moves[1:1 + shift]
+        return moves
+
+
+def _worker(index, tt, connection):
+    '''
+    Description: the loop of a worker process: searches the positions it is sent and
+    answers with ('iteration', index, result) after every depth when it is the main
+    worker (index 0), then ('done', index, result).
+    '''
+    searcher = WorkerSearcher(index, tt)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        fen, repetitions, time_limit, max_depth, node_limit = request
+        position = from_fen(fen)
+        position.repetitions = repetitions
+        on_iteration = (lambda result: connection.send(('iteration', index, result))) if index == 0 else None
+        # Odd helpers start one ply deeper, so half the workers are always a depth ahead
+        result = searcher.search(position, time_limit, max_depth, node_limit, on_iteration,
+                                 start_depth=1 + (index & 1))
+        tt.words[HEADER_WORDS + index] = searcher.nodes
+        connection.send(('done', index, result))
+    connection.close()
+
+
+class ParallelSearcher:
+    '''
+    Description: lazy SMP over `workers` processes (os.cpu_count() by default) sharing a
+    `SharedTranspositionTable`. It has the interface of `engine.Searcher` that uci.py
+    uses: `search`, `stop` and `tt`. Every worker searches the whole root position; the
+    first one to finish ends the search, and the deepest result wins, the main worker's
+    on a tie. Call `close` (or use it in a `with` block) to stop the workers.
+
+    A worker process that dies (killed, out of memory...) ends the search: the others are
+    stopped and `search` raises WorkerDied, as does every later search.
+    '''
+
+    def __init__(self, workers=None, tt_size_log2=20):
+        self.workers = workers or os.cpu_count() or 1
+        self.tt = SharedTranspositionTable(tt_size_log2, self.workers)
+        self.connections = []
+        self.processes = []
+        for index in range(self.workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker, args=(index, self.tt, child), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    @property
+    def stop(self):
+        return bool(self.tt.words[STOP])
+
+    @stop.setter
+    def stop(self, value):
+        self.tt.words[STOP] = int(bool(value))
+
+    def helper_nodes(self):
+        '''
+        Description: nodes searched so far by the workers other than the main one, as they
+        last published them (every few hundred nodes).
+        '''
+        words = self.tt.words
+        return sum(words[HEADER_WORDS + index] for index in range(1, self.workers))
+
+    def search(self, position, time_limit=None, max_depth=64, node_limit=None, on_iteration=None):
+        '''
+        Description: like `engine.Searcher.search`; `node_limit` is shared out between the
+        workers, and `on_iteration` gets the main worker's results with the nodes of all.
+        '''
+        start = time.perf_counter()
+        dead = [index for index, process in enumerate(self.processes) if not process.is_alive()]
+        if dead:
+            raise WorkerDied(f'search workers {dead} are gone')
+        legal_moves = position.legal_moves()
+        if len(legal_moves) <= 1:
+            return SearchResult(legal_moves[0] if legal_moves else None, 0, 0, 0, 0.0, 0, [])
+        words = self.tt.words
+        words[DONE] = 0
+        for index in range(self.workers):
+            words[HEADER_WORDS + index] = 0
+        self.tt.next_generation()
+        request = (to_fen(position), dict(position.repetitions), time_limit, max_depth,
+                   node_limit // self.workers if node_limit is not None else None)
+        for connection in self.connections:
+            connection.send(request)
+
+        results = {}
+        dead = []
+        pending = set(range(self.workers))
+        while pending:
+            # The process sentinels wake this up when a worker dies without answering
+            ready = wait([self.connections[index] for index in pending]
+                         + [self.processes[index].sentinel for index in pending])
+            for index in sorted(pending):
+                connection = self.connections[index]
+                if connection not in ready and self.processes[index].sentinel not in ready:
+                    continue
+                try:
+                    # A worker that died may have sent something first
+                    message = connection.recv() if connection.poll() else None
+                except (EOFError, OSError):
+                    message = None
+                if message is None:
+                    pending.discard(index)
+                    dead.append(index)
+                    words[DONE] = 1
+                    continue
+                kind, _, result = message
+                if kind == 'done':
+                    pending.discard(index)
+                    results[index] = result
+                    words[DONE] = 1
+                elif on_iteration is not None:
+                    nodes = result.nodes + self.helper_nodes()
+                    on_iteration(result._replace(nodes=nodes, nps=int(nodes/result.elapsed) if result.elapsed else 0))
+        if dead:
+            raise WorkerDied(f'search workers {dead} died')
+        best = max(results.items(), key=lambda item: (item[1].depth, item[0] == 0))[1]
+        elapsed = time.perf_counter() - start
+        nodes = sum(result.nodes for result in results.values())
+        return best._replace(nodes=nodes, elapsed=elapsed, nps=int(nodes/elapsed) if elapsed else 0)
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except OSError:
+                # The worker is gone
+                pass
+        for process in self.processes:
+            process.join()
+        for connection in self.connections:
+            connection.close()
+        self.tt.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,1012 @@
+# syzygy.py
+# Syzygy endgame tablebases: WDL and DTZ probes of memory-mapped .rtbw/.rtbz files
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_right
+from math import comb
+
+from array_board import BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE
+from bitboard import KING_ATTACKS, leaves_king_in_check, squares_of
+from lru import LRUCache
+
+WDL_SUFFIX = '.rtbw'
+DTZ_SUFFIX = '.rtbz'
+WDL_MAGIC = b'\x71\xe8\x23\x5d'
+DTZ_MAGIC = b'\xd7\x66\x0c\xa5'
+# The largest published tables; probes resolve captures from one piece more
+MAX_PIECES = 7
+
+# Table names list the pieces of each side strongest first, 'KRvKN'
+NAME_PATTERN = re.compile(r'K[QRBNP]*vK[QRBNP]*')
+NAME_LETTERS = 'KQRBNP'
+NAME_PIECES = (KING, QUEEN, ROOK, BISHOP, KNIGHT, PAWN)
+# Piece numbers inside the files (8 is added for black) and the matching piece codes
+FILE_PIECES = (None, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+
+# WDL values: loss, blessed loss (lost, but drawn by the fifty-move rule), draw, cursed
+# win (won, but drawn by the fifty-move rule) and win, for the side to move
+LOSS, BLESSED_LOSS, DRAW, CURSED_WIN, WIN = -2, -1, 0, 1, 2
+# DTZ tables store one value map per WDL value, and whether each stores plies or moves
+WDL_TO_MAP = [1, 3, 0, 2, 0]
+PLY_FLAGS = [8, 0, 0, 0, 4]
+WDL_TO_DTZ = [-1, -101, 0, 101, 1]
+MASK64 = (1 << 64) - 1
+
+# Square tables of the index functions, as in the reference probing code. Pieces-only
+# tables fold every position into the a1-d1-d4 triangle, pawn tables into files a-d.
+TRIANGLE = [
+    6, 0, 1, 2, 2, 1, 0, 6,
+    0, 7, 3, 4, 4, 3, 7, 0,
+    1, 3, 8, 5, 5, 8, 3, 1,
+    2, 4, 5, 9, 9, 5, 4, 2,
+    2, 4, 5, 9, 9, 5, 4, 2,
+    1, 3, 8, 5, 5, 8, 3, 1,
+    0, 7, 3, 4, 4, 3, 7, 0,
+    6, 0, 1, 2, 2, 1, 0, 6,
+]
+
+LOWER = [
+    28,  0,  1,  2,  3,  4,  5,  6,
+     0, 29,  7,  8,  9, 10, 11, 12,
+     1,  7, 30, 13, 14, 15, 16, 17,
+     2,  8, 13, 31, 18, 19, 20, 21,
+     3,  9, 14, 18, 32, 22, 23, 24,
+     4, 10, 15, 19, 22, 33, 25, 26,
+     5, 11, 16, 20, 23, 25, 34, 27,
+     6, 12, 17, 21, 24, 26, 27, 35,
+]
+
+DIAG = [
+     0,  0,  0,  0,  0,  0,  0,  8,
+     0,  1,  0,  0,  0,  0,  9,  0,
+     0,  0,  2,  0,  0, 10,  0,  0,
+     0,  0,  0,  3, 11,  0,  0,  0,
+     0,  0,  0, 12,  4,  0,  0,  0,
+     0,  0, 13,  0,  0,  5,  0,  0,
+     0, 14,  0,  0,  0,  0,  6,  0,
+    15,  0,  0,  0,  0,  0,  0,  7,
+]
+
+FLAP = [
+    0,  0,  0,  0,  0,  0,  0, 0,
+    0,  6, 12, 18, 18, 12,  6, 0,
+    1,  7, 13, 19, 19, 13,  7, 1,
+    2,  8, 14, 20, 20, 14,  8, 2,
+    3,  9, 15, 21, 21, 15,  9, 3,
+    4, 10, 16, 22, 22, 16, 10, 4,
+    5, 11, 17, 23, 23, 17, 11, 5,
+    0,  0,  0,  0,  0,  0,  0, 0,
+]
+
+PTWIST = [
+     0,  0,  0,  0,  0,  0,  0,  0,
+    47, 35, 23, 11, 10, 22, 34, 46,
+    45, 33, 21,  9,  8, 20, 32, 44,
+    43, 31, 19,  7,  6, 18, 30, 42,
+    41, 29, 17,  5,  4, 16, 28, 40,
+    39, 27, 15,  3,  2, 14, 26, 38,
+    37, 25, 13,  1,  0, 12, 24, 36,
+     0,  0,  0,  0,  0,  0,  0,  0,
+]
+
+INVFLAP = [
+     8, 16, 24, 32, 40, 48,
+     9, 17, 25, 33, 41, 49,
+    10, 18, 26, 34, 42, 50,
+    11, 19, 27, 35, 43, 51,
+]
+
+FILE_TO_FILE = [0, 1, 2, 3, 3, 2, 1, 0]
+
+# Positions of the leading pieces: three unique pieces, or the two kings
+UNIQUE_PIECES_FACTOR = 31332
+KINGS_FACTOR = 462
+
+
+def _off_diagonal(square):
+    return (square >> 3) - (square & 7)
+
+
+def _flip_diagonal(square):
+    return ((square >> 3) | (square << 3)) & 63
+
+
+def _kings_index():
+    '''
+    Description: KINGS_INDEX[TRIANGLE[first]][second] numbers the 462 placements of two
+    kings that do not touch, the first in the a1-d1-d4 triangle and, when it is on the
+    a1-d4 diagonal, the second not above the a1-h8 diagonal. Placements with both kings
+    on the diagonal come last.
+    '''
+    table = [[-1]*64 for _ in range(10)]
+    on_diagonal = []
+    number = 0
+    for first in sorted((square for square in range(64) if (square & 7) < 4 and (square >> 3) <= (square & 7)),
+                        key=TRIANGLE.__getitem__):
+        for second in range(64):
+            if second == first or KING_ATTACKS[first] >> second & 1:
+                continue
+            if not _off_diagonal(first):
+                if _off_diagonal(second) > 0:
+                    continue
+                if not _off_diagonal(second):
+                    on_diagonal.append((TRIANGLE[first], second))
+                    continue
+            table[TRIANGLE[first]][second] = number
+            number += 1
+    for triangle, second in on_diagonal:
+        table[triangle][second] = number
+        number += 1
+    return table
+
+
+KINGS_INDEX = _kings_index()
+
+
+def _pawn_tables():
+    '''
+    Description: PAWN_INDEX[n - 1][FLAP[square]] is where the placements of n leading
+    pawns, the first on `square`, start in the index of its file, and PAWN_FACTOR[n - 1][file]
+    counts those placements.
+    '''
+    pawn_index = [[0]*24 for _ in range(5)]
+    pawn_factor = [[0]*4 for _ in range(5)]
+    for pawns in range(5):
+        for file in range(4):
+            total = 0
+            for flap in range(6*file, 6*file + 6):
+                pawn_index[pawns][flap] = total
+                total += comb(PTWIST[INVFLAP[flap]], pawns) if pawns else 1
+            pawn_factor[pawns][file] = total
+    return pawn_index, pawn_factor
+
+
+PAWN_INDEX, PAWN_FACTOR = _pawn_tables()
+
+
+def normalize_name(name, mirror=False):
+    '''
+    Description: the file name of the table holding material `name` ('KvKR' -> 'KRvK'):
+    pieces strongest first, the side with more pieces (or the stronger ones) first.
+    '''
+    white, black = name.split('v')
+    white = ''.join(sorted(white, key=NAME_LETTERS.index))
+    black = ''.join(sorted(black, key=NAME_LETTERS.index))
+    if mirror ^ ((len(white), [NAME_LETTERS.index(c) for c in black])
+                 < (len(black), [NAME_LETTERS.index(c) for c in white])):
+        return black + 'v' + white
+    return white + 'v' + black
+
+
+def material_name(board, mirror=False):
+    '''
+    Description: the material of `board` (an `ArrayBoard`) as a table name, 'KRvKN',
+    white first or black first if `mirror` is set.
+    '''
+    sides = []
+    for color in ((BLACK, WHITE) if mirror else (WHITE, BLACK)):
+        pieces = board.pieces[color]
+        sides.append(''.join(letter*pieces[piece].bit_count() for letter, piece in zip(NAME_LETTERS, NAME_PIECES)))
+    return 'v'.join(sides)
+
+
+def _file_piece_name(codes, mirror=False):
+    '''
+    Description: the table name of a list of file piece numbers.
+    '''
+    sides = ['', '']
+    for letter, piece in zip(NAME_LETTERS, NAME_PIECES):
+        number = FILE_PIECES.index(piece)
+        for color in range(2):
+            sides[color] += letter*codes.count(number | (8*color ^ 8*mirror))
+    return 'v'.join(sides)
+
+
+class MissingTable(Exception):
+    pass
+
+
+class _Pairs:
+    '''
+    Description: one compressed stream of table values. Values are grouped into symbols
+    (a symbol is a value or a pair of symbols) and the symbols are Huffman-coded into
+    blocks of 2**block_bits bytes. `constant` is set instead when the stream holds a
+    single value.
+    '''
+    __slots__ = ('constant', 'block_bits', 'index_bits', 'min_length', 'base', 'offsets',
+                 'lengths', 'left', 'right', 'values', 'index_table', 'size_table', 'data', 'sizes')
+
+    def __init__(self):
+        self.constant = None
+
+
+def _read_pairs(buffer, pointer, size, dtz):
+    '''
+    Description: reads the description of a value stream of `size` positions starting at
+    `pointer`. Returns (pairs, flags, pointer past it); the offsets of its index table,
+    size table and data are filled in by the caller once all descriptions are read.
+    '''
+    pairs = _Pairs()
+    flags = buffer[pointer]
+    if flags & 0x80:
+        pairs.constant = 0 if dtz else buffer[pointer + 1]
+        pairs.sizes = (0, 0, 0)
+        return pairs, flags, pointer + 2
+
+    pairs.block_bits = buffer[pointer + 1]
+    pairs.index_bits = buffer[pointer + 2]
+    real_blocks = struct.unpack_from('<I', buffer, pointer + 4)[0]
+    blocks = real_blocks + buffer[pointer + 3]
+    max_length = buffer[pointer + 8]
+    pairs.min_length = min_length = buffer[pointer + 9]
+    lengths_count = max_length - min_length + 1
+    pairs.offsets = struct.unpack_from(f'<{lengths_count}H', buffer, pointer + 10)
+    symbol_count = struct.unpack_from('<H', buffer, pointer + 10 + 2*lengths_count)[0]
+    patterns = pointer + 12 + 2*lengths_count
+
+    # Each symbol is 3 bytes, two 12-bit fields: a value with 0xFFF in the second field,
+    # otherwise the pair of symbols it stands for
+    left, right, values = [0]*symbol_count, [0]*symbol_count, [0]*symbol_count
+    for symbol in range(symbol_count):
+        b0, b1, b2 = buffer[patterns + 3*symbol:patterns + 3*symbol + 3]
+        left[symbol] = (b1 & 0xF) << 8 | b0
+        right[symbol] = b2 << 4 | b1 >> 4
+        values[symbol] = left[symbol] if dtz else b0
+    # lengths[symbol] is the number of values it stands for, minus one
+    lengths = [-1]*symbol_count
+    for symbol in range(symbol_count):
+        stack = [symbol]
+        while stack:
+            top = stack[-1]
+            if lengths[top] >= 0:
+                stack.pop()
+            elif right[top] == 0xFFF:
+                lengths[top] = 0
+                stack.pop()
+            elif lengths[left[top]] < 0:
+                stack.append(left[top])
+            elif lengths[right[top]] < 0:
+                stack.append(right[top])
+            else:
+                lengths[top] = lengths[left[top]] + lengths[right[top]] + 1
+                stack.pop()
+    pairs.left, pairs.right, pairs.values, pairs.lengths = left, right, values, lengths
+
+    # Canonical code: base[i] is the smallest code of length min_length + i, left-aligned
+    base = [0]*lengths_count
+    for i in range(lengths_count - 2, -1, -1):
+        base[i] = (base[i + 1] + pairs.offsets[i] - pairs.offsets[i + 1]) // 2
+    pairs.base = [value << (64 - min_length - i) for i, value in enumerate(base)]
+
+    indices = (size + (1 << pairs.index_bits) - 1) >> pairs.index_bits
+    pairs.sizes = (6*indices, 2*blocks, (1 << pairs.block_bits)*real_blocks)
+    return pairs, flags, patterns + 3*symbol_count + (symbol_count & 1)
+
+
+def _place_streams(streams, pointer):
+    '''
+    Description: lays out the index tables, then the size tables, then the data (each
+    aligned to 64 bytes) of `streams` from `pointer`.
+    '''
+    for pairs in streams:
+        pairs.index_table = pointer
+        pointer += pairs.sizes[0]
+    for pairs in streams:
+        pairs.size_table = pointer
+        pointer += pairs.sizes[1]
+    for pairs in streams:
+        pointer = (pointer + 0x3F) & ~0x3F
+        pairs.data = pointer
+        pointer += pairs.sizes[2]
+    return pointer
+
+
+class _Table:
+    '''
+    Description: one table file, memory-mapped the first time it is probed.
+    '''
+    magic = None
+
+    def __init__(self, path):
+        self.path = path
+        name = os.path.splitext(os.path.basename(path))[0]
+        self.key = normalize_name(name)
+        self.mirrored_key = normalize_name(name, mirror=True)
+        self.symmetric = self.key == self.mirrored_key
+        self.count = len(name) - 1
+        self.has_pawns = 'P' in name
+        self.buffer = None
+        strong, weak = name.split('v')
+        if self.has_pawns:
+            # The leading pawns are those of the side with fewer pawns, if it has any
+            self.pawns = [weak.count('P'), strong.count('P')]
+            if self.pawns[1] and (not self.pawns[0] or self.pawns[1] < self.pawns[0]):
+                self.pawns.reverse()
+        else:
+            unique = sum(side.count(letter) == 1 for side in (strong, weak) for letter in NAME_LETTERS)
+            if unique < 2:
+                raise ValueError(f'{path}: tables without two unique pieces are not supported')
+            # Three unique pieces lead the index, or else the two kings
+            self.leading = 3 if unique >= 3 else 2
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(buffer) % 64 != 16 or buffer[:4] != self.magic:
+            buffer.close()
+            raise ValueError(f'{self.path} is not a Syzygy table')
+        self.buffer = buffer
+        self._setup()
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+
+    def _pieces(self, pointer, count_bytes):
+        '''
+        Description: (order, order2, pieces) for both sides stored at `pointer`: the
+        low nibbles describe the white-to-move side, the high nibbles the other one.
+        '''
+        buffer = self.buffer
+        sides = []
+        for shift in (0, 4):
+            order = (buffer[pointer] >> shift) & 0xF
+            order2 = (buffer[pointer + 1] >> shift) & 0xF if count_bytes == 2 else 0xF
+            pieces = [(buffer[pointer + count_bytes + i] >> shift) & 0xF for i in range(self.count)]
+            sides.append((order, order2, pieces))
+        return sides
+
+    def _norm_piece(self, pieces):
+        norm = [0]*self.count
+        norm[0] = self.leading
+        i = norm[0]
+        while i < self.count:
+            j = i
+            while j < self.count and pieces[j] == pieces[i]:
+                norm[i] += 1
+                j += 1
+            i += norm[i]
+        return norm
+
+    def _norm_pawn(self, pieces):
+        norm = [0]*self.count
+        norm[0] = self.pawns[0]
+        if self.pawns[1]:
+            norm[self.pawns[0]] = self.pawns[1]
+        i = self.pawns[0] + self.pawns[1]
+        while i < self.count:
+            j = i
+            while j < self.count and pieces[j] == pieces[i]:
+                norm[i] += 1
+                j += 1
+            i += norm[i]
+        return norm
+
+    def _factors_piece(self, order, norm):
+        '''
+        Description: the multiplier of each group of pieces in the index, and the index
+        size. Group `order` is the leading one.
+        '''
+        factor = [0]*self.count
+        n = 64 - norm[0]
+        f = 1
+        i = norm[0]
+        k = 0
+        while i < self.count or k == order:
+            if k == order:
+                factor[0] = f
+                f *= UNIQUE_PIECES_FACTOR if self.leading == 3 else KINGS_FACTOR
+            else:
+                factor[i] = f
+                f *= comb(n, norm[i])
+                n -= norm[i]
+                i += norm[i]
+            k += 1
+        return factor, f
+
+    def _factors_pawn(self, order, order2, norm, file):
+        factor = [0]*self.count
+        i = norm[0]
+        if order2 < 0xF:
+            i += norm[i]
+        n = 64 - i
+        f = 1
+        k = 0
+        while i < self.count or k in (order, order2):
+            if k == order:
+                factor[0] = f
+                f *= PAWN_FACTOR[norm[0] - 1][file]
+            elif k == order2:
+                factor[norm[0]] = f
+                f *= comb(48 - norm[0], norm[norm[0]])
+            else:
+                factor[i] = f
+                f *= comb(n, norm[i])
+                n -= norm[i]
+                i += norm[i]
+            k += 1
+        return factor, f
+
+    def _sides(self, name, color):
+        '''
+        Description: how a position of material `name` maps onto the table: (color flip,
+        square flip, stored side). Positions whose material is mirrored from the file
+        name swap the colors, and for pawn tables flip the ranks, so the pawns move the
+        stored way.
+        '''
+        if self.symmetric:
+            if color == WHITE:
+                return 0, 0, 0
+            return 8, 0x38, 0
+        if name != self.key:
+            return 8, 0x38, int(color == WHITE)
+        return 0, 0, int(color != WHITE)
+
+    def _squares(self, board, pieces, color_flip, square_flip, squares, end=None):
+        '''
+        Description: appends the squares of `pieces` (file piece numbers, identical ones
+        next to each other) to `squares`, from the first piece not placed yet up to `end`.
+        '''
+        i = len(squares)
+        while i < (self.count if end is None else end):
+            number = pieces[i] ^ color_flip
+            mask = board.pieces[WHITE if number < 8 else BLACK][FILE_PIECES[number & 7]]
+            for square in squares_of(mask):
+                squares.append(square ^ square_flip)
+                i += 1
+        return squares
+
+    def _pawn_file(self, squares):
+        for i in range(1, self.pawns[0]):
+            if FLAP[squares[0]] > FLAP[squares[i]]:
+                squares[0], squares[i] = squares[i], squares[0]
+        return FILE_TO_FILE[squares[0] & 7]
+
+    def _encode_piece(self, norm, squares, factor):
+        n = self.count
+        if squares[0] & 4:
+            squares = [square ^ 7 for square in squares]
+        if squares[0] & 0x20:
+            squares = [square ^ 0x38 for square in squares]
+        for i in range(n):
+            if _off_diagonal(squares[i]):
+                break
+        if i < self.leading and _off_diagonal(squares[i]) > 0:
+            squares = [_flip_diagonal(square) for square in squares]
+
+        if self.leading == 3:
+            i = int(squares[1] > squares[0])
+            j = int(squares[2] > squares[0]) + int(squares[2] > squares[1])
+            if _off_diagonal(squares[0]):
+                index = TRIANGLE[squares[0]]*63*62 + (squares[1] - i)*62 + (squares[2] - j)
+            elif _off_diagonal(squares[1]):
+                index = 6*63*62 + DIAG[squares[0]]*28*62 + LOWER[squares[1]]*62 + squares[2] - j
+            elif _off_diagonal(squares[2]):
+                index = 6*63*62 + 4*28*62 + DIAG[squares[0]]*7*28 + (DIAG[squares[1]] - i)*28 + LOWER[squares[2]]
+            else:
+                index = (6*63*62 + 4*28*62 + 4*7*28 + DIAG[squares[0]]*7*6 + (DIAG[squares[1]] - i)*6
+                         + (DIAG[squares[2]] - j))
+        else:
+            index = KINGS_INDEX[TRIANGLE[squares[0]]][squares[1]]
+        index *= factor[0]
+        return index + self._encode_groups(norm, squares, factor, self.leading)
+
+    def _encode_pawn(self, norm, squares, factor):
+        n = self.count
+        if squares[0] & 4:
+            squares = [square ^ 7 for square in squares]
+        leading = self.pawns[0]
+        squares[1:leading] = sorted(squares[1:leading], key=PTWIST.__getitem__, reverse=True)
+        t = leading - 1
+        index = PAWN_INDEX[t][FLAP[squares[0]]]
+        for i in range(t, 0, -1):
+            index += comb(PTWIST[squares[i]], t - i + 1)
+        index *= factor[0]
+
+        # The other side's pawns, on the 48 squares of ranks 2-7
+        i = leading
+        end = i + self.pawns[1]
+        if end > i:
+            squares[i:end] = sorted(squares[i:end])
+            total = 0
+            for m in range(i, end):
+                square = squares[m]
+                below = sum(square > squares[k] for k in range(i))
+                total += comb(square - below - 8, m - i + 1)
+            index += total*factor[i]
+            i = end
+        return index + self._encode_groups(norm, squares, factor, i)
+
+    def _encode_groups(self, norm, squares, factor, i):
+        '''
+        Description: the index part of the groups of identical pieces from `i` on, each
+        numbered among the squares the earlier pieces leave free.
+        '''
+        index = 0
+        while i < self.count:
+            t = norm[i]
+            squares[i:i + t] = sorted(squares[i:i + t])
+            total = 0
+            for m in range(i, i + t):
+                square = squares[m]
+                below = sum(square > squares[k] for k in range(i))
+                total += comb(square - below, m - i + 1)
+            index += total*factor[i]
+            i += t
+        return index
+
+    def _value(self, pairs, index, cache):
+        '''
+        Description: value number `index` of a stream. The symbols of a block are decoded
+        once and kept in `cache`, so the next probes in the block only walk down the pair
+        tree of one symbol.
+        '''
+        if pairs.constant is not None:
+            return pairs.constant
+        buffer = self.buffer
+        main = index >> pairs.index_bits
+        literal = (index & ((1 << pairs.index_bits) - 1)) - (1 << (pairs.index_bits - 1))
+        block, offset = struct.unpack_from('<IH', buffer, pairs.index_table + 6*main)
+        literal += offset
+        while literal < 0:
+            block -= 1
+            literal += struct.unpack_from('<H', buffer, pairs.size_table + 2*block)[0] + 1
+        while True:
+            size = struct.unpack_from('<H', buffer, pairs.size_table + 2*block)[0]
+            if literal <= size:
+                break
+            literal -= size + 1
+            block += 1
+
+        cache_key = (self.path, pairs.index_table, block)
+        decoded = cache.get(cache_key)
+        if decoded is None:
+            decoded = self._decode_block(pairs, block, size + 1)
+            cache.put(cache_key, decoded)
+        starts, symbols = decoded
+        position = bisect_right(starts, literal) - 1
+        symbol = symbols[position]
+        literal -= starts[position]
+        lengths, left = pairs.lengths, pairs.left
+        while lengths[symbol]:
+            first = left[symbol]
+            if literal <= lengths[first]:
+                symbol = first
+            else:
+                literal -= lengths[first] + 1
+                symbol = pairs.right[symbol]
+        return pairs.values[symbol]
+
+    def _decode_block(self, pairs, block, count):
+        '''
+        Description: the symbols of a block holding `count` values, as (starts, symbols):
+        symbol k covers values starts[k] onwards.
+        '''
+        buffer = self.buffer
+        pointer = pairs.data + (block << pairs.block_bits)
+        code = struct.unpack_from('>Q', buffer, pointer)[0]
+        pointer += 8
+        # Bits of `code` used up since it was last refilled
+        used = 0
+        min_length, base, offsets, lengths = pairs.min_length, pairs.base, pairs.offsets, pairs.lengths
+        starts, symbols = array('L'), array('H')
+        start = 0
+        while True:
+            length = min_length
+            while code < base[length - min_length]:
+                length += 1
+            symbol = offsets[length - min_length] + ((code - base[length - min_length]) >> (64 - length))
+            starts.append(start)
+            symbols.append(symbol)
+            start += lengths[symbol] + 1
+            if start >= count:
+                return starts, symbols
+            code = (code << length) & MASK64
+            used += length
+            if used >= 32:
+                used -= 32
+                code |= struct.unpack_from('>I', buffer, pointer)[0] << used
+                pointer += 4
+
+
+class _WdlTable(_Table):
+    magic = WDL_MAGIC
+
+    def _setup(self):
+        buffer = self.buffer
+        split = buffer[4] & 1
+        pointer = 5
+        if not self.has_pawns:
+            (order0, _, pieces0), (order1, _, pieces1) = self._pieces(pointer, 1)
+            self.pieces = [pieces0, pieces1]
+            self.norm = [self._norm_piece(pieces) for pieces in self.pieces]
+            (factor0, size0), (factor1, size1) = [self._factors_piece(order, norm)
+                                                  for order, norm in zip((order0, order1), self.norm)]
+            self.factor = [factor0, factor1]
+            pointer += self.count + 1
+            pointer += pointer & 1
+            self.streams = []
+            for size in (size0, size1)[:1 + split]:
+                pairs, _, pointer = _read_pairs(buffer, pointer, size, False)
+                self.streams.append(pairs)
+            _place_streams(self.streams, pointer)
+            # Some tables store the sides the other way round from their name
+            self.key = _file_piece_name(pieces0)
+            self.mirrored_key = _file_piece_name(pieces0, mirror=True)
+            return
+
+        count_bytes = 1 + (self.pawns[1] > 0)
+        self.files = []
+        for file in range(4):
+            sides = self._pieces(pointer, count_bytes)
+            pieces = [side[2] for side in sides]
+            norm = [self._norm_pawn(side_pieces) for side_pieces in pieces]
+            factors = [self._factors_pawn(order, order2, side_norm, file)
+                       for (order, order2, _), side_norm in zip(sides, norm)]
+            self.files.append({'pieces': pieces, 'norm': norm, 'factor': [f for f, _ in factors],
+                               'sizes': [size for _, size in factors], 'streams': []})
+            pointer += self.count + count_bytes
+        pointer += pointer & 1
+        file_count = 4 if buffer[4] & 2 else 1
+        for data in self.files[:file_count]:
+            for size in data['sizes'][:1 + split]:
+                pairs, _, pointer = _read_pairs(buffer, pointer, size, False)
+                data['streams'].append(pairs)
+        # Index tables, size tables and data are laid out file by file
+        streams = [pairs for data in self.files[:file_count] for pairs in data['streams']]
+        _place_streams(streams, pointer)
+
+    def probe(self, board, name, color, cache):
+        '''
+        Description: the stored WDL value of the position, captures not considered.
+        '''
+        if self.buffer is None:
+            self._open()
+        color_flip, square_flip, side = self._sides(name, color)
+        if not self.has_pawns:
+            squares = self._squares(board, self.pieces[side], color_flip, 0, [])
+            index = self._encode_piece(self.norm[side], squares, self.factor[side])
+            return self._value(self.streams[side], index, cache) - 2
+        squares = self._squares(board, self.files[0]['pieces'][0], color_flip, square_flip, [], self.pawns[0])
+        data = self.files[self._pawn_file(squares)]
+        squares = self._squares(board, data['pieces'][side], color_flip, square_flip, squares)
+        index = self._encode_pawn(data['norm'][side], squares, data['factor'][side])
+        return self._value(data['streams'][side], index, cache) - 2
+
+
+class _DtzTable(_Table):
+    magic = DTZ_MAGIC
+
+    def _setup(self):
+        buffer = self.buffer
+        pointer = 5
+        if not self.has_pawns:
+            (order, _, pieces), _ = self._pieces(pointer, 1)
+            self.pieces = pieces
+            self.norm = self._norm_piece(pieces)
+            self.factor, size = self._factors_piece(order, self.norm)
+            pointer += self.count + 1
+            pointer += pointer & 1
+            pairs, flags, pointer = _read_pairs(buffer, pointer, size, True)
+            self.files = [{'pieces': pieces, 'norm': self.norm, 'factor': self.factor, 'stream': pairs, 'flags': flags}]
+            pointer = self._read_maps(self.files, pointer, False)
+            _place_streams([pairs], pointer)
+            self.key = _file_piece_name(pieces)
+            self.mirrored_key = _file_piece_name(pieces, mirror=True)
+            return
+
+        count_bytes = 1 + (self.pawns[1] > 0)
+        self.files = []
+        for file in range(4):
+            order, order2, pieces = self._pieces(pointer, count_bytes)[0]
+            norm = self._norm_pawn(pieces)
+            factor, size = self._factors_pawn(order, order2, norm, file)
+            self.files.append({'pieces': pieces, 'norm': norm, 'factor': factor, 'size': size})
+            pointer += self.count + count_bytes
+        pointer += pointer & 1
+        files = self.files[:4 if buffer[4] & 2 else 1]
+        for data in files:
+            data['stream'], data['flags'], pointer = _read_pairs(buffer, pointer, data['size'], True)
+        pointer = self._read_maps(files, pointer, True)
+        _place_streams([data['stream'] for data in files], pointer)
+
+    def _read_maps(self, files, pointer, pawns):
+        '''
+        Description: finds the value maps of `files`: with flag 2 the stored values are
+        indices into one map per WDL value, of bytes or (flag 16) of 16-bit values.
+        '''
+        self.maps = pointer
+        for data in files:
+            data['map'] = None
+            if not data['flags'] & 2:
+                continue
+            starts = []
+            if data['flags'] & 16:
+                if pawns:
+                    pointer += pointer & 1
+                for _ in range(4):
+                    starts.append((pointer + 2 - self.maps)//2)
+                    pointer += 2 + 2*struct.unpack_from('<H', self.buffer, pointer)[0]
+            else:
+                for _ in range(4):
+                    starts.append(pointer + 1 - self.maps)
+                    pointer += 1 + self.buffer[pointer]
+            data['map'] = starts
+        return pointer + (pointer & 1)
+
+    def probe(self, board, name, color, wdl, cache):
+        '''
+        Description: the stored distance of the position, as (plies, True), or (0, False)
+        if the table does not store the side to move.
+        '''
+        if self.buffer is None:
+            self._open()
+        color_flip, square_flip, side = self._sides(name, color)
+        if not self.has_pawns:
+            data = self.files[0]
+            if (data['flags'] & 1) != side and not self.symmetric:
+                return 0, False
+            squares = self._squares(board, data['pieces'], color_flip, 0, [])
+            index = self._encode_piece(data['norm'], squares, data['factor'])
+        else:
+            squares = self._squares(board, self.files[0]['pieces'], color_flip, square_flip, [], self.pawns[0])
+            data = self.files[self._pawn_file(squares)]
+            if (data['flags'] & 1) != side:
+                return 0, False
+            squares = self._squares(board, data['pieces'], color_flip, square_flip, squares)
+            index = self._encode_pawn(data['norm'], squares, data['factor'])
+        value = self._value(data['stream'], index, cache)
+        if data['map'] is not None:
+            start = data['map'][WDL_TO_MAP[wdl + 2]]
+            if data['flags'] & 16:
+                value = struct.unpack_from('<H', self.buffer, self.maps + 2*(start + value))[0]
+            else:
+                value = self.buffer[self.maps + start + value]
+        # Values are stored in moves unless the table flags them as exact plies
+        if not data['flags'] & PLY_FLAGS[wdl + 2] or wdl & 1:
+            value *= 2
+        return value, True
+
+
+class Tablebase:
+    '''
+    Description: probes the Syzygy tables (KQvKR.rtbw, KQvKR.rtbz, ...) found in
+    `directory`. Table files are memory-mapped the first time a probe needs them and the
+    decoded symbols of their blocks are kept in an LRU cache of `cache_blocks` blocks,
+    so repeated probes in the same endgame skip the Huffman decoding.
+
+    Probes take a `Position` without castling rights and return None when a table they
+    need is missing. Captures are searched through, so a probe needs the tables of
+    every material the position can capture down to. The position is left unchanged.
+    '''
+
+    def __init__(self, directory, cache_blocks=256):
+        self.cache = LRUCache(maxsize=cache_blocks)
+        self.wdl = {}
+        self.dtz = {}
+        self.max_pieces = 0
+        if not os.path.isdir(directory):
+            return
+        for filename in sorted(os.listdir(directory)):
+            name, suffix = os.path.splitext(filename)
+            if suffix not in (WDL_SUFFIX, DTZ_SUFFIX) or not NAME_PATTERN.fullmatch(name) \
+                    or normalize_name(name) != name or len(name) - 1 > MAX_PIECES:
+                continue
+            tables = self.wdl if suffix == WDL_SUFFIX else self.dtz
+            table = (_WdlTable if suffix == WDL_SUFFIX else _DtzTable)(os.path.join(directory, filename))
+            tables[table.key] = tables[table.mirrored_key] = table
+            if suffix == WDL_SUFFIX:
+                self.max_pieces = max(self.max_pieces, table.count)
+
+    def close(self):
+        for table in list(self.wdl.values()) + list(self.dtz.values()):
+            table.close()
+        self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def probe_wdl(self, position):
+        '''
+        Description: WIN, CURSED_WIN, DRAW, BLESSED_LOSS or LOSS for the side to move,
+        assuming the fifty-move counter was just reset, or None.
+        '''
+        if not self._covers(position):
+            return None
+        try:
+            return self._probe_wdl(position)
+        except MissingTable:
+            return None
+
+    def probe_dtz(self, position):
+        '''
+        Description: the distance to zeroing in plies, signed like the WDL value: how many
+        plies until the winning side can play a capture, a pawn move or mate (positive),
+        or the losing side has to (negative). 0 for draws. None if a table is missing.
+        Values beyond 100 plies are wins or losses that the fifty-move rule draws. Like
+        the tables, the result may be one ply too high.
+        '''
+        if not self._covers(position):
+            return None
+        try:
+            return self._probe_dtz(position)
+        except MissingTable:
+            return None
+
+    def _covers(self, position):
+        occupied = position.board.occupied
+        return not position.castling_rights and (occupied[0] | occupied[1]).bit_count() <= self.max_pieces
+
+    def _probe_table(self, position):
+        board = position.board
+        if board.occupied[0] | board.occupied[1] == board.pieces[0][KING] | board.pieces[1][KING]:
+            return DRAW
+        name = material_name(board)
+        table = self.wdl.get(name)
+        if table is None:
+            raise MissingTable(name)
+        return table.probe(board, name, position.color, self.cache)
+
+    def _probe_ab(self, position, alpha, beta):
+        '''
+        Description: (value, how): the WDL value of the position with the captures searched
+        through; `how` is 2 if a capture gives the value, 1 otherwise.
+        '''
+        if (position.board.occupied[0] | position.board.occupied[1]).bit_count() > MAX_PIECES + 1:
+            raise MissingTable('too many pieces')
+        board = position.board
+        squares = board.squares
+        # Only the captures are checked for legality, as in the quiescence search
+        for move in position.pseudo_legal_moves():
+            if not squares[(move >> 6) & 63] or leaves_king_in_check(board, move):
+                continue
+            position.make(move)
+            try:
+                value = -self._probe_ab(position, -beta, -alpha)[0]
+            finally:
+                position.unmake()
+            if value > alpha:
+                if value >= beta:
+                    return value, 2
+                alpha = value
+        value = self._probe_table(position)
+        if alpha >= value:
+            return alpha, 1 + (alpha > 0)
+        return value, 1
+
+    def _en_passant_values(self, position):
+        '''
+        Description: the best WDL value among the legal en passant captures (-3 if there
+        are none), and whether the side to move has other moves.
+        '''
+        best = -3
+        other_moves = False
+        if position.ep_square is None:
+            return best, True
+        squares = position.board.squares
+        for move in position.legal_moves():
+            to_square = (move >> 6) & 63
+            if to_square != position.ep_square or abs(squares[move & 63]) != PAWN:
+                other_moves = True
+                continue
+            position.make(move)
+            try:
+                value = -self._probe_ab(position, -2, 2)[0]
+            finally:
+                position.unmake()
+            best = max(best, value)
+        return best, other_moves
+
+    def _probe_wdl(self, position):
+        value = self._probe_ab(position, -2, 2)[0]
+        if position.ep_square is None:
+            return value
+        en_passant, other_moves = self._en_passant_values(position)
+        if en_passant > -3:
+            if en_passant >= value:
+                value = en_passant
+            elif value == 0 and not other_moves:
+                # The losing en passant capture is forced
+                value = en_passant
+        return value
+
+    def _probe_dtz_table(self, position, wdl):
+        board = position.board
+        name = material_name(board)
+        table = self.dtz.get(name)
+        if table is None:
+            raise MissingTable(name)
+        return table.probe(board, name, position.color, wdl, self.cache)
+
+    def _probe_dtz_no_ep(self, position):
+        wdl, how = self._probe_ab(position, -2, 2)
+        if wdl == 0:
+            return 0
+        # A capture wins or loses right away
+        before_zeroing = (1 if wdl > 0 else -1)*(1 if abs(wdl) == 2 else 101)
+        if how == 2:
+            return before_zeroing
+
+        squares = position.board.squares
+        if wdl > 0:
+            # So does a pawn push that keeps the result
+            for move in position.legal_moves():
+                from_square, to_square = move & 63, (move >> 6) & 63
+                if abs(squares[from_square]) != PAWN or (from_square ^ to_square) & 7:
+                    continue
+                position.make(move)
+                try:
+                    value = -self._probe_wdl(position)
+                finally:
+                    position.unmake()
+                if value == wdl:
+                    return before_zeroing
+
+        dtz, found = self._probe_dtz_table(position, wdl)
+        if found:
+            return before_zeroing + (dtz if wdl > 0 else -dtz)
+
+        # The table stores the other side to move: search one ply
+        if wdl > 0:
+            best = 0xFFFF
+            for move in position.legal_moves():
+                if abs(squares[move & 63]) == PAWN or squares[(move >> 6) & 63]:
+                    continue
+                position.make(move)
+                try:
+                    value = -self._probe_dtz(position)
+                    if value == 1 and position.is_check() and not position.legal_moves():
+                        best = 1
+                    elif value > 0 and value + 1 < best:
+                        best = value + 1
+                finally:
+                    position.unmake()
+            return best
+        best = -1
+        for move in position.legal_moves():
+            position.make(move)
+            try:
+                if position.halfmove_clock == 0:
+                    if wdl == -2:
+                        value = -1
+                    else:
+                        value = self._probe_ab(position, 1, 2)[0]
+                        value = 0 if value == 2 else -101
+                else:
+                    value = -self._probe_dtz(position) - 1
+            finally:
+                position.unmake()
+            best = min(best, value)
+        return best
+
+    def _probe_dtz(self, position):
+        value = self._probe_dtz_no_ep(position)
+        if position.ep_square is None:
+            return value
+        en_passant, other_moves = self._en_passant_values(position)
+        if en_passant > -3:
+            en_passant = WDL_TO_DTZ[en_passant + 2]
+            if value < -100:
+                if en_passant >= 0:
+                    value = en_passant
+            elif value < 0:
+                if en_passant >= 0 or en_passant < -100:
+                    value = en_passant
+            elif value > 100:
+                if en_passant > 0:
+                    value = en_passant
+            elif value > 0:
+                if en_passant == 1:
+                    value = en_passant
+            elif en_passant >= 0:
+                value = en_passant
+            elif not other_moves:
+                value = en_passant
+        return value
@@ -0,0 +1,423 @@
+# tablebase.py
+# small endgame tablebases (KQK, KRK, KPK): retrograde generation, a bit-packed on-disk format and probing,
+# with Syzygy tables (see syzygy.py) for the endgames they do not cover
+import argparse
+import logging
+import mmap
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import namedtuple
+from pathlib import Path
+
+from array_board import BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE, as_array_board
+from bitboard import KING_ATTACKS, piece_attacks
+from lru import LRUCache
+from position import Position
+from syzygy import Tablebase as SyzygyTablebase
+
+logger = logging.getLogger('chess.tablebase')
+
+# Tables by name, with the piece the strong side has next to its king
+TABLES = {'KQK': QUEEN, 'KRK': ROOK, 'KPK': PAWN}
+# Tables whose values KPK needs for its promotions
+PROMOTION_TABLES = {QUEEN: 'KQK', ROOK: 'KRK'}
+EXTENSION = '.cptb'
+
+# A table file is a header, the offsets of its blocks (one more than there are blocks,
+# so block i spans offsets[i]..offsets[i + 1]) and the zlib-compressed blocks. Each block
+# bit-packs BLOCK_SIZE values of `bits` bits, least significant bits first.
+MAGIC = b'CPTB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBxxIII')
+BLOCK_SIZE = 4096
+
+# Positions are indexed by side to move, strong king, weak king and strong piece squares,
+# with the strong side as white (probes of black-strong positions flip the board).
+TABLE_SIZE = 2*64*64*64
+
+WIN, DRAW, LOSS = 1, 0, -1
+ProbeResult = namedtuple('ProbeResult', ['wdl', 'dtm', 'dtz'], defaults=(None,))
+ProbeResult.__doc__ = '''
+    Description: `wdl` is WIN, DRAW or LOSS for the side to move, `dtm` the number of
+    plies to mate with best play (0 for draws and for a side that is already mated).
+    Syzygy tables give no distance to mate: `dtm` is None and `dtz` is their signed
+    distance to zeroing (see `syzygy.Tablebase.probe_dtz`), or None without a DTZ
+    table. Wins and losses the fifty-move rule turns into draws are DRAW, with a `dtz`
+    beyond 100 plies.
+    '''
+
+
+def table_index(color, strong_king, weak_king, piece):
+    return color << 18 | strong_king << 12 | weak_king << 6 | piece
+
+
+def _pawn_pushes(piece_square, occupied):
+    '''
+    Description: squares a white pawn on `piece_square` can push to.
+    '''
+    pushes = []
+    if not occupied >> (piece_square + 8) & 1:
+        pushes.append(piece_square + 8)
+        if piece_square < 16 and not occupied >> (piece_square + 16) & 1:
+            pushes.append(piece_square + 16)
+    return pushes
+
+
+def generate(name, promotion_tables=None, log=None):
+    '''
+    Description: computes the table `name` ('KQK', 'KRK' or 'KPK') by retrograde analysis
+    and returns its values, one per `table_index`: 0 for draws and impossible positions,
+    otherwise 1 + the number of plies to mate (odd plies: the side to move mates, even
+    plies: it gets mated). KPK needs the values of KQK and KRK in `promotion_tables`.
+
+    Every position first counts its legal moves. Mates are resolved at ply 0; a position
+    resolved at ply d makes each position that can move into it a win at d + 1 (if it
+    is lost) or takes one move off its count (if it is won), and a position whose moves
+    all lead to wins for the opponent is lost at d + 1. Events are handled ply by ply,
+    so the first win found is the fastest mate and the last move counted off is the
+    longest defence.
+    '''
+    piece = TABLES[name]
+    valid = bytearray(TABLE_SIZE)
+    remaining = array('B', bytes(TABLE_SIZE))
+    resolved = bytearray(TABLE_SIZE)
+    values = array('B', bytes(TABLE_SIZE))
+    # events[d] lists (index, is_win) pairs: is_win resolves a win at ply d, otherwise one
+    # move of the position leads to a won position for the opponent
+    events = [[]]
+
+    def add_event(ply, index, is_win):
+        while len(events) <= ply:
+            events.append([])
+        events[ply].append((index, is_win))
+
+    start = time.perf_counter()
+    for strong_king in range(64):
+        for weak_king in range(64):
+            if strong_king == weak_king or KING_ATTACKS[strong_king] >> weak_king & 1:
+                continue
+            for square in range(64):
+                if square in (strong_king, weak_king) or piece == PAWN and not 8 <= square < 56:
+                    continue
+                kings = 1 << strong_king | 1 << weak_king
+                occupied = kings | 1 << square
+                attacks = piece_attacks(piece, square, WHITE, occupied)
+
+                # Weak side to move: its king may be in check
+                index = table_index(BLACK, strong_king, weak_king, square)
+                valid[index] = 1
+                # The king does not block the attacks on the squares it moves along
+                covered = KING_ATTACKS[strong_king] | piece_attacks(piece, square, WHITE, occupied & ~(1 << weak_king))
+                targets = KING_ATTACKS[weak_king] & ~covered & ~(1 << strong_king)
+                remaining[index] = bin(targets).count('1')
+                if not targets:
+                    if attacks >> weak_king & 1:
+                        # Mated: with no moves left to count off, the event resolves a loss
+                        add_event(0, index, False)
+                    else:
+                        resolved[index] = 1
+
+                # Strong side to move: the weak king must not be in check
+                if attacks >> weak_king & 1:
+                    continue
+                index = table_index(WHITE, strong_king, weak_king, square)
+                valid[index] = 1
+                moves = bin(KING_ATTACKS[strong_king] & ~KING_ATTACKS[weak_king] & ~(1 << square)).count('1')
+                if piece == PAWN:
+                    for push in _pawn_pushes(square, occupied):
+                        if push < 56:
+                            moves += 1
+                            continue
+                        # Promotions: to a knight or bishop draws, to a queen or rook
+                        # continues in that table with the weak side to move
+                        moves += 4
+                        for promotion in (QUEEN, ROOK):
+                            value = promotion_tables[PROMOTION_TABLES[promotion]][
+                                table_index(BLACK, strong_king, weak_king, push)]
+                            if value:
+                                add_event(value, index, not (value - 1) & 1)
+                else:
+                    moves += bin(attacks & ~(1 << strong_king)).count('1')
+                if moves:
+                    remaining[index] = moves
+                else:
+                    resolved[index] = 1
+
+    if log:
+        log(f'{name}: {sum(valid):,} positions set up in {time.perf_counter() - start:.1f}s')
+
+    ply = 0
+    while ply < len(events):
+        for index, is_win in events[ply]:
+            if resolved[index]:
+                continue
+            if not is_win:
+                if remaining[index] > 1:
+                    remaining[index] -= 1
+                    continue
+                remaining[index] = 0
+            resolved[index] = 1
+            values[index] = ply + 1
+            # Positions that move into this one: the side that just moved is the other one
+            color = index >> 18
+            strong_king, weak_king, square = (index >> 12) & 63, (index >> 6) & 63, index & 63
+            occupied = 1 << strong_king | 1 << weak_king | 1 << square
+            predecessors = []
+            if color == WHITE:
+                for origin in _squares(KING_ATTACKS[weak_king] & ~occupied):
+                    predecessors.append(table_index(BLACK, strong_king, origin, square))
+            else:
+                for origin in _squares(KING_ATTACKS[strong_king] & ~occupied):
+                    predecessors.append(table_index(WHITE, origin, weak_king, square))
+                if piece == PAWN:
+                    if square >= 16 and not occupied >> (square - 8) & 1:
+                        predecessors.append(table_index(WHITE, strong_king, weak_king, square - 8))
+                        if 24 <= square < 32 and not occupied >> (square - 16) & 1:
+                            predecessors.append(table_index(WHITE, strong_king, weak_king, square - 16))
+                else:
+                    for origin in _squares(piece_attacks(piece, square, WHITE, occupied) & ~occupied):
+                        predecessors.append(table_index(WHITE, strong_king, weak_king, origin))
+            # A lost position makes its predecessors won, a won one counts off one of their moves
+            won = bool(ply & 1)
+            for predecessor in predecessors:
+                if valid[predecessor] and not resolved[predecessor]:
+                    add_event(ply + 1, predecessor, not won)
+        events[ply] = None
+        ply += 1
+
+    if log:
+        log(f'{name}: {sum(1 for value in values if value):,} decisive positions, '
+            f'longest mate {max(values) - 1} plies, {time.perf_counter() - start:.1f}s')
+    return values
+
+
+def _squares(mask):
+    while mask:
+        bit = mask & -mask
+        yield bit.bit_length() - 1
+        mask ^= bit
+
+
+def write_table(path, values):
+    '''
+    Description: writes `values` (see `generate`) to `path` in the bit-packed block format.
+    '''
+    bits = max(max(values).bit_length(), 1)
+    blocks = []
+    for block_start in range(0, len(values), BLOCK_SIZE):
+        packed = bytearray()
+        accumulator = filled = 0
+        for value in values[block_start:block_start + BLOCK_SIZE]:
+            accumulator |= value << filled
+            filled += bits
+            while filled >= 8:
+                packed.append(accumulator & 0xFF)
+                accumulator >>= 8
+                filled -= 8
+        # Two spare bytes let a probe always read a 3-byte window
+        packed += bytes([accumulator, 0, 0])
+        blocks.append(zlib.compress(bytes(packed), 9))
+
+    offset = HEADER.size + 8*(len(blocks) + 1)
+    offsets = []
+    for block in blocks:
+        offsets.append(offset)
+        offset += len(block)
+    offsets.append(offset)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, bits, BLOCK_SIZE, len(values), len(blocks)))
+        f.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        for block in blocks:
+            f.write(block)
+
+
+def read_values(path):
+    '''
+    Description: all the values of the table file at `path`, decompressed.
+    '''
+    table = _Table(path)
+    return array('B', (table.value(index, LRUCache(0)) for index in range(table.count)))
+
+
+class _Table:
+    '''
+    Description: one memory-mapped table file. Only the header is read when it is opened.
+    '''
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.bits, self.block_size, self.count, self.blocks = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'Not a chess.py tablebase file: {path}')
+        self.mask = (1 << self.bits) - 1
+
+    def block(self, number):
+        start, end = struct.unpack_from('<2Q', self.buffer, HEADER.size + 8*number)
+        return zlib.decompress(self.buffer[start:end])
+
+    def value(self, index, cache):
+        number, offset = divmod(index, self.block_size)
+        cache_key = (self.path, number)
+        block = cache.get(cache_key)
+        if block is None:
+            block = self.block(number)
+            cache.put(cache_key, block)
+        bit = offset*self.bits
+        window = int.from_bytes(block[bit >> 3:(bit >> 3) + 3], 'little')
+        return (window >> (bit & 7)) & self.mask
+
+
+class Tablebase:
+    '''
+    Description: probes the tables found in `directory`: the tables generated here, which
+    give the distance to mate, then the Syzygy tables (.rtbw/.rtbz) for the positions
+    they do not cover. Table files are memory-mapped the first time they are needed and
+    their decompressed blocks are kept in an LRU cache of `cache_blocks` blocks, so
+    repeated probes in the same endgame cost a dict lookup and a few bit operations.
+    `max_pieces` is the most pieces, kings included, of a position the tables cover.
+    '''
+
+    def __init__(self, directory, cache_blocks=256):
+        self.directory = Path(directory)
+        self.cache = LRUCache(maxsize=cache_blocks)
+        self.tables = {}
+        self.syzygy = SyzygyTablebase(directory, cache_blocks)
+        self.max_pieces = max(3, self.syzygy.max_pieces)
+
+    def _table(self, name):
+        if name not in self.tables:
+            path = self.directory / (name + EXTENSION)
+            self.tables[name] = _Table(path) if path.exists() else None
+        return self.tables[name]
+
+    def probe(self, board, player):
+        '''
+        Description: the result of the position on `board` (a dict board such as
+        `initialize_board()` or an `ArrayBoard`) with `player` ('(w)' or '(b)') to move,
+        as a `ProbeResult`, or None when no table covers it. Positions with bare kings or
+        a single minor piece are draws. Castling rights are assumed to be gone.
+        '''
+        return self.probe_board(as_array_board(board), WHITE if player == '(w)' else BLACK)
+
+    def probe_position(self, position):
+        if position.castling_rights:
+            return None
+        result = self._probe_tables(position.board, position.color)
+        if result is None:
+            result = self._probe_syzygy(position)
+        return result
+
+    def probe_board(self, board, color):
+        result = self._probe_tables(board, color)
+        if result is None and self.syzygy.wdl:
+            result = self._probe_syzygy(Position(board, color, castling_rights=0))
+        return result
+
+    def _probe_syzygy(self, position):
+        wdl = self.syzygy.probe_wdl(position)
+        if wdl is None:
+            return None
+        return ProbeResult({2: WIN, -2: LOSS}.get(wdl, DRAW), None, self.syzygy.probe_dtz(position))
+
+    def _probe_tables(self, board, color):
+        occupied = board.occupied
+        count = (occupied[0] | occupied[1]).bit_count()
+        if count == 2:
+            return ProbeResult(DRAW, 0)
+        if count != 3:
+            return None
+        strong = WHITE if occupied[WHITE].bit_count() == 2 else BLACK
+        pieces = board.pieces[strong]
+        for piece in (QUEEN, ROOK, PAWN, KNIGHT, BISHOP):
+            if pieces[piece]:
+                break
+        else:
+            return None
+        if piece in (KNIGHT, BISHOP):
+            return ProbeResult(DRAW, 0)
+        table = self._table('K' + 'PRNBQK'[piece - 1] + 'K')
+        if table is None:
+            return None
+        strong_king = pieces[KING].bit_length() - 1
+        weak_king = board.pieces[1 - strong][KING].bit_length() - 1
+        square = pieces[piece].bit_length() - 1
+        if strong == BLACK:
+            # Flip the board so the strong side is white
+            strong_king, weak_king, square = strong_king ^ 56, weak_king ^ 56, square ^ 56
+        value = table.value(table_index(int(color == strong), strong_king, weak_king, square), self.cache)
+        if not value:
+            return ProbeResult(DRAW, 0)
+        return ProbeResult(WIN if (value - 1) & 1 else LOSS, value - 1)
+
+
+def generate_all(directory, names=None, log=logger.info):
+    '''
+    Description: generates the tables `names` (all of TABLES by default) into `directory`.
+    Tables KPK depends on are read from `directory` or generated first.
+    '''
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    names = list(names or TABLES)
+    computed = {}
+
+    def values_of(name):
+        if name not in computed:
+            path = directory / (name + EXTENSION)
+            if name not in names and path.exists():
+                computed[name] = read_values(path)
+            else:
+                promotion_tables = {table: values_of(table) for table in PROMOTION_TABLES.values()} \
+                    if TABLES[name] == PAWN else None
+                computed[name] = generate(name, promotion_tables, log)
+                write_table(path, computed[name])
+                log(f'{name}: written to {path} ({path.stat().st_size:,} bytes)')
+        return computed[name]
+
+    for name in names:
+        values_of(name)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py tablebase', description='Generate or probe endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help='generate tables into a directory')
+    generate_parser.add_argument('directory')
+    generate_parser.add_argument('tables', nargs='*', metavar='TABLE',
+                                 help=f'tables to generate (default: {" ".join(TABLES)})')
+    probe_parser = commands.add_parser('probe', help='probe a position')
+    probe_parser.add_argument('directory')
+    probe_parser.add_argument('fen')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        unknown = set(args.tables) - set(TABLES)
+        if unknown:
+            parser.error(f'unknown tables: {" ".join(sorted(unknown))} (available: {" ".join(TABLES)})')
+        generate_all(args.directory, args.tables)
+        return
+
+    from fen import from_fen
+    position = from_fen(args.fen)
+    tablebase = Tablebase(args.directory)
+    start = time.perf_counter()
+    result = tablebase.probe_position(position)
+    elapsed = time.perf_counter() - start
+    if result is None:
+        print('Position not covered by the tables.')
+        sys.exit(1)
+    outcome = {WIN: 'win', DRAW: 'draw', LOSS: 'loss'}[result.wdl]
+    if result.dtm is not None:
+        distance = {WIN: f', mates in {result.dtm} plies', DRAW: '', LOSS: f', mated in {result.dtm} plies'}[result.wdl]
+    elif result.dtz:
+        distance = f', {abs(result.dtz)} plies to a capture, pawn move or mate (Syzygy DTZ {result.dtz})'
+        if result.wdl == DRAW:
+            distance += ', drawn by the fifty-move rule'
+    else:
+        distance = ''
+    print(f'{outcome} for the side to move{distance}'
+          + f' ({elapsed*1e6:.0f} us)')
@@ -0,0 +1,6 @@
+# conftest.py
+# lets the tests import the chess.py modules from the repository root
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
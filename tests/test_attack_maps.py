@@ -0,0 +1,31 @@
+# test_attack_maps.py
+# attack counts updated move by move match counts computed from scratch
+import random
+
+from attack_maps import AttackMaps
+from fen import from_fen
+from position import Position
+
+# Castling both ways, en passant and promotions come up within a few random moves
+FENS = ['r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        'n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1',
+        'rnbqkbnr/ppp1pppp/8/8/3pP3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 3']
+
+
+def test_counts_after_make_and_unmake():
+    rng = random.Random(1)
+    for fen in FENS:
+        for _ in range(10):
+            position = from_fen(fen).track_attacks()
+            before = []
+            for _ in range(30):
+                moves = position.legal_moves()
+                if not moves:
+                    break
+                before.append([counts[:] for counts in position.attacks.counts])
+                position.make(rng.choice(moves))
+                assert position.attacks.counts == AttackMaps(position.board).counts
+            while before:
+                position.unmake()
+                assert position.attacks.counts == before.pop()
+            assert not position.attacks.history
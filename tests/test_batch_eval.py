@@ -0,0 +1,24 @@
+# test_batch_eval.py
+# the popcount used without np.bitwise_count (NumPy before 2.0)
+import random
+
+import numpy as np
+
+import batch_eval
+from fen import from_fen
+from position import Position
+
+
+def test_byte_popcount_counts_bits():
+    rng = random.Random(1)
+    values = [0, 1, (1 << 64) - 1] + [rng.getrandbits(64) for _ in range(200)]
+    counts = batch_eval._byte_popcount(np.array(values, dtype=np.uint64))
+    assert counts.tolist() == [value.bit_count() for value in values]
+
+
+def test_mobility_without_bitwise_count(monkeypatch):
+    planes = batch_eval.encode([Position(), from_fen('r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4')])
+    expected = batch_eval.mobility(planes)
+    monkeypatch.setattr(batch_eval, 'popcount', batch_eval._byte_popcount)
+    assert (batch_eval.mobility(planes) == expected).all()
+    assert expected[0].tolist() == [4, 4]
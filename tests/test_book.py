@@ -0,0 +1,36 @@
+# test_book.py
+# probing Polyglot books
+import book
+from bitboard import move_from_uci
+from position import Position
+
+
+def write_book(path, moves_and_weights):
+    position = Position()
+    key = book.polyglot_key(position)
+    entries = []
+    for uci, weight in moves_and_weights:
+        move = move_from_uci(uci)
+        entries.append((key, book.to_polyglot_move(move, abs(position.board.squares[move & 63])), weight))
+    entries.sort()
+    with open(path, 'wb') as f:
+        for key, raw, weight in entries:
+            f.write(book.ENTRY_STRUCT.pack(key, raw, weight, 0))
+
+
+def test_probe_with_zero_weights(tmp_path, capsys):
+    path = tmp_path / 'zero.bin'
+    write_book(path, [('e2e4', 0), ('d2d4', 0)])
+    book.main(['probe', str(path)])
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert all(line.endswith('(50.0%)') for line in lines)
+
+
+def test_probe_shares(tmp_path, capsys):
+    path = tmp_path / 'weights.bin'
+    write_book(path, [('e2e4', 3), ('d2d4', 1)])
+    book.main(['probe', str(path)])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith('e4') and lines[0].endswith('(75.0%)')
+    assert lines[1].startswith('d4') and lines[1].endswith('(25.0%)')
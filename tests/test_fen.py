@@ -0,0 +1,37 @@
+# test_fen.py
+# reading FEN strings, and games whose FEN tag is invalid
+import pytest
+
+import pgn
+import validate
+from fen import from_fen, to_fen
+
+
+@pytest.mark.parametrize('fen', ['4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2', '4k3/8/8/8/3pP3/8/8/4K3 b - e3 0 1'])
+def test_en_passant_square_of_the_side_to_move(fen):
+    position = from_fen(fen)
+    assert to_fen(position) == fen
+
+
+@pytest.mark.parametrize('fen', ['4k3/8/8/8/8/8/3P4/4K3 w - e3 0 1', '4k3/3p4/8/8/8/8/8/4K3 b - d6 0 1',
+                                 '4k3/8/8/8/8/8/8/4K3 w - e4 0 1'])
+def test_en_passant_square_on_the_wrong_rank(fen):
+    with pytest.raises(ValueError, match='en passant'):
+        from_fen(fen)
+
+
+def test_invalid_fen_tag_is_the_games_error():
+    bad = {'headers': {'FEN': 'bogus'}, 'moves': ['e4'], 'result': '*'}
+    good = {'headers': {}, 'moves': ['e4', 'e5'], 'result': '*'}
+    results = sorted(validate.validate_games([bad, good], workers=1), key=lambda result: result['game'])
+    assert [result['status'] for result in results] == ['error', 'ok']
+    assert 'Invalid FEN' in results[0]['reason']
+
+
+def test_pgn_command_reports_invalid_fen_tag(tmp_path, capsys):
+    path = tmp_path / 'games.pgn'
+    path.write_text('[FEN "bogus"]\n\n1. e4 *\n\n[Event "b"]\n\n1. d4 *\n')
+    pgn.main([str(path)])
+    lines = capsys.readouterr().out.splitlines()
+    assert 'Invalid FEN' in lines[0] and lines[1].endswith('OK')
+    assert [game['headers'] for game, ply, position in pgn.read_positions(str(path))] == [{'Event': 'b'}]
@@ -0,0 +1,42 @@
+# test_instrument.py
+# instrumentation statistics collected in worker processes reach the parent's report
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import instrument
+
+CHESS = str(Path(__file__).resolve().parent.parent / 'chess.py')
+GAMES = '\n\n'.join(f'[Event "{number}"]\n\n1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 *' for number in range(8)) + '\n'
+
+
+def test_take_and_merge():
+    instrument.reset()
+    stats = instrument.stats_for('test_function')
+    for elapsed in (100, 2000, 50):
+        stats.record(elapsed)
+    taken = instrument.take()
+    assert stats.calls == 0
+    instrument.merge(taken)
+    instrument.merge(taken)
+    assert (stats.calls, stats.total, stats.minimum, stats.maximum) == (6, 4300, 50, 2000)
+    assert sum(stats.histogram) == 6
+    instrument.reset()
+
+
+def test_validate_workers_report_to_parent(tmp_path):
+    path = tmp_path / 'games.pgn'
+    path.write_text(GAMES)
+    environment = dict(os.environ, **{instrument.ENVIRONMENT_VARIABLE: '1'})
+    completed = subprocess.run([sys.executable, CHESS, 'validate', '-j', '2', '--chunk-size', '2', str(path)],
+                               capture_output=True, text=True, env=environment, timeout=60, check=True)
+    assert completed.stdout.count('"status": "ok"') == 8
+    calls = re.search(r'^check_validity\s+([\d,]+)', completed.stderr, re.MULTILINE)
+    assert calls is not None
+    # Each worker has its own SAN cache, so repeated games are validated at least once per worker
+    assert int(calls.group(1).replace(',', '')) >= 6
+    # Moves are applied through Position.make in the workers
+    makes = re.search(r'^Position\.make\s+([\d,]+)', completed.stderr, re.MULTILINE)
+    assert makes is not None and int(makes.group(1).replace(',', '')) == 8*6
@@ -0,0 +1,30 @@
+# test_perft.py
+# move generation against the published perft node counts of perft.PERFT_SUITE
+import os
+
+import pytest
+
+from fen import from_fen, to_fen
+from perft import PERFT_SUITE, divide, perft
+
+# Depths whose expected count is above the cap are skipped; raise it with PERFT_MAX_NODES
+# for a deeper run (the full suite takes hours)
+MAX_NODES = int(os.environ.get('PERFT_MAX_NODES', 100000))
+
+CASES = [pytest.param(fen, depth, nodes, id=f'{name}-depth{depth}')
+         for name, fen, expected in PERFT_SUITE
+         for depth, nodes in enumerate(expected, 1) if nodes <= MAX_NODES]
+
+
+@pytest.mark.parametrize('fen, depth, nodes', CASES)
+def test_perft(fen, depth, nodes):
+    position = from_fen(fen)
+    assert perft(position, depth) == nodes
+    # make/unmake leave the position as it was
+    assert to_fen(position) == fen
+    assert position.key == from_fen(fen).key
+
+
+@pytest.mark.parametrize('name, fen, expected', PERFT_SUITE, ids=[name for name, _, _ in PERFT_SUITE])
+def test_divide_adds_up(name, fen, expected):
+    assert sum(nodes for _, nodes in divide(from_fen(fen), 2)) == expected[1]
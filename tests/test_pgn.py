@@ -0,0 +1,35 @@
+# test_pgn.py
+# splitting PGN text into games
+import pgn
+
+
+def read(text, tmp_path):
+    path = tmp_path / 'games.pgn'
+    path.write_text(text)
+    return list(pgn.read_games(str(path)))
+
+
+def test_headerless_games_end_at_their_result(tmp_path):
+    games = read('1. e4 e5 1-0\n\n1. d4 d5 0-1\n', tmp_path)
+    assert [(game['moves'], game['result']) for game in games] == [(['e4', 'e5'], '1-0'), (['d4', 'd5'], '0-1')]
+
+
+def test_games_on_one_line(tmp_path):
+    games = read('1. e4 e5 1-0 1. d4 d5 0-1 1. c4 *\n', tmp_path)
+    assert [game['moves'] for game in games] == [['e4', 'e5'], ['d4', 'd5'], ['c4']]
+
+
+def test_comment_spanning_lines_is_not_a_header(tmp_path):
+    text = ('[Event "a"]\n\n1. e4 {a comment\n[Note "not a header"] 1-0 inside\nthe comment} e5 '
+            '(1... c5 0-1) 2. Nf3 ; 1-0 after a semicolon\n2... Nc6 *\n'
+            '[Event "b"]\n\n1. c4 1/2-1/2\n')
+    games = read(text, tmp_path)
+    assert len(games) == 2
+    assert games[0]['headers'] == {'Event': 'a'}
+    assert (games[0]['moves'], games[0]['result']) == (['e4', 'e5', 'Nf3', 'Nc6'], '*')
+    assert (games[1]['headers'], games[1]['moves'], games[1]['result']) == ({'Event': 'b'}, ['c4'], '1/2-1/2')
+
+
+def test_game_without_result_ends_at_next_header(tmp_path):
+    games = read('[Event "a"]\n[Result "1-0"]\n\n1. e4 e5\n[Event "b"]\n\n1. d4\n', tmp_path)
+    assert [(game['moves'], game['result']) for game in games] == [(['e4', 'e5'], '1-0'), (['d4'], '*')]
@@ -0,0 +1,56 @@
+# test_server.py
+# server counters: reading them leaves the periodic report's interval alone
+import asyncio
+import json
+
+import server
+from server import GameServer, ServerStats
+
+
+def test_snapshot_is_read_only(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(server.time, 'perf_counter', lambda: clock[0])
+    stats = ServerStats()
+    reporter_since = stats.mark()
+    for _ in range(10):
+        stats.record(0.001, True)
+    clock[0] += 1
+    # A client polling in between has its own baseline
+    client_since = stats.mark()
+    for _ in range(5):
+        clock[0] += 1
+        assert stats.snapshot(client_since)['interval_moves_per_second'] == 0.0
+        client_since = stats.mark()
+    stats.record(0.001, False)
+    clock[0] += 4
+    # 11 moves in the 10 seconds since the reporter's baseline, whatever the client read
+    snapshot = stats.snapshot(reporter_since)
+    assert (snapshot['moves'], snapshot['illegal'], snapshot['interval_moves_per_second']) == (11, 1, 1.1)
+
+
+def test_stats_command_over_a_connection(tmp_path):
+    async def session():
+        game_server = GameServer('none')
+        path = str(tmp_path / 'server.sock')
+        server = await asyncio.start_unix_server(game_server.handle_connection, path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            answers = []
+            for command in ['e4', 'e5', 'stats', 'stats']:
+                writer.write(command.encode() + b'\n')
+                await writer.drain()
+                lines = []
+                while (line := (await reader.readline()).decode().rstrip('\n')):
+                    lines.append(line)
+                answers.append(lines)
+            writer.write(b'quit\n')
+            await writer.drain()
+            writer.close()
+        return answers
+
+    answers = asyncio.run(session())
+    assert answers[0][0].startswith('ok e2 e4')
+    first, second = json.loads(answers[2][0]), json.loads(answers[3][0])
+    assert first['moves'] == second['moves'] == 2
+    # No moves between the two stats commands of this connection
+    assert second['interval_moves_per_second'] == 0.0
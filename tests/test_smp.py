@@ -0,0 +1,22 @@
+# test_smp.py
+# a lazy SMP search does not hang when one of its worker processes dies
+import pytest
+
+import smp
+from position import Position
+
+
+def test_dead_worker_ends_the_search():
+    with smp.ParallelSearcher(workers=2, tt_size_log2=10) as searcher:
+        assert searcher.search(Position(), max_depth=2).move is not None
+        killed = []
+
+        def kill_helper(result):
+            if not killed:
+                searcher.processes[1].kill()
+                killed.append(result.depth)
+
+        with pytest.raises(smp.WorkerDied):
+            searcher.search(Position(), time_limit=30, on_iteration=kill_helper)
+        with pytest.raises(smp.WorkerDied):
+            searcher.search(Position(), max_depth=2)
@@ -0,0 +1,414 @@
+# test_syzygy.py
+# probing real Syzygy tables against the retrograde tables of tablebase.py, and tables
+# written here by a small encoder of the file format
+import heapq
+import random
+import struct
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+import syzygy
+import tablebase
+from array_board import BLACK, KING, PAWN, QUEEN, ROOK, WHITE, ArrayBoard
+from bitboard import KING_ATTACKS, piece_attacks, squares_of
+from position import Position
+
+# KQvK, KRvK and KPvK (with KBvK and KNvK for underpromotions) as published, see SOURCE.txt there
+REAL_TABLES = Path(__file__).resolve().parent / 'data' / 'syzygy'
+BLOCK_BITS = 8
+INDEX_BITS = 10
+
+
+def _huffman_lengths(frequencies):
+    '''
+    Description: Huffman code lengths of symbols with `frequencies`.
+    '''
+    heap = [(frequency, [symbol]) for symbol, frequency in enumerate(frequencies)]
+    heapq.heapify(heap)
+    lengths = [0]*len(frequencies)
+    while len(heap) > 1:
+        f1, group1 = heapq.heappop(heap)
+        f2, group2 = heapq.heappop(heap)
+        for symbol in group1 + group2:
+            lengths[symbol] += 1
+        heapq.heappush(heap, (f1 + f2, group1 + group2))
+    return lengths
+
+
+def _stream(values, dtz, flags=0):
+    '''
+    Description: (description, index table, size table, blocks) of a value stream: leaf
+    symbols for the values, a few pair symbols for the most frequent neighbours, then a
+    canonical Huffman code like the reader expects.
+    '''
+    if len(set(values)) == 1 and (values[0] == 0 or not dtz):
+        return bytes([flags | 0x80, 0 if dtz else values[0]]), b'', b'', []
+
+    leaves = sorted(set(values))
+    symbols = [(value, None) for value in leaves]
+    sequence = [leaves.index(value) for value in values]
+    lengths = [0]*len(symbols)
+    for _ in range(6):
+        pair, count = Counter(zip(sequence, sequence[1:])).most_common(1)[0]
+        if count < 8:
+            break
+        symbols.append(pair)
+        lengths.append(lengths[pair[0]] + lengths[pair[1]] + 1)
+        merged, i = [], 0
+        while i < len(sequence):
+            if i + 1 < len(sequence) and (sequence[i], sequence[i + 1]) == pair:
+                merged.append(len(symbols) - 1)
+                i += 2
+            else:
+                merged.append(sequence[i])
+                i += 1
+        sequence = merged
+
+    code_lengths = _huffman_lengths([sequence.count(symbol) + 1 for symbol in range(len(symbols))])
+    # Symbols are numbered longest code first
+    order = sorted(range(len(symbols)), key=lambda symbol: -code_lengths[symbol])
+    number = {symbol: i for i, symbol in enumerate(order)}
+    min_length, max_length = min(code_lengths), max(code_lengths)
+    offsets = [sum(length > l for length in code_lengths) for l in range(min_length, max_length + 1)]
+    counts = Counter(code_lengths)
+    base = {max_length: 0}
+    for l in range(max_length, min_length, -1):
+        assert (base[l] + counts[l]) % 2 == 0
+        base[l - 1] = (base[l] + counts[l]) // 2
+    codes = {symbol: (base[code_lengths[symbol]] + number[symbol] - offsets[code_lengths[symbol] - min_length],
+                      code_lengths[symbol]) for symbol in range(len(symbols))}
+
+    patterns = b''
+    for symbol in order:
+        first, second = symbols[symbol]
+        if second is None:
+            patterns += bytes([first & 0xFF, 0xF0 | first >> 8, 0xFF])
+        else:
+            first, second = number[first], number[second]
+            patterns += bytes([first & 0xFF, first >> 8 | (second & 0xF) << 4, second >> 4])
+    if len(symbols) & 1:
+        patterns += b'\0'
+
+    # Blocks hold whole symbols: the code bits, left-aligned, and the number of values
+    capacity = 8 << BLOCK_BITS
+    blocks, block_values = [], []
+    bits = used = covered = 0
+    for symbol in sequence:
+        code, length = codes[symbol]
+        if used + length > capacity - 64 or covered + lengths[symbol] + 1 > 60000:
+            blocks.append((bits << (capacity - used)).to_bytes(capacity // 8, 'big'))
+            block_values.append(covered)
+            bits = used = covered = 0
+        bits = bits << length | code
+        used += length
+        covered += lengths[symbol] + 1
+    blocks.append((bits << (capacity - used)).to_bytes(capacity // 8, 'big'))
+    block_values.append(covered)
+
+    # Index entries point at the middle value of every 2**INDEX_BITS values
+    starts = [sum(block_values[:i]) for i in range(len(block_values))]
+    index_table = b''
+    for main in range((len(values) + (1 << INDEX_BITS) - 1) >> INDEX_BITS):
+        middle = (main << INDEX_BITS) + (1 << (INDEX_BITS - 1))
+        block = max(i for i, start in enumerate(starts) if start <= middle)
+        index_table += struct.pack('<IH', block, middle - starts[block])
+    size_table = b''.join(struct.pack('<H', count - 1) for count in block_values)
+    description = (bytes([flags, BLOCK_BITS, INDEX_BITS, 0]) + struct.pack('<I', len(blocks))
+                   + bytes([max_length, min_length]) + struct.pack(f'<{len(offsets)}H', *offsets)
+                   + struct.pack('<H', len(symbols)) + patterns)
+    return description, index_table, size_table, blocks
+
+
+def write_table(path, values, dtz_flags=0, maps=None):
+    '''
+    Description: writes the table at `path` (the file name gives the material and the
+    kind). `values(side, file, encode, size)` returns the `size` stored values of a
+    stream, `encode(squares)` giving the index of squares listed in the order of
+    `table.order`. DTZ tables store the side in bit 0 of `dtz_flags` and, if `maps` (4
+    lists of bytes) are given, their values are map indices.
+    '''
+    dtz = str(path).endswith(syzygy.DTZ_SUFFIX)
+    table = (syzygy._DtzTable if dtz else syzygy._WdlTable)(str(path))
+    strong, weak = path.stem.split('v')
+    white = [syzygy.FILE_PIECES.index(syzygy.NAME_PIECES[syzygy.NAME_LETTERS.index(c)]) for c in strong]
+    black = [number | 8 for number in
+             (syzygy.FILE_PIECES.index(syzygy.NAME_PIECES[syzygy.NAME_LETTERS.index(c)]) for c in weak)]
+    pieces = white + black
+    split = 0 if dtz or table.symmetric else 1
+    if maps is not None:
+        dtz_flags |= 2
+    if table.has_pawns:
+        lead_color = 0 if strong.count('P') == table.pawns[0] and weak.count('P') == table.pawns[1] else 8
+        lead = [1 | lead_color]*table.pawns[0]
+        other = [1 | lead_color ^ 8]*table.pawns[1]
+        rest = sorted((p for p in pieces if p & 7 != 1), key=pieces.index)
+        order = lead + other + rest
+        header = b''
+        for file in range(4):
+            header += bytes([0x00] + ([0x11] if table.pawns[1] else []) + [p | p << 4 for p in order])
+        files = range(4)
+    else:
+        unique = [p for p in pieces if pieces.count(p) == 1]
+        if table.leading == 2:
+            unique = [6, 14]
+        order = unique[:table.leading] + [p for p in pieces if p not in unique[:table.leading]]
+        header = bytes([0x00] + [p | p << 4 for p in order])
+        files = [None]
+    table.order = order
+    # The stream descriptions start at an even offset, after the magic and a flags byte
+    if (5 + len(header)) & 1:
+        header += b'\0'
+
+    streams = []
+    for file in files:
+        for side in range(1 + split):
+            if table.has_pawns:
+                norm = table._norm_pawn(order)
+                factor, size = table._factors_pawn(0, 1 if table.pawns[1] else 0xF, norm, file)
+
+                def encode(squares, norm=norm, factor=factor):
+                    squares = list(squares)
+                    table._pawn_file(squares)
+                    return table._encode_pawn(norm, squares, factor)
+            else:
+                norm = table._norm_piece(order)
+                factor, size = table._factors_piece(0, norm)
+
+                def encode(squares, norm=norm, factor=factor):
+                    return table._encode_piece(norm, list(squares), factor)
+            streams.append(_stream(values(side, file, encode, size), dtz, dtz_flags if dtz else 0))
+
+    data = (syzygy.DTZ_MAGIC if dtz else syzygy.WDL_MAGIC) + bytes([split | 2*table.has_pawns]) + header
+    data += b''.join(stream[0] for stream in streams)
+    if dtz:
+        for stream in streams:
+            for values in maps or []:
+                data += bytes([len(values)] + values)
+        data += b'\0'*(len(data) & 1)
+    data += b''.join(stream[1] for stream in streams)
+    data += b''.join(stream[2] for stream in streams)
+    for stream in streams:
+        data += b'\0'*(-len(data) % 64)
+        data += b''.join(stream[3])
+    # A whole 64-byte unit after the data lets the reader look ahead, and the size ends in 16
+    data += b'\0'*(-len(data) % 64 + 64 + 16)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return table
+
+
+def _krk_stalemates():
+    '''
+    Description: (white king, rook, black king) squares where black, to move, is stalemated.
+    '''
+    found = []
+    for black_king in range(64):
+        for white_king in range(64):
+            if white_king == black_king or KING_ATTACKS[white_king] & (1 << black_king):
+                continue
+            for rook in range(64):
+                if rook in (white_king, black_king):
+                    continue
+                # The black king does not block the rook from the squares behind it
+                occupied = (1 << white_king) | (1 << rook)
+                attacked = KING_ATTACKS[white_king] | piece_attacks(ROOK, rook, WHITE, occupied)
+                if attacked & (1 << black_king) or KING_ATTACKS[black_king] & ~attacked & ~(1 << white_king):
+                    continue
+                found.append((white_king, rook, black_king))
+    return found
+
+
+def _board(pieces):
+    squares = [0]*64
+    for square, code in pieces.items():
+        squares[square] = code
+    return ArrayBoard(squares)
+
+
+def _random_position(rng, pieces, color):
+    '''
+    Description: a random legal position with `pieces` (codes, white positive) and
+    `color` to move.
+    '''
+    while True:
+        board = _board(dict(zip(rng.sample(range(64), len(pieces)), pieces)))
+        if any(board.pieces[side][PAWN] & 0xFF000000000000FF for side in (WHITE, BLACK)):
+            continue
+        position = Position(board, color, castling_rights=0)
+        position.color = 1 - color
+        if position.is_check():
+            continue
+        position.color = color
+        return position
+
+
+@pytest.fixture(scope='module')
+def krk(tmp_path_factory):
+    '''
+    Description: a directory with KRvK.rtbw (white to move wins, black to move loses
+    unless stalemated) and KRvK.rtbz storing white to move, in plies, the index modulo 23,
+    and the encoders of both files.
+    '''
+    directory = tmp_path_factory.mktemp('syzygy')
+    encoders = {}
+
+    def wdl_values(side, file, encode, size):
+        # Stored values are the WDL values + 2
+        if side == 0:
+            return [4]*size
+        values = [0]*size
+        for squares in _krk_stalemates():
+            values[encode(squares)] = 2
+        return values
+
+    def dtz_values(side, file, encode, size):
+        encoders['dtz'] = encode
+        return [index % 23 for index in range(size)]
+
+    write_table(directory / ('KRvK' + syzygy.WDL_SUFFIX), wdl_values)
+    write_table(directory / ('KRvK' + syzygy.DTZ_SUFFIX), dtz_values, dtz_flags=4 | 8)
+    return directory, encoders
+
+
+def _rook_side(position):
+    '''
+    Description: the side with the rook and the squares of its king, its rook and the
+    other king, seen from that side.
+    '''
+    board = position.board
+    side = WHITE if board.pieces[WHITE][ROOK] else BLACK
+    flip = 0 if side == WHITE else 56
+    king, = squares_of(board.pieces[side][KING])
+    rook, = squares_of(board.pieces[side][ROOK])
+    other, = squares_of(board.pieces[1 - side][KING])
+    return side, (king ^ flip, rook ^ flip, other ^ flip)
+
+
+def test_kings_index_is_a_bijection():
+    indices = sorted(index for row in syzygy.KINGS_INDEX for index in row if index >= 0)
+    assert indices == list(range(syzygy.KINGS_FACTOR))
+
+
+def test_krk_wdl_matches_the_rules(krk):
+    directory, _ = krk
+    rng = random.Random(1)
+    with syzygy.Tablebase(directory) as tablebase:
+        assert tablebase.max_pieces == 3
+        for n in range(300):
+            rook_side = WHITE if n & 1 else BLACK
+            rook, king = (ROOK, KING) if rook_side == WHITE else (-ROOK, -KING)
+            position = _random_position(rng, [king, rook, -king], rng.choice((WHITE, BLACK)))
+            moves = position.legal_moves()
+            if position.color == rook_side:
+                expected = syzygy.WIN
+            elif not moves and not position.is_check():
+                expected = syzygy.DRAW
+            elif any(position.board.squares[(move >> 6) & 63] for move in moves):
+                expected = syzygy.DRAW
+            else:
+                expected = syzygy.LOSS
+            assert tablebase.probe_wdl(position) == expected, position.board.squares
+
+
+def test_krk_dtz_searches_the_side_not_stored(krk):
+    directory, encoders = krk
+    rng = random.Random(2)
+
+    def stored(position):
+        _, squares = _rook_side(position)
+        return encoders['dtz'](squares) % 23
+
+    with syzygy.Tablebase(directory) as tablebase:
+        checked = 0
+        while checked < 40:
+            position = _random_position(rng, [KING, ROOK, -KING], rng.choice((WHITE, BLACK)))
+            wdl = tablebase.probe_wdl(position)
+            if position.color == WHITE:
+                assert tablebase.probe_dtz(position) == 1 + stored(position)
+            elif wdl == syzygy.LOSS:
+                deepest = 0
+                for move in position.legal_moves():
+                    position.make(move)
+                    deepest = max(deepest, 1 + stored(position))
+                    position.unmake()
+                assert tablebase.probe_dtz(position) == -1 - deepest
+            else:
+                assert tablebase.probe_dtz(position) == 0
+            checked += 1
+
+
+def test_kpk_colors_are_mirrored(tmp_path):
+    stored = {}
+
+    def values(side, file, encode, size):
+        stored[side, file] = encode, [(7*index + side + file) % 5 for index in range(size)]
+        return stored[side, file][1]
+
+    write_table(tmp_path / ('KPvK' + syzygy.WDL_SUFFIX), values)
+    rng = random.Random(3)
+    seen = set()
+    with syzygy.Tablebase(tmp_path) as tablebase:
+        for _ in range(200):
+            position = _random_position(rng, [KING, PAWN, -KING], rng.choice((WHITE, BLACK)))
+            squares = position.board.squares
+            mirrored = Position(ArrayBoard([-squares[square ^ 56] for square in range(64)]),
+                                1 - position.color, castling_rights=0)
+            value = tablebase.probe_wdl(position)
+            assert tablebase.probe_wdl(mirrored) == value
+            if not any(squares[(move >> 6) & 63] for move in position.legal_moves()):
+                pawn, = squares_of(position.board.pieces[WHITE][PAWN])
+                king, = squares_of(position.board.pieces[WHITE][KING])
+                other, = squares_of(position.board.pieces[BLACK][KING])
+                encode, table = stored[1 - position.color, syzygy.FILE_TO_FILE[pawn & 7]]
+                assert value == table[encode((pawn, king, other))] - 2
+            seen.add(value)
+    assert len(seen) > 2
+
+
+def test_tablebase_falls_back_to_syzygy(krk):
+    import tablebase
+    directory, encoders = krk
+    tables = tablebase.Tablebase(directory)
+    assert tables.max_pieces == 3
+    board = _board({4: KING, 0: ROOK, 60: -KING})
+    result = tables.probe_board(board, WHITE)
+    assert result == tablebase.ProbeResult(tablebase.WIN, None, 1 + encoders['dtz']((4, 0, 60)) % 23)
+    assert tables.probe_position(Position(board, BLACK, castling_rights=0)).wdl == tablebase.LOSS
+    tables.syzygy.close()
+
+
+@pytest.fixture(scope='module')
+def retrograde():
+    '''
+    Description: the values of KQK, KRK and KPK computed by `tablebase.generate`.
+    '''
+    values = {name: tablebase.generate(name) for name in ('KQK', 'KRK')}
+    values['KPK'] = tablebase.generate('KPK', values)
+    return values
+
+
+@pytest.mark.parametrize('name, piece', [('KQK', QUEEN), ('KRK', ROOK), ('KPK', PAWN)])
+def test_real_tables_agree_with_retrograde_analysis(retrograde, name, piece):
+    rng = random.Random(4)
+    with syzygy.Tablebase(REAL_TABLES) as tables:
+        for _ in range(1500):
+            strong = rng.choice((WHITE, BLACK))
+            sign = 1 if strong == WHITE else -1
+            position = _random_position(rng, [sign*KING, sign*piece, -sign*KING], rng.choice((WHITE, BLACK)))
+            # The retrograde tables have the strong side as white
+            flip = 0 if strong == WHITE else 56
+            strong_king, = squares_of(position.board.pieces[strong][KING])
+            weak_king, = squares_of(position.board.pieces[1 - strong][KING])
+            square, = squares_of(position.board.pieces[strong][piece])
+            color = WHITE if position.color == strong else BLACK
+            value = retrograde[name][tablebase.table_index(color, strong_king ^ flip, weak_king ^ flip, square ^ flip)]
+            wdl = syzygy.DRAW if not value else syzygy.WIN if (value - 1) & 1 else syzygy.LOSS
+            assert tables.probe_wdl(position) == wdl, position.board.squares
+            dtz = tables.probe_dtz(position)
+            if piece != PAWN:
+                # Only mate zeroes the counter of a won KQK or KRK, and the tables may count one ply more
+                assert (value - 1 <= abs(dtz) <= value) if value else dtz == 0
+            else:
+                assert (dtz > 0) - (dtz < 0) == wdl // 2
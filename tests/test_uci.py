@@ -0,0 +1,36 @@
+# test_uci.py
+# info lines of the UCI session
+import io
+
+import uci
+from bitboard import move_from_uci
+from engine import SearchResult
+
+
+class OneIteration:
+    '''
+    Description: a searcher that reports a single iteration with the given principal variation.
+    '''
+
+    def __init__(self, pv):
+        self.pv = pv
+        self.stop = False
+
+    def search(self, position, time_limit=None, max_depth=64, node_limit=None, on_iteration=None):
+        result = SearchResult(self.pv[0] if self.pv else None, 12, 1, 20, 0.001, 20000, self.pv)
+        on_iteration(result)
+        return result
+
+
+def info_line(pv):
+    out = io.StringIO()
+    uci.UciSession(out=out, searcher=OneIteration(pv)).search(None, 1, None)
+    return out.getvalue().splitlines()[0]
+
+
+def test_info_line_without_pv():
+    assert info_line([]) == 'info depth 1 score cp 12 nodes 20 nps 20000 time 1'
+
+
+def test_info_line_with_pv():
+    assert info_line([move_from_uci('e2e4')]).endswith(' time 1 pv e2e4')
@@ -0,0 +1,34 @@
+# test_worker.py
+# the serve-stdin worker answers every line and survives malformed requests
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import worker
+
+CHESS = str(Path(__file__).resolve().parent.parent / 'chess.py')
+BAD_LINES = ['{"moves": [1, 2]}', '{"moves": "e4"}', '{"moves": [""]}', '{"fen": 5}', '{"pgn": 5}', '{bad json']
+GOOD_LINE = '{"id": 7, "moves": ["e4", "e5", "Nf3"]}'
+
+
+def test_bad_line_then_good_line():
+    out = io.StringIO()
+    worker.serve(BAD_LINES + [GOOD_LINE], out)
+    answers = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert len(answers) == len(BAD_LINES) + 1
+    assert all(answer['status'] in ('error', 'illegal') for answer in answers[:-1])
+    assert answers[-1] == {'id': 7, 'status': 'ok', 'plies': 3,
+                           'fen': 'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2'}
+
+
+def test_serve_stdin_process_survives_bad_line():
+    lines = '\n'.join(BAD_LINES + [GOOD_LINE]) + '\n'
+    completed = subprocess.run([sys.executable, CHESS, 'serve-stdin'], input=lines, capture_output=True,
+                               text=True, timeout=60, check=True)
+    answers = [json.loads(line) for line in completed.stdout.splitlines()]
+    assert len(answers) == len(BAD_LINES) + 1
+    assert all(answer['status'] in ('error', 'illegal') for answer in answers[:-1])
+    assert answers[-1]['status'] == 'ok'
+    assert answers[-1]['id'] == 7
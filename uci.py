@@ -0,0 +1,262 @@
+# uci.py
+# UCI protocol front end for the chess.py engine, for chess GUIs and tournament managers
+import argparse
+import sys
+import threading
+
+from bitboard import move_from_uci, move_to_uci
+from engine import MATE, MATE_BOUND, Searcher
+from fen import STARTING_FEN, from_fen
+
+ENGINE_NAME = 'chess.py'
+ENGINE_AUTHOR = 'chess.py contributors'
+
+# Time kept in reserve for the GUI and process overhead, in seconds
+MOVE_OVERHEAD = 0.05
+# Moves assumed left in the game when the GUI does not send movestogo
+DEFAULT_MOVES_TO_GO = 30
+# How long, in seconds, the search thread keeps the GIL before the input thread gets it.
+# Python's default of 5 ms delays 'isready' and 'stop' by as much while the engine thinks.
+SWITCH_INTERVAL = 0.0002
+
+
+def format_score(score):
+    '''
+    Description: a search score as a UCI score field: 'cp N', or 'mate N' in moves
+    (negative when the side to move is getting mated).
+    '''
+    if score > MATE_BOUND:
+        return f'mate {(MATE - score + 1)//2}'
+    if score < -MATE_BOUND:
+        return f'mate {-((MATE + score + 1)//2)}'
+    return f'cp {score}'
+
+
+def parse_go(tokens):
+    '''
+    Description: parses the arguments of a 'go' command into a dict of the integer
+    limits (wtime, btime, winc, binc, movestogo, movetime, depth, nodes, in
+    milliseconds where they are times) and the 'infinite' flag.
+    '''
+    limits = {}
+    tokens = iter(tokens)
+    for token in tokens:
+        if token in ('infinite', 'ponder'):
+            limits['infinite'] = True
+        elif token in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'movetime', 'depth', 'nodes', 'mate'):
+            try:
+                limits[token] = int(next(tokens))
+            except (StopIteration, ValueError):
+                break
+    return limits
+
+
+def time_for_move(limits, color):
+    '''
+    Description: seconds to think for the side `color`, from the 'go' limits (see
+    `parse_go`), or None to search without a time limit.
+    '''
+    if limits.get('infinite'):
+        return None
+    if 'movetime' in limits:
+        return max(limits['movetime']/1000 - MOVE_OVERHEAD, 0.001)
+    remaining = limits.get('wtime' if color else 'btime')
+    if remaining is None:
+        return None
+    increment = limits.get('winc' if color else 'binc', 0)
+    moves_to_go = limits.get('movestogo', DEFAULT_MOVES_TO_GO)
+    budget = remaining/moves_to_go + increment*0.8
+    # Never plan to use more than half of what is left on the clock
+    return max(min(budget, remaining/2)/1000 - MOVE_OVERHEAD, 0.001)
+
+
+class UciSession:
+    '''
+    Description: the state of one UCI conversation: the current position, the moves
+    played from its starting position and the searcher, which runs on a worker thread
+    so that 'stop' and 'isready' are answered while it thinks.
+
+    A 'position' command that extends (or shares a prefix with) the previous one only
+    plays or takes back the moves that differ, instead of replaying the whole game.
+    '''
+
+    def __init__(self, out=sys.stdout, opening_book=None, searcher=None):
+        self.out = out
+        self.opening_book = opening_book
+        self.output_lock = threading.Lock()
+        self.searcher = searcher or Searcher()
+        self.worker = None
+        self.unbounded = False
+        self.start_fen = STARTING_FEN
+        self.position = from_fen(STARTING_FEN)
+        self.moves = []
+
+    def send(self, line):
+        with self.output_lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    def stop_search(self):
+        '''
+        Description: stops the running search, if any, and waits for its 'bestmove'.
+        '''
+        if self.worker is not None:
+            self.searcher.stop = True
+            self.worker.join()
+            self.worker = None
+
+    def finish(self):
+        '''
+        Description: lets a search with limits run to its 'bestmove' and stops an
+        unbounded one ('go infinite'). Used at the end of input and when a command that
+        changes the position arrives during a search, which GUIs do not do but scripts may.
+        '''
+        if self.unbounded:
+            self.stop_search()
+        elif self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+    def set_position(self, start_fen, moves):
+        '''
+        Description: makes the session position `start_fen` followed by the UCI `moves`,
+        reusing the moves already played when the start is unchanged.
+        '''
+        if start_fen != self.start_fen:
+            self.position = from_fen(start_fen)
+            self.start_fen = start_fen
+            self.moves = []
+        common = 0
+        for old, new in zip(self.moves, moves):
+            if old != new:
+                break
+            common += 1
+        for _ in range(len(self.moves) - common):
+            self.position.unmake()
+        del self.moves[common:]
+        for text in moves[common:]:
+            try:
+                move = move_from_uci(text)
+            except ValueError as e:
+                self.send(f'info string {e}')
+                return
+            if move not in self.position.legal_moves():
+                self.send(f'info string Illegal move: {text}')
+                return
+            self.position.make(move)
+            self.moves.append(text)
+
+    def position_command(self, tokens):
+        if not tokens:
+            return
+        if 'moves' in tokens:
+            split = tokens.index('moves')
+            setup, moves = tokens[:split], tokens[split + 1:]
+        else:
+            setup, moves = tokens, []
+        if setup[0] == 'startpos':
+            start_fen = STARTING_FEN
+        elif setup[0] == 'fen':
+            start_fen = ' '.join(setup[1:])
+        else:
+            return
+        try:
+            self.set_position(start_fen, moves)
+        except ValueError as e:
+            self.send(f'info string {e}')
+
+    def go_command(self, tokens):
+        limits = parse_go(tokens)
+        if self.opening_book is not None and not limits.get('infinite'):
+            move = self.opening_book.choose(self.position)
+            if move is not None:
+                self.send('info string book move')
+                self.send(f'bestmove {move_to_uci(move)}')
+                return
+        time_limit = time_for_move(limits, self.position.color)
+        max_depth = limits.get('depth', 64)
+        if 'mate' in limits:
+            max_depth = min(max_depth, 2*limits['mate'])
+        self.unbounded = time_limit is None and 'nodes' not in limits and max_depth == 64
+        self.searcher.stop = False
+        self.worker = threading.Thread(target=self.search, args=(time_limit, max_depth, limits.get('nodes')),
+                                       daemon=True)
+        self.worker.start()
+
+    def search(self, time_limit, max_depth, node_limit):
+        '''
+        Description: the worker thread: searches the session position, sending an 'info'
+        line per completed depth and the 'bestmove' at the end.
+        '''
+        def report(result):
+            line = (f'info depth {result.depth} score {format_score(result.score)} nodes {result.nodes} '
+                    f'nps {result.nps} time {int(result.elapsed*1000)}')
+            # GUIs reject a 'pv' without moves
+            if result.pv:
+                line += f' pv {" ".join(map(move_to_uci, result.pv))}'
+            self.send(line)
+
+        result = self.searcher.search(self.position, time_limit=time_limit, max_depth=max_depth,
+                                      node_limit=node_limit, on_iteration=report)
+        self.send(f'bestmove {move_to_uci(result.move) if result.move is not None else "0000"}')
+
+    def handle(self, line):
+        '''
+        Description: processes one line of input. Returns False on 'quit'.
+        '''
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'stop':
+            self.stop_search()
+        elif command == 'quit':
+            self.stop_search()
+            return False
+        elif command == 'ucinewgame':
+            self.finish()
+            self.searcher.tt.clear()
+            self.start_fen = STARTING_FEN
+            self.position = from_fen(STARTING_FEN)
+            self.moves = []
+        elif command == 'position':
+            self.finish()
+            self.position_command(arguments)
+        elif command == 'go':
+            self.finish()
+            self.go_command(arguments)
+        # Anything else (debug, setoption, register, ponderhit...) is ignored, as UCI asks
+        return True
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py uci', description='Speak the UCI protocol on standard input and output.')
+    parser.add_argument('--book', metavar='FILE', help='answer from this Polyglot opening book while in it')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='search with this many worker processes sharing a table (lazy SMP, see smp.py)')
+    args = parser.parse_args(argv)
+    opening_book = None
+    if args.book:
+        import book
+        opening_book = book.Book(args.book)
+    searcher = None
+    if args.threads > 1:
+        import smp
+        searcher = smp.ParallelSearcher(args.threads)
+    session = UciSession(opening_book=opening_book, searcher=searcher)
+    sys.setswitchinterval(SWITCH_INTERVAL)
+    try:
+        for line in sys.stdin:
+            if not session.handle(line):
+                break
+        else:
+            session.finish()
+    finally:
+        if searcher is not None:
+            searcher.close()
@@ -0,0 +1,112 @@
+# validate.py
+# multiprocess replay and validation of PGN game collections
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import instrument
+import pgn
+
+
+def validate_game(index, game, fen=None):
+    '''
+    Description: replays `game` from its starting position (see `pgn.starting_position`,
+    `fen` is used for games without a FEN tag) and returns a JSON-ready result dict:
+    'status' is 'ok', 'illegal' together with the first illegal ply, its move and the
+    `error_msg` that the validators gave for it, or 'error' with a 'reason' when the
+    game's FEN tag is invalid.
+    '''
+    headers = game['headers']
+    result = {
+        'game': index,
+        'white': headers.get('White', '?'),
+        'black': headers.get('Black', '?'),
+        'result': game['result'],
+        'plies': len(game['moves']),
+        'status': 'ok',
+    }
+    try:
+        position = pgn.starting_position(game, fen)
+    except ValueError as e:
+        result.update(status='error', reason=str(e))
+        return result
+    for ply, move, error_msg in pgn.replay(game['moves'], position):
+        if error_msg is not None:
+            result.update(status='illegal', ply=ply + 1, move=move, reason=error_msg)
+    return result
+
+
+def chunked(games, chunk_size):
+    '''
+    Description: yields lists of up to `chunk_size` (index, game) pairs, indexes from 1.
+    '''
+    numbered = enumerate(games, 1)
+    chunk = list(itertools.islice(numbered, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(numbered, chunk_size))
+
+
+def validate_chunk(chunk, fen=None):
+    '''
+    Description: the results of a chunk of games, and the instrumentation statistics the
+    worker collected for them (see `instrument.take`), None when instrumentation is off.
+    '''
+    results = [validate_game(index, game, fen) for index, game in chunk]
+    return results, instrument.take() if instrument.enabled() else None
+
+
+def _chunk_results(future):
+    results, stats = future.result()
+    if stats:
+        instrument.merge(stats)
+    return results
+
+
+def validate_games(games, workers=None, chunk_size=64, fen=None):
+    '''
+    Description: validates an iterable of games in a pool of `workers` processes
+    (os.cpu_count() by default), `chunk_size` games per task. Yields result dicts (see
+    `validate_game`) as soon as their chunk completes, so they are not in game order.
+    Only about two chunks per worker are in flight at a time, which keeps memory flat
+    while `games` is streamed from disk. With instrumentation on, the workers' statistics
+    are merged into this process's report.
+    '''
+    workers = workers or os.cpu_count() or 1
+    # Workers forked from an instrumented process start from empty statistics
+    initializer = instrument.reset if instrument.enabled() else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+        pending = set()
+        for chunk in chunked(games, chunk_size):
+            pending.add(pool.submit(validate_chunk, chunk, fen))
+            if len(pending) >= 2*workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from _chunk_results(future)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from _chunk_results(future)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='chess.py validate',
+                                     description='Replay every game of a PGN file and report illegal moves as JSON lines.')
+    parser.add_argument('path', help="PGN file to validate, '-' for standard input")
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=64, help='games per task sent to a worker')
+    parser.add_argument('-o', '--output', help='write JSON lines here instead of standard output')
+    parser.add_argument('--fen', help='starting position for games without a FEN tag')
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in validate_games(pgn.read_games(args.path), args.workers, args.chunk_size, args.fen):
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
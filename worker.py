@@ -0,0 +1,87 @@
+# worker.py
+# a warm chess.py process answering newline-delimited game requests on standard input
+import argparse
+import json
+import sys
+
+import chess
+import pgn
+from fen import to_fen
+
+
+def parse_request(line):
+    '''
+    Description: the game dict (see `pgn.parse_game`) and id of one request line. A line
+    is either a JSON object with 'moves' (a list of SAN moves) or 'pgn' (the text of a
+    game, tags included), an optional 'fen' to start from and an optional 'id' echoed in
+    the answer, or else the movetext of a game ('1. e4 e5 2. Nf3').
+    '''
+    if not line.startswith('{'):
+        return pgn.parse_game([], [line]), None
+    request = json.loads(line)
+    if 'pgn' in request:
+        lines = request['pgn'].splitlines()
+        game = pgn.parse_game([text for text in lines if text.startswith('[')],
+                              [text for text in lines if not text.startswith('[')])
+    else:
+        moves = request.get('moves', [])
+        if not isinstance(moves, list) or not all(isinstance(move, str) for move in moves):
+            raise ValueError("'moves' must be a list of SAN strings")
+        game = {'headers': {}, 'moves': moves, 'result': request.get('result', '*')}
+    if request.get('fen'):
+        game['headers']['FEN'] = request['fen']
+    return game, request.get('id')
+
+
+def answer(line):
+    '''
+    Description: replays the game of a request line and returns the answer as a
+    JSON-ready dict: 'status' 'ok', 'illegal' (with the 'ply', 'move' and 'reason' of the
+    first illegal move) or 'error' (with a 'reason', and the 'id' when it was read); the
+    'plies' played, the 'fen' reached and, when the rules end the game there, its 'result'
+    and 'reason'. No request, however malformed, raises.
+    '''
+    try:
+        game, request_id = parse_request(line)
+        position = pgn.starting_position(game)
+    except (ValueError, TypeError, AttributeError) as e:
+        return {'status': 'error', 'reason': str(e)}
+    result = {'status': 'ok', 'plies': 0} if request_id is None else {'id': request_id, 'status': 'ok', 'plies': 0}
+    # A request the validators choke on gets an error answer instead of ending the worker
+    try:
+        for ply, move, error_msg in pgn.replay(game['moves'], position):
+            if error_msg is not None:
+                result.update(status='illegal', ply=ply + 1, move=move, reason=error_msg)
+                break
+            result['plies'] = ply + 1
+    except Exception as e:
+        result.update(status='error', reason=f'{type(e).__name__}: {e}')
+        result.pop('plies')
+        return result
+    result['fen'] = to_fen(position)
+    ended = chess.game_result(position)
+    if ended is not None:
+        result['result'], result['reason'] = ended
+    return result
+
+
+def serve(lines, out):
+    '''
+    Description: answers every non-empty line of `lines` with one JSON line on `out`,
+    flushed right away so a caller can wait for it.
+    '''
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        out.write(json.dumps(answer(line)) + '\n')
+        out.flush()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        prog='chess.py serve-stdin',
+        description='Keep one process warm and validate newline-delimited game requests from standard input. '
+                    'Every line gets one JSON line back: see worker.answer.')
+    parser.parse_args(argv)
+    serve(sys.stdin, sys.stdout)
@@ -0,0 +1,51 @@
+# zobrist.py
+# 64-bit Zobrist keys for chess.py positions
+import random
+
+# A fixed seed keeps keys stable across runs and processes, so they can be stored on disk
+# and compared between workers.
+_random = random.Random(0x636865737370)
+
+# PIECE_KEYS[code][square], indexed by piece code like PIECE_NAMES: negative (black)
+# codes wrap around to the end of the list. PIECE_KEYS[0] is never used.
+PIECE_KEYS = [[_random.getrandbits(64) for _ in range(64)] for _ in range(13)]
+SIDE_KEY = _random.getrandbits(64)
+_CASTLING_BITS = [_random.getrandbits(64) for _ in range(4)]
+EP_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+
+def _castling_key(rights):
+    key = 0
+    for bit in range(4):
+        if rights & (1 << bit):
+            key ^= _CASTLING_BITS[bit]
+    return key
+
+
+# CASTLING_KEYS[rights] for every combination of the four castling rights bits.
+CASTLING_KEYS = [_castling_key(rights) for rights in range(16)]
+
+
+def state_key(color, castling_rights, ep_square):
+    '''
+    Description: the part of a key that does not depend on the pieces: SIDE_KEY is mixed
+    in when black is to move, then the castling rights and the en-passant file.
+    '''
+    key = CASTLING_KEYS[castling_rights]
+    if not color:
+        key ^= SIDE_KEY
+    if ep_square is not None:
+        key ^= EP_KEYS[ep_square & 7]
+    return key
+
+
+def compute_key(position):
+    '''
+    Description: computes the Zobrist key of `position` from scratch. `Position` keeps
+    its `key` up to date incrementally, this is the reference it must always agree with.
+    '''
+    key = state_key(position.color, position.castling_rights, position.ep_square)
+    for square, code in enumerate(position.board.squares):
+        if code:
+            key ^= PIECE_KEYS[code][square]
+    return key